@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import List
 from uuid import UUID
 
 from dpt.cqrs import Command
@@ -12,10 +13,12 @@ __all__ = (
     "SetObjectFuelSettingsCommand",
     "DeleteObjectFuelSettingsCommand",
     "RestoreObjectFuelSettingsCommand",
+    "SetObjectFuelSettingsBulkCommand",
 
     "SetObjectFuelIntervalSettingsCommand",
     "DeleteObjectFuelIntervalSettingsCommand",
     "RestoreObjectFuelIntervalSettingsCommand",
+    "SetObjectFuelIntervalSettingsBulkCommand",
 )
 
 
@@ -39,6 +42,12 @@ class RestoreObjectFuelSettingsCommand(Command):
     organization_id: OrganizationId
 
 
+@dataclass
+class SetObjectFuelSettingsBulkCommand(OrganizationIdMixin, Command):
+    """Массовое сохранение настроек заправок/сливов для объектов (импорт)"""
+    objects: List[ObjectFuelSettings]
+
+
 @dataclass
 class SetObjectFuelIntervalSettingsCommand(OrganizationIdMixin, Command):
     """Сохранение настроек заправок/сливов для объекта на интервал времени"""
@@ -57,3 +66,9 @@ class RestoreObjectFuelIntervalSettingsCommand(Command):
     """Восстановление настроек заправок/сливов для объекта на интервал времени"""
     object_id: ObjectFuelIntervalSettingsId
     organization_id: OrganizationId
+
+
+@dataclass
+class SetObjectFuelIntervalSettingsBulkCommand(OrganizationIdMixin, Command):
+    """Массовое сохранение настроек заправок/сливов для объектов на интервал времени (импорт)"""
+    objects: List[ObjectFuelIntervalSettings]
@@ -1,3 +1,5 @@
 from .analytic_entity import *
 from .charge import *
+from .live import *
+from .rollup import *
 from .settings import *
@@ -0,0 +1,52 @@
+import datetime
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import Optional
+
+from dpt.domain.identity import ObjectId, OrganizationId
+from dpt.domain.telemetry import AnalyticEntityId
+
+__all__ = (
+    "LiveFuelStateKind",
+    "LiveFuelState",
+)
+
+
+class LiveFuelStateKind(StrEnum):
+    CHARGE = 'CHARGE'
+    """Определение заправок"""
+    DISCHARGE = 'DISCHARGE'
+    """Определение сливов"""
+
+
+@dataclass
+class LiveFuelState:
+    """Текущее состояние определения заправок/сливов по баку (снимок из памяти сервиса)"""
+    kind: LiveFuelStateKind
+    """Заправки или сливы"""
+    organization_id: OrganizationId
+    """Идентификатор организации"""
+    object_id: ObjectId
+    """Идентификатор объекта диспетчеризации"""
+    analytic_entity_id: AnalyticEntityId
+    """Параметр (бак/цистерна)"""
+    state: str
+    """Состояние (State для заправок, DischargeStateEnum для сливов)"""
+    time: datetime.datetime
+    """Время последнего сообщения"""
+    fuel_volume: float
+    """Текущий объём топлива, л"""
+    speed: float
+    """Текущая скорость"""
+    state_time: datetime.datetime
+    """Время начала состояния"""
+    begin: Optional[datetime.datetime] = None
+    """Начало текущей заправки/слива"""
+    volume: Optional[float] = None
+    """Объём текущей заправки/слива, л"""
+    time_threshold: Optional[datetime.datetime] = None
+    """Пороговое время перехода в следующее состояние"""
+    fuel_volume_threshold: Optional[float] = None
+    """Пороговый объём перехода в следующее состояние"""
+    check_time_threshold: Optional[datetime.datetime] = None
+    """Окончание проверки подлинности слива"""
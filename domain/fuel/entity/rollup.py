@@ -0,0 +1,43 @@
+import datetime
+from dataclasses import dataclass
+
+from dpt.domain.identity import ObjectId, OrganizationId
+from dpt.domain.telemetry import AnalyticEntityId
+
+__all__ = (
+    "FuelVolumeRollup",
+)
+
+
+@dataclass
+class FuelVolumeRollup:
+    """Итог заправок/сливов объекта по баку за сутки (UTC)"""
+    organization_id: OrganizationId
+    """Идентификатор организации"""
+    object_id: ObjectId
+    """Идентификатор объекта диспетчеризации"""
+    analytic_entity_id: AnalyticEntityId
+    """Параметр (бак/цистерна)"""
+    day: datetime.datetime
+    """Начало суток (по времени начала заправки/слива)"""
+    charge_volume: float = 0.0
+    """Объём окончившихся заправок, л"""
+    charge_count: int = 0
+    """Количество окончившихся заправок"""
+    discharge_volume: float = 0.0
+    """Объём окончившихся сливов, л"""
+    discharge_count: int = 0
+    """Количество окончившихся сливов"""
+
+    @staticmethod
+    def get_day(time: datetime.datetime) -> datetime.datetime:
+        """Начало суток (UTC), к которым относится время; время без пояса - UTC"""
+        if time.tzinfo is not None:
+            time = time.astimezone(datetime.timezone.utc)
+        return time.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def add(self, other: "FuelVolumeRollup") -> None:
+        self.charge_volume += other.charge_volume
+        self.charge_count += other.charge_count
+        self.discharge_volume += other.discharge_volume
+        self.discharge_count += other.discharge_count
@@ -1,6 +1,7 @@
 import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import timedelta
+from enum import StrEnum
 from typing import Optional, NewType
 from uuid import UUID
 
@@ -15,7 +16,11 @@ __all__ = (
     "ObjectFuelIntervalSettingsId",
 
     "FuelChargeSettings",
+    "FuelDischargeConfirmation",
     "FuelDischargeSettings",
+    "FuelSmoothingMethod",
+    "FuelSmoothingSettings",
+    "FUEL_SMOOTHING_MAX_WINDOW",
 
     "ObjectFuelSettings",
     "ObjectFuelIntervalSettings",
@@ -46,6 +51,14 @@ class FuelChargeSettings(DTO):
     """Игнорировать сообщения после начала движения, с"""
 
 
+class FuelDischargeConfirmation(StrEnum):
+    """Способ подтверждения слива по уровню топлива после слива"""
+    MEAN = 'MEAN'
+    """Среднее значение"""
+    MEDIAN = 'MEDIAN'
+    """Медиана (устойчива к выбросам датчика)"""
+
+
 @dataclass
 class FuelDischargeSettings(DTO):
     """Параметры определения слива топлива"""
@@ -59,6 +72,37 @@ class FuelDischargeSettings(DTO):
     """Игнорировать сливы в движении"""
     ignore_duration_begin_move: timedelta = timedelta(seconds=0)
     """Игнорировать сообщения после начала движения, с"""
+    confirmation: FuelDischargeConfirmation = FuelDischargeConfirmation.MEAN
+    """Способ подтверждения слива"""
+
+
+class FuelSmoothingMethod(StrEnum):
+    """Фильтр значений датчика уровня топлива"""
+    NONE = 'NONE'
+    """Без сглаживания"""
+    MEDIAN = 'MEDIAN'
+    """Медиана последних window значений"""
+    EMA = 'EMA'
+    """Экспоненциальное скользящее среднее"""
+    HAMPEL = 'HAMPEL'
+    """Фильтр Хампеля: выбросы заменяются медианой окна"""
+
+
+FUEL_SMOOTHING_MAX_WINDOW = 61
+"""Макс. окно фильтра (MEDIAN, HAMPEL): обновление фильтра - O(окна), большее окно не сохраняется"""
+
+
+@dataclass
+class FuelSmoothingSettings(DTO):
+    """Параметры сглаживания значений датчика уровня топлива (до определения заправок/сливов)"""
+    method: FuelSmoothingMethod = FuelSmoothingMethod.NONE
+    """Фильтр"""
+    window: int = 5
+    """Окно фильтра (MEDIAN, HAMPEL), значений: от 1 до FUEL_SMOOTHING_MAX_WINDOW"""
+    alpha: float = 0.3
+    """Коэффициент сглаживания (EMA): больше 0 и не больше 1"""
+    threshold: float = 3.0
+    """Порог выброса в масштабированных MAD (HAMPEL): не меньше 0"""
 
 
 @dataclass
@@ -80,6 +124,8 @@ class ObjectFuelSettings(OrganizationEntity):
     """Создано в"""
     deleted_at: Optional[datetime.datetime] = None
     """Удалено в"""
+    smoothing: FuelSmoothingSettings = field(default_factory=FuelSmoothingSettings)
+    """Параметры сглаживания значений датчика"""
 
 
 @dataclass(kw_only=True)
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import List
 
 from dpt.domain.fuel import ObjectFuelIntervalSettings, ObjectFuelIntervalSettingsId
 from dpt.domain.fuel.entity import ObjectFuelSettings, ObjectFuelSettingsId
@@ -7,9 +8,11 @@ from dpt.domain.identity import ModifiedEvent, DeletedEvent
 __all__ = (
     "ObjectFuelSettingsModifiedEvent",
     "ObjectFuelSettingsDeletedEvent",
+    "ObjectFuelSettingsBulkModifiedEvent",
 
     "ObjectFuelIntervalSettingsModifiedEvent",
     "ObjectFuelIntervalSettingsDeletedEvent",
+    "ObjectFuelIntervalSettingsBulkModifiedEvent",
 )
 
 
@@ -25,6 +28,15 @@ class ObjectFuelSettingsDeletedEvent(DeletedEvent):
     object_id: ObjectFuelSettingsId
 
 
+@dataclass
+class ObjectFuelSettingsBulkModifiedEvent(ModifiedEvent):
+    """
+    Изменены настройки определения заправок/сливов (массово, одним событием).
+    Публикуется вместо ObjectFuelSettingsModifiedEvent по каждым настройкам - подписчики обрабатывают оба
+    """
+    objects: List[ObjectFuelSettings]
+
+
 @dataclass
 class ObjectFuelIntervalSettingsModifiedEvent(ModifiedEvent):
     """Изменены настройки определения заправок/сливов на интервал времени"""
@@ -35,3 +47,12 @@ class ObjectFuelIntervalSettingsModifiedEvent(ModifiedEvent):
 class ObjectFuelIntervalSettingsDeletedEvent(DeletedEvent):
     """Удалены настройки определения заправок/сливов на интервал времени"""
     object_id: ObjectFuelIntervalSettingsId
+
+
+@dataclass
+class ObjectFuelIntervalSettingsBulkModifiedEvent(ModifiedEvent):
+    """
+    Изменены настройки определения заправок/сливов на интервал времени (массово, одним событием).
+    Публикуется вместо ObjectFuelIntervalSettingsModifiedEvent по каждым настройкам - подписчики обрабатывают оба
+    """
+    objects: List[ObjectFuelIntervalSettings]
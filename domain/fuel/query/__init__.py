@@ -1,4 +1,7 @@
 from .charge import *
 from .chart import *
 from .discharge import *
+from .live import *
+from .metrics import *
+from .rollup import *
 from .settings import *
@@ -1,10 +1,16 @@
 from dataclasses import dataclass
+from typing import Dict, List
 
-from dpt.domain.telemetry import ChartIntervalQuery
+from dpt.cqrs import Query
+from dpt.domain.identity import OrganizationId, ObjectId
+from dpt.domain.telemetry import ChartIntervalQuery, ChartInterval
+from dpt.utils import DateTimeInterval
 
 __all__ = (
     "ChargeChartIntervalQuery",
     "DischargeChartIntervalQuery",
+    "ChargeChartIntervalBatchQuery",
+    "DischargeChartIntervalBatchQuery",
 )
 
 
@@ -16,3 +22,25 @@ class ChargeChartIntervalQuery(ChartIntervalQuery):
 @dataclass
 class DischargeChartIntervalQuery(ChartIntervalQuery):
     ...
+
+
+@dataclass
+class ChargeChartIntervalBatchQuery(Query[Dict[ObjectId, List[ChartInterval]]]):
+    """Запрос заправок для графиков по нескольким объектам (результат по объектам)"""
+    object_ids: List[ObjectId]
+    """Идентификаторы объектов"""
+    interval: DateTimeInterval
+    """Интервал"""
+    organization_id: OrganizationId
+    """Идентификатор организации"""
+
+
+@dataclass
+class DischargeChartIntervalBatchQuery(Query[Dict[ObjectId, List[ChartInterval]]]):
+    """Запрос сливов для графиков по нескольким объектам (результат по объектам)"""
+    object_ids: List[ObjectId]
+    """Идентификаторы объектов"""
+    interval: DateTimeInterval
+    """Интервал"""
+    organization_id: OrganizationId
+    """Идентификатор организации"""
@@ -1,9 +1,10 @@
+import datetime
 from dataclasses import dataclass
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
 
 from dpt.cqrs import Query
 from dpt.domain.fuel import FuelDischarge
-from dpt.domain.identity import OrganizationId, ObjectId
+from dpt.domain.identity import OrganizationId, ObjectId, FuelDischargeId
 from dpt.domain.telemetry import AnalyticEntityId
 from dpt.utils import DateTimeInterval
 
@@ -11,6 +12,7 @@ from dpt.utils import DateTimeInterval
 __all__ = (
     "LastFuelDischargeQuery",
     "FuelDischargeQuery",
+    "FuelDischargeBatchQuery",
 )
 
 
@@ -27,10 +29,28 @@ class LastFuelDischargeQuery(Query[FuelDischarge]):
 
 @dataclass
 class FuelDischargeQuery(Query[List[FuelDischarge]]):
-    """Запрос сливов по объекту"""
+    """
+    Запрос сливов по объекту, в порядке (begin, id).
+    Постранично: limit на страницу, after - (begin, id) последней записи предыдущей страницы.
+    """
     object_id: ObjectId
     """Идентификатор объекта"""
     interval: DateTimeInterval
     """Интервал сливов"""
     organization_id: Optional[OrganizationId] = None
     """Идентификатор организации"""
+    after: Optional[Tuple[datetime.datetime, FuelDischargeId]] = None
+    """Ключ (begin, id), после которого начинается страница"""
+    limit: Optional[int] = None
+    """Размер страницы (None - все)"""
+
+
+@dataclass
+class FuelDischargeBatchQuery(Query[Dict[ObjectId, List[FuelDischarge]]]):
+    """Запрос сливов по нескольким объектам (результат по объектам)"""
+    object_ids: List[ObjectId]
+    """Идентификаторы объектов"""
+    interval: DateTimeInterval
+    """Интервал сливов"""
+    organization_id: Optional[OrganizationId] = None
+    """Идентификатор организации"""
@@ -0,0 +1,23 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+from dpt.cqrs import Query
+from dpt.domain.fuel import LiveFuelState
+from dpt.domain.identity import OrganizationId, ObjectId
+
+__all__ = (
+    "LiveFuelStateQuery",
+)
+
+
+@dataclass
+class LiveFuelStateQuery(Query[List[LiveFuelState]]):
+    """
+    Запрос текущих состояний определения заправок/сливов по бакам.
+    Отвечает один процесс сервиса из своей памяти, без обращения к базе: только баки его вида
+    (заправки или сливы) и его части объектов; без фильтров - все баки этого процесса, а не всего парка.
+    """
+    organization_id: Optional[OrganizationId] = None
+    """Идентификатор организации"""
+    object_id: Optional[ObjectId | List[ObjectId]] = None
+    """Идентификатор объекта (или список)"""
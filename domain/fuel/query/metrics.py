@@ -0,0 +1,16 @@
+from dataclasses import dataclass
+from typing import Dict
+
+from dpt.cqrs import Query
+
+__all__ = (
+    "FuelMetricsQuery",
+)
+
+
+@dataclass
+class FuelMetricsQuery(Query[Dict[str, float]]):
+    """
+    Запрос счётчиков сервиса определения заправок/сливов (и производных долей, например hit rate индексов).
+    Отвечает процесс, обработавший запрос, из памяти.
+    """
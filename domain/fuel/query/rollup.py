@@ -0,0 +1,25 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+from dpt.cqrs import Query
+from dpt.domain.fuel import FuelVolumeRollup
+from dpt.domain.identity import OrganizationId, ObjectId
+from dpt.domain.telemetry import AnalyticEntityId
+from dpt.utils import DateTimeInterval
+
+__all__ = (
+    "FuelVolumeSummaryQuery",
+)
+
+
+@dataclass
+class FuelVolumeSummaryQuery(Query[List[FuelVolumeRollup]]):
+    """Запрос суточных итогов заправок/сливов по объектам"""
+    object_id: ObjectId | List[ObjectId]
+    """Идентификатор объекта (или список)"""
+    interval: DateTimeInterval
+    """Интервал (сутки, начало которых попадает в интервал)"""
+    organization_id: Optional[OrganizationId] = None
+    """Идентификатор организации"""
+    analytic_entity_id: Optional[AnalyticEntityId] = None
+    """Параметр (бак), по умолчанию - все"""
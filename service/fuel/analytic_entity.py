@@ -1,13 +1,18 @@
-from typing import Mapping, List, Set
+from typing import Dict, Mapping, List, Optional, Set
 from dpt.component import implements
 from dpt.component.utils import Singleton
 from dpt.config import IConfigurationProvider, Configuration
-from dpt.domain.telemetry import AnalyticEntity, AnalyticEntityId
+from dpt.domain.fuel.entity import ObjectFuelAnalyticEntity
+from dpt.domain.identity import ObjectId
+from dpt.domain.telemetry import AnalyticEntity, AnalyticEntityId, ObjectConfigurationModifiedEvent
 
 
 __all__ = (
     'FuelAnalyticEntitiesStorage',
     'AnalyticEntityConfigProvider',
+    'ObjectFuelAnalyticEntitiesStorage',
+    'make_object_fuel_analytic_entity',
+    'is_same_object_fuel_analytic_entity',
 )
 
 
@@ -31,3 +36,86 @@ class AnalyticEntityConfigProvider(IConfigurationProvider):
 
     def parse_section(self, config: Configuration, section: Mapping):
         FuelAnalyticEntitiesStorage.create(entities=[AnalyticEntity(**parameters) for parameters in section])
+
+
+def make_object_fuel_analytic_entity(event: ObjectConfigurationModifiedEvent) -> Optional[ObjectFuelAnalyticEntity]:
+    """Топливные параметры объекта по его конфигурации оборудования (None - топливных параметров нет)"""
+    fuel_ids = FuelAnalyticEntitiesStorage().ids
+    analytic_entity_ids = {
+        AnalyticEntityId(analytic_settings.analytic_entity_id)
+        for controller_config in event.object.controllers
+        for analytic_settings in controller_config.analytic_settings
+        if analytic_settings.analytic_entity_id in fuel_ids
+    }
+    if not analytic_entity_ids:
+        return None
+    return ObjectFuelAnalyticEntity(
+        id=event.object.id,
+        organization_id=event.object.enterprise_id,
+        analytic_entity_ids=sorted(analytic_entity_ids),
+    )
+
+
+def is_same_object_fuel_analytic_entity(
+        first: Optional[ObjectFuelAnalyticEntity],
+        second: Optional[ObjectFuelAnalyticEntity],
+) -> bool:
+    """Совпадают ли топливные параметры объекта (организация и набор параметров)"""
+    if first is None or second is None:
+        return first is None and second is None
+    return first.organization_id == second.organization_id and \
+        set(first.analytic_entity_ids) == set(second.analytic_entity_ids)
+
+
+class ObjectFuelAnalyticEntitiesStorage(metaclass=Singleton):
+    """
+    Топливные параметры (баки/цистерны) объектов в памяти процесса.
+    Загружается из IObjectFuelAnalyticEntityStorage при старте, дальше обновляется
+    событиями изменения конфигурации оборудования объекта.
+    Только подсказка для обработки телеметрии: источник истины - хранилище.
+    """
+
+    def __init__(self):
+        self._items: Dict[ObjectId, ObjectFuelAnalyticEntity] = {}
+        self._entities: Dict[ObjectId, List[AnalyticEntity]] = {}
+        """Объект -> топливные параметры из FuelAnalyticEntitiesStorage (для обработки телеметрии)"""
+        self._loaded = False
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    async def load(self, storage) -> None:
+        """Загрузить все объекты из хранилища (IObjectFuelAnalyticEntityStorage)"""
+        items = {item.id: item for item in await storage.query()}
+        self._items = items
+        self._entities = {object_id: self._make_entities(item) for object_id, item in items.items()}
+        self._loaded = True
+
+    def get(self, object_id: ObjectId) -> Optional[ObjectFuelAnalyticEntity]:
+        return self._items.get(object_id)
+
+    def set(self, object_id: ObjectId, item: Optional[ObjectFuelAnalyticEntity]) -> None:
+        """
+        Запомнить топливные параметры объекта (None - у объекта их нет: объект известен,
+        баков для проверки в телеметрии нет; в отличие от неизвестного объекта, у которого проверяются все)
+        """
+        if item is None:
+            self._items.pop(object_id, None)
+            self._entities[object_id] = []
+        else:
+            self._items[object_id] = item
+            self._entities[object_id] = self._make_entities(item)
+
+    def entities(self, object_id: ObjectId) -> List[AnalyticEntity]:
+        """
+        Топливные параметры, которые нужно проверять в телеметрии объекта.
+        Для неизвестного объекта - все топливные параметры, для объекта без топливных параметров - никаких
+        """
+        entities = self._entities.get(object_id)
+        return entities if entities is not None else FuelAnalyticEntitiesStorage().list
+
+    @staticmethod
+    def _make_entities(item: ObjectFuelAnalyticEntity) -> List[AnalyticEntity]:
+        fuel_entities = FuelAnalyticEntitiesStorage().dict
+        return [fuel_entities[entity_id] for entity_id in item.analytic_entity_ids if entity_id in fuel_entities]
@@ -0,0 +1,415 @@
+import datetime
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Self, Tuple
+
+import numpy as np
+
+from dpt.domain.fuel import FuelChargeSettings, FuelDischargeSettings, FuelCharge, FuelDischarge, \
+    FuelDischargeConfirmation
+from dpt.domain.identity import OrganizationId, ObjectId, FuelChargeId, FuelDischargeId
+from dpt.domain.telemetry import AnalyticEntityId
+from dpt.geojson import Point
+from .fsm import DischargeFSM
+from .state import FuelStateData, State, DischargeStateEnum, make_fuel_charge_uuid
+from .stats import RunningStats, P2Quantile
+from .timeutils import datetime_to_us, us_to_datetime
+
+__all__ = (
+    "FuelSeries",
+    "PreparedFuelSeries",
+    "ChargeBatchEngine",
+    "DischargeBatchEngine",
+)
+
+
+_NO_THRESHOLD = np.iinfo(np.int64).min
+"""Порог времени не задан (любое время его "прошло")"""
+
+
+def _us(delta: datetime.timedelta) -> int:
+    return delta // datetime.timedelta(microseconds=1)
+
+
+def _last_threshold(time: np.ndarray, mask: np.ndarray, delta: datetime.timedelta) -> List[int]:
+    """Порог, заданный последним событием mask (включая текущее сообщение): time[j] + delta"""
+    if not delta:
+        return [int(_NO_THRESHOLD)] * len(time)
+    return np.maximum.accumulate(np.where(mask, time + _us(delta), _NO_THRESHOLD)).tolist()
+
+
+def _next_index(mask: np.ndarray) -> List[int]:
+    """Для каждой позиции - индекс ближайшего сообщения (не раньше неё), где mask истинна"""
+    size = len(mask)
+    index = np.where(mask, np.arange(size), size)
+    return np.minimum.accumulate(index[::-1])[::-1].tolist() + [size]
+
+
+@dataclass
+class FuelSeries:
+    """Временной ряд данных бака"""
+    time: np.ndarray
+    """Время сообщений, datetime64[us]"""
+    fuel_volume: np.ndarray
+    """Объём топлива, л"""
+    speed: np.ndarray
+    """Скорость"""
+    location: Optional[Sequence[Optional[Point]]] = None
+    """Положение"""
+    tzinfo: Optional[datetime.tzinfo] = None
+    """Часовой пояс исходного времени (None - наивное время)"""
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    @classmethod
+    def from_states(cls, states: Sequence[FuelStateData]) -> Self:
+        """Ряд из списка состояний бака"""
+        tzinfo = states[0].time.tzinfo if states else None
+        return cls(
+            time=np.array([datetime_to_us(item.time) for item in states], dtype=np.int64).view("datetime64[us]"),
+            fuel_volume=np.array([item.fuel_volume for item in states], dtype=np.float64),
+            speed=np.array([item.speed for item in states], dtype=np.float64),
+            location=[item.location for item in states],
+            tzinfo=tzinfo,
+        )
+
+    def get_time(self, index: int) -> datetime.datetime:
+        return us_to_datetime(int(self.time[index].astype(np.int64)), self.tzinfo)
+
+    def get_location(self, index: int) -> Optional[Point]:
+        return self.location[index] if self.location is not None else None
+
+
+@dataclass
+class PreparedFuelSeries:
+    """
+    Ряд с один раз посчитанными разностями, скоростью изменения топлива и моментами начала движения/остановки.
+    Общий для любого количества наборов настроек.
+    Сообщения из прошлого (раньше уже принятых) отбрасываются так же, как в State машинах.
+    """
+    series: FuelSeries
+    index: np.ndarray
+    """Индексы принятых сообщений исходного ряда"""
+    time_us: np.ndarray
+    fuel_rise: np.ndarray
+    """Уровень топлива вырос относительно предыдущего сообщения"""
+    fuel_speed_array: np.ndarray
+    move_begin: np.ndarray
+    """Начало движения (скорость была 0)"""
+    move_stop: np.ndarray
+    """Начало остановки (скорость стала 0)"""
+    time: List[int]
+    fuel_volume: List[float]
+    speed: List[float]
+    fuel_speed: List[float]
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    @classmethod
+    def prepare(cls, series: FuelSeries) -> Self:
+        time_us = series.time.astype("datetime64[us]").astype(np.int64)
+        index = np.flatnonzero(time_us >= np.maximum.accumulate(time_us)) if len(time_us) else np.arange(0)
+        time_us = time_us[index]
+        fuel = np.asarray(series.fuel_volume, dtype=np.float64)[index]
+        speed = np.asarray(series.speed, dtype=np.float64)[index]
+
+        fuel_delta = np.diff(fuel, prepend=fuel[:1])
+        duration = np.diff(time_us, prepend=time_us[:1]) / 1e6
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fuel_speed = np.where((duration > 0) & (fuel_delta != 0), fuel_delta / duration, 0.0)
+
+        prev_speed = np.concatenate((speed[:1], speed[:-1]))
+        return cls(
+            series=series,
+            index=index,
+            time_us=time_us,
+            fuel_rise=fuel_delta > 0,
+            fuel_speed_array=fuel_speed,
+            move_begin=(prev_speed == 0) & (speed > 0),
+            move_stop=(prev_speed > 0) & (speed == 0),
+            time=time_us.tolist(),
+            fuel_volume=fuel.tolist(),
+            speed=speed.tolist(),
+            fuel_speed=fuel_speed.tolist(),
+        )
+
+
+class ChargeBatchEngine:
+    """
+    Пакетное определение заправок по временному ряду бака.
+    Результат совпадает с ChargeFSM (с deterministic_id=True), запущенной на том же ряду с чистого состояния.
+    Переходы между состояниями считаются в одном цикле, в состоянии FREE цикл перескакивает
+    сразу к следующему росту уровня топлива.
+    """
+
+    def __init__(
+            self,
+            organization_id: OrganizationId,
+            object_id: ObjectId,
+            analytic_entity_id: AnalyticEntityId,
+            settings: FuelChargeSettings,
+    ):
+        self.organization_id = organization_id
+        self.object_id = object_id
+        self.analytic_entity_id = analytic_entity_id
+        self.settings = settings
+
+    def detect(self, series: FuelSeries | PreparedFuelSeries) -> List[FuelCharge]:
+        """Найти заправки в ряду (последняя может быть не окончена)"""
+        prepared = series if isinstance(series, PreparedFuelSeries) else PreparedFuelSeries.prepare(series)
+        return [self.make_charge(prepared, *interval) for interval in self.detect_intervals(prepared)]
+
+    def detect_intervals(self, prepared: PreparedFuelSeries) -> List[Tuple[int, int, bool]]:
+        """Найти заправки: (индекс начала, индекс окончания, окончена ли) в принятых сообщениях"""
+        settings = self.settings
+        min_volume = settings.min_volume
+        min_duration_in = _us(settings.min_duration_in)
+        min_duration_out = _us(settings.min_duration_out)
+        min_duration_sudden = _us(settings.min_duration_sudden) if settings.min_duration_sudden else None
+        ignore_on_speed = settings.ignore_on_speed
+        ignore_begin_move = bool(settings.ignore_duration_begin_move)
+
+        t = prepared.time
+        f = prepared.fuel_volume
+        sp = prepared.speed
+        begin_move_threshold = _last_threshold(
+            prepared.time_us, prepared.move_begin, settings.ignore_duration_begin_move)
+        next_rise = _next_index(prepared.fuel_rise)
+
+        size = len(t)
+        intervals = []
+        state = State.FREE
+        state_index = 0
+        time_threshold = fuel_volume_threshold = None
+        begin = end = -1
+        i = 1
+        while i < size:
+            if state == State.FREE:
+                i = next_rise[i]
+                if i >= size:
+                    break
+            c = i - 1
+
+            if state == State.CHARGING:
+                if f[i] < f[c]:
+                    time_threshold = t[c] + min_duration_out
+                    new_state = State.MAYBE_FREE
+                else:
+                    end = i
+                    new_state = State.CHARGING
+
+            elif state == State.FREE:
+                if ignore_on_speed and sp[i] > 0:
+                    new_state = State.FREE
+                elif min_duration_sudden is not None and \
+                        f[i] - f[c] > min_volume and t[i] - t[c] > min_duration_sudden:
+                    begin, end = c, i
+                    new_state = State.CHARGING
+                else:
+                    time_threshold = t[c] + min_duration_in
+                    fuel_volume_threshold = f[c] + min_volume
+                    new_state = State.MAYBE_CHARGING
+
+            elif state == State.MAYBE_CHARGING:
+                if ignore_on_speed and sp[i] > 0:
+                    new_state = State.FREE
+                elif ignore_begin_move and not begin_move_threshold[i] < t[i]:
+                    new_state = State.FREE
+                elif f[i] < f[c]:
+                    new_state = State.FREE
+                elif t[i] >= time_threshold and f[i] >= fuel_volume_threshold:
+                    begin, end = state_index, i
+                    new_state = State.CHARGING
+                else:
+                    new_state = State.MAYBE_CHARGING
+
+            else:  # State.MAYBE_FREE
+                if f[i] <= f[c]:
+                    if t[i] >= time_threshold:
+                        intervals.append((begin, end, True))
+                        begin = end = -1
+                        new_state = State.FREE
+                    else:
+                        new_state = State.MAYBE_FREE
+                elif sp[i] > 0:
+                    new_state = State.MAYBE_FREE
+                else:
+                    new_state = State.CHARGING
+
+            if new_state != state:
+                state = new_state
+                state_index = c
+            i += 1
+
+        if begin >= 0:
+            intervals.append((begin, end, False))
+        return intervals
+
+    def make_charge(self, prepared: PreparedFuelSeries, begin: int, end: int, is_complete: bool) -> FuelCharge:
+        series = prepared.series
+        begin_time = series.get_time(prepared.index[begin])
+        volume_begin = prepared.fuel_volume[begin]
+        volume_end = prepared.fuel_volume[end]
+        return FuelCharge(
+            id=FuelChargeId(make_fuel_charge_uuid(
+                "charge", self.organization_id, self.object_id, self.analytic_entity_id, begin_time)),
+            organization_id=self.organization_id,
+            object_id=self.object_id,
+            analytic_entity_id=self.analytic_entity_id,
+            location=series.get_location(prepared.index[begin]),
+            begin=begin_time,
+            volume_begin=volume_begin,
+            is_complete=is_complete,
+            end=series.get_time(prepared.index[end]),
+            volume_end=volume_end,
+            volume=volume_end - volume_begin,
+        )
+
+
+class DischargeBatchEngine:
+    """
+    Пакетное определение сливов по временному ряду бака.
+    Результат совпадает с DischargeFSM (с deterministic_id=True), запущенной на том же ряду с чистого состояния:
+    подтверждённые сливы и последний неоконченный (отменённые не возвращаются).
+    В состоянии NORM цикл перескакивает сразу к следующему сообщению с превышением скорости уменьшения топлива.
+    """
+
+    def __init__(
+            self,
+            organization_id: OrganizationId,
+            object_id: ObjectId,
+            analytic_entity_id: AnalyticEntityId,
+            settings: FuelDischargeSettings,
+    ):
+        self.organization_id = organization_id
+        self.object_id = object_id
+        self.analytic_entity_id = analytic_entity_id
+        self.settings = settings
+
+    def detect(self, series: FuelSeries | PreparedFuelSeries) -> List[FuelDischarge]:
+        """Найти сливы в ряду (последний может быть не окончен)"""
+        prepared = series if isinstance(series, PreparedFuelSeries) else PreparedFuelSeries.prepare(series)
+        return [self.make_discharge(prepared, *interval) for interval in self.detect_intervals(prepared)]
+
+    def detect_intervals(self, prepared: PreparedFuelSeries) -> List[Tuple[int, int, bool]]:
+        """Найти сливы: (индекс начала, индекс окончания, окончен ли) в принятых сообщениях"""
+        settings = self.settings
+        min_volume = settings.min_volume
+        max_fuel_speed = abs(settings.max_fuel_speed)
+        check_duration = _us(DischargeFSM.CHECK_DISCHARGE_DURATION)
+        ignore_on_speed = settings.ignore_on_speed
+        ignore_begin_move = bool(settings.ignore_duration_begin_move)
+        by_median = settings.confirmation == FuelDischargeConfirmation.MEDIAN
+
+        t = prepared.time
+        f = prepared.fuel_volume
+        sp = prepared.speed
+        fs = prepared.fuel_speed
+        begin_move_threshold = _last_threshold(
+            prepared.time_us, prepared.move_begin, settings.ignore_duration_begin_move)
+        stop_time_threshold = _last_threshold(
+            prepared.time_us, prepared.move_stop, settings.min_stoppage_duration)
+        fuel_speed_array = prepared.fuel_speed_array
+        next_fast_drop = _next_index((fuel_speed_array < 0) & (np.abs(fuel_speed_array) > max_fuel_speed))
+
+        size = len(t)
+        intervals = []
+        state = DischargeStateEnum.NORM
+        state_index = 0
+        fuel_volume_threshold = check_time_threshold = None
+        check_stats = RunningStats()
+        check_median: Optional[P2Quantile] = None
+        begin = end = -1
+        i = 1
+        while i < size:
+            if state == DischargeStateEnum.NORM:
+                i = next_fast_drop[i]
+                if i >= size:
+                    break
+            c = i - 1
+
+            if state == DischargeStateEnum.DISCHARGING:
+                if fs[i] == 0 or (fs[i] < 0 and abs(fs[i]) > max_fuel_speed):
+                    end = i
+                    new_state = DischargeStateEnum.DISCHARGING
+                else:
+                    check_time_threshold = t[i] + check_duration
+                    check_stats = RunningStats()
+                    check_median = P2Quantile() if by_median else None
+                    new_state = DischargeStateEnum.EXIT_DISCHARGING
+
+            elif state == DischargeStateEnum.NORM:
+                if ignore_on_speed and sp[i] > 0:
+                    new_state = DischargeStateEnum.NORM
+                elif ignore_begin_move and not begin_move_threshold[i] < t[i]:
+                    new_state = DischargeStateEnum.NORM
+                else:
+                    fuel_volume_threshold = f[c] - min_volume
+                    new_state = DischargeStateEnum.MAYBE_DISCHARGING
+
+            elif state == DischargeStateEnum.MAYBE_DISCHARGING:
+                if ignore_begin_move and not begin_move_threshold[i] < t[i]:
+                    new_state = DischargeStateEnum.NORM
+                elif fs[i] == 0:
+                    new_state = DischargeStateEnum.MAYBE_DISCHARGING
+                elif fs[i] <= 0 and abs(fs[i]) > max_fuel_speed:
+                    if t[i] >= stop_time_threshold[i] and f[i] <= fuel_volume_threshold:
+                        begin, end = state_index, i
+                        new_state = DischargeStateEnum.DISCHARGING
+                    else:
+                        new_state = DischargeStateEnum.MAYBE_DISCHARGING
+                else:
+                    new_state = DischargeStateEnum.NORM
+
+            else:  # DischargeStateEnum.EXIT_DISCHARGING
+                if not t[i] >= check_time_threshold:
+                    if fs[i] <= 0 and abs(fs[i]) > max_fuel_speed and f[i] < f[end]:
+                        new_state = DischargeStateEnum.DISCHARGING
+                    else:
+                        check_stats.add(f[i])
+                        if check_median is not None:
+                            check_median.add(f[i])
+                        new_state = DischargeStateEnum.EXIT_DISCHARGING
+                else:
+                    if check_stats.count:
+                        check_fuel_volume = check_median.get_value() if check_median is not None else check_stats.mean
+                        if f[begin] - check_fuel_volume > min_volume and f[begin] - f[end] > min_volume:
+                            intervals.append((begin, end, True))
+                    begin = end = -1
+                    new_state = DischargeStateEnum.NORM
+
+            if new_state != state:
+                state = new_state
+                state_index = c
+            i += 1
+
+        if begin >= 0:
+            intervals.append((begin, end, False))
+        return intervals
+
+    def make_discharge(
+            self,
+            prepared: PreparedFuelSeries,
+            begin: int,
+            end: int,
+            is_complete: bool
+    ) -> FuelDischarge:
+        series = prepared.series
+        begin_time = series.get_time(prepared.index[begin])
+        volume_begin = prepared.fuel_volume[begin]
+        volume_end = prepared.fuel_volume[end]
+        return FuelDischarge(
+            id=FuelDischargeId(make_fuel_charge_uuid(
+                "discharge", self.organization_id, self.object_id, self.analytic_entity_id, begin_time)),
+            organization_id=self.organization_id,
+            object_id=self.object_id,
+            analytic_entity_id=self.analytic_entity_id,
+            location=series.get_location(prepared.index[begin]),
+            begin=begin_time,
+            volume_begin=volume_begin,
+            is_complete=is_complete,
+            end=series.get_time(prepared.index[end]),
+            volume_end=volume_end,
+            volume=volume_begin - volume_end,
+        )
@@ -0,0 +1,229 @@
+"""
+Колоночный формат телеметрии для многократного воспроизведения.
+
+Каталог содержит массивы .npy (читаются через memory map) и индекс index.json:
+    time.npy        datetime64[us]  время сообщения
+    speed.npy       float64         скорость (0, если нет)
+    location.npy    float64 (N, 2)  координаты (NaN, если нет)
+    fuel_<i>.npy    float64         значение i-го топливного параметра из index.json (NaN, если нет)
+Сообщения каждого объекта лежат подряд и отсортированы по времени, в индексе - смещение и количество.
+"""
+import datetime
+import json
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from dpt.domain.identity import ObjectId, OrganizationId, ObjectModelId
+from dpt.domain.telemetry import AnalyticEntity
+from dpt.geojson import Point
+from .batch import FuelSeries
+from .state import FuelStateData, FuelDataEvent
+from .telemetry import iter_telemetry_file
+from .timeutils import datetime_to_us, us_to_datetime, to_utc
+
+__all__ = (
+    "ColumnarObject",
+    "ColumnarTelemetry",
+    "convert_telemetry_to_columnar",
+)
+
+INDEX_FILE = "index.json"
+
+
+@dataclass
+class ColumnarObject:
+    """Объект в колоночном файле телеметрии"""
+    object_id: ObjectId
+    organization_id: OrganizationId
+    model_id: Optional[ObjectModelId]
+    offset: int
+    """Смещение первого сообщения объекта"""
+    count: int
+    """Количество сообщений объекта"""
+
+
+class PointSequence(Sequence[Optional[Point]]):
+    """Координаты из колонки (N, 2) как последовательность Point без копирования"""
+
+    def __init__(self, coordinates: np.ndarray):
+        self._coordinates = coordinates
+
+    def __len__(self) -> int:
+        return len(self._coordinates)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return PointSequence(self._coordinates[index])
+        x, y = self._coordinates[index]
+        return None if np.isnan(x) else Point((float(x), float(y)))
+
+
+def _uuid(value) -> Optional[uuid.UUID]:
+    return uuid.UUID(value) if value else None
+
+
+class ColumnarTelemetry:
+    """Чтение колоночного файла телеметрии (memory map, срезы без копирования)"""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, INDEX_FILE), 'r') as index_file:
+            index = json.load(index_file)
+        self.attrs: List[str] = index["attrs"]
+        """Топливные параметры (msg_attr)"""
+        self.tzinfo = datetime.timezone.utc if index["utc"] else None
+        self.objects: Dict[ObjectId, ColumnarObject] = {
+            ObjectId(uuid.UUID(item["object_id"])): ColumnarObject(
+                object_id=ObjectId(uuid.UUID(item["object_id"])),
+                organization_id=OrganizationId(_uuid(item["organization_id"])),
+                model_id=ObjectModelId(_uuid(item["model_id"])) if item["model_id"] else None,
+                offset=item["offset"],
+                count=item["count"],
+            )
+            for item in index["objects"]
+        }
+        """Объекты по идентификатору"""
+        self.time = np.load(os.path.join(path, "time.npy"), mmap_mode="r")
+        self.speed = np.load(os.path.join(path, "speed.npy"), mmap_mode="r")
+        self.location = np.load(os.path.join(path, "location.npy"), mmap_mode="r")
+        self.fuel = {
+            attr: np.load(os.path.join(path, f"fuel_{i}.npy"), mmap_mode="r")
+            for i, attr in enumerate(self.attrs)
+        }
+        """Колонки топливных параметров по msg_attr"""
+
+    def object_slice(self, object_id: ObjectId) -> slice:
+        item = self.objects[object_id]
+        return slice(item.offset, item.offset + item.count)
+
+    def series(self, object_id: ObjectId, msg_attr: str) -> FuelSeries:
+        """
+        Ряд бака объекта для пакетного определения (срезы memory map).
+        Копия делается, только если у части сообщений нет значения топлива.
+        """
+        rows = self.object_slice(object_id)
+        fuel = self.fuel[msg_attr][rows]
+        time, speed, location = self.time[rows], self.speed[rows], self.location[rows]
+        present = ~np.isnan(fuel)
+        if not present.all():
+            fuel, time, speed, location = fuel[present], time[present], speed[present], location[present]
+        return FuelSeries(
+            time=time,
+            fuel_volume=fuel,
+            speed=speed,
+            location=PointSequence(location),
+            tzinfo=self.tzinfo,
+        )
+
+    def iter_states(self, object_id: ObjectId, msg_attr: str) -> Iterator[FuelStateData]:
+        """Состояния бака объекта по порядку (для State машин)"""
+        series = self.series(object_id, msg_attr)
+        for i in range(len(series)):
+            yield FuelStateData(
+                time=series.get_time(i),
+                speed=float(series.speed[i]),
+                fuel_volume=float(series.fuel_volume[i]),
+                location=series.location[i],
+            )
+
+    def iter_fuel_events(self, object_id: ObjectId, fuel_entities: Sequence[AnalyticEntity]) -> Iterator[FuelDataEvent]:
+        """
+        Топливные события объекта по порядку сообщений, сразу из колонок (для State машин).
+        Читаются только колонки переданных баков.
+        """
+        item = self.objects[object_id]
+        rows = self.object_slice(object_id)
+        columns = [
+            (fuel_entity, self.fuel[fuel_entity.msg_attr][rows].tolist())
+            for fuel_entity in fuel_entities if fuel_entity.msg_attr in self.fuel
+        ]
+        time = self.time[rows].view(np.int64).tolist()
+        speed = self.speed[rows].tolist()
+        location = PointSequence(self.location[rows])
+        for i in range(item.count):
+            for fuel_entity, fuel in columns:
+                fuel_value = fuel[i]
+                if fuel_value != fuel_value:  # NaN - нет значения
+                    continue
+                yield FuelDataEvent(
+                    organization_id=item.organization_id,
+                    model_id=item.model_id,
+                    object_id=object_id,
+                    fuel_entity=fuel_entity,
+                    state_data=FuelStateData(
+                        time=us_to_datetime(time[i], self.tzinfo),
+                        speed=speed[i],
+                        location=location[i],
+                        fuel_volume=fuel_value,
+                    ),
+                )
+
+
+def convert_telemetry_to_columnar(files: List[str], path: str, attrs: List[str]) -> None:
+    """
+    Преобразовать файлы телеметрии (JSON/NDJSON, в т.ч. gzip) в колоночный формат.
+    Два прохода потоковым чтением: подсчёт сообщений по объектам, затем заполнение колонок.
+    Время хранится в UTC (время без пояса считается UTC). Если у части сообщений время с поясом,
+    при чтении всё время - с поясом UTC, иначе - без пояса.
+    """
+    objects: Dict[str, dict] = {}
+    utc = False
+    for file_name in files:
+        for message in iter_telemetry_file(file_name):
+            object_id = str(message['object_id'])
+            item = objects.get(object_id)
+            if item is None:
+                item = objects[object_id] = {
+                    "object_id": object_id,
+                    "organization_id": str(message['enterprise_id']),
+                    "model_id": str(message['model_id']) if message.get('model_id') else None,
+                    "count": 0,
+                }
+            item["count"] += 1
+            utc = utc or message['time'].tzinfo is not None
+
+    offset = 0
+    for item in objects.values():
+        item["offset"] = offset
+        offset += item["count"]
+    size = offset
+
+    os.makedirs(path, exist_ok=True)
+    open_column = np.lib.format.open_memmap
+    time = open_column(os.path.join(path, "time.npy"), mode="w+", dtype="datetime64[us]", shape=(size,))
+    speed = open_column(os.path.join(path, "speed.npy"), mode="w+", dtype=np.float64, shape=(size,))
+    location = open_column(os.path.join(path, "location.npy"), mode="w+", dtype=np.float64, shape=(size, 2))
+    fuel = [
+        open_column(os.path.join(path, f"fuel_{i}.npy"), mode="w+", dtype=np.float64, shape=(size,))
+        for i in range(len(attrs))
+    ]
+    time_us = time.view(np.int64)
+
+    cursor = {object_id: item["offset"] for object_id, item in objects.items()}
+    for file_name in files:
+        for message in iter_telemetry_file(file_name):
+            object_id = str(message['object_id'])
+            row = cursor[object_id]
+            cursor[object_id] = row + 1
+            time_us[row] = datetime_to_us(to_utc(message['time']))
+            speed[row] = message.get('speed') or 0.0
+            coordinates = message.get('location')
+            location[row] = coordinates[:2] if coordinates else (np.nan, np.nan)
+            for column, attr in zip(fuel, attrs):
+                value = message.get(attr)
+                column[row] = np.nan if value is None else value
+
+    for item in objects.values():
+        rows = slice(item["offset"], item["offset"] + item["count"])
+        order = np.argsort(time_us[rows], kind="stable")
+        for column in (time, speed, location, *fuel):
+            column[rows] = column[rows][order]
+
+    for column in (time, speed, location, *fuel):
+        column.flush()
+
+    with open(os.path.join(path, INDEX_FILE), 'w') as index_file:
+        json.dump({"attrs": attrs, "utc": utc, "objects": list(objects.values())}, index_file)
@@ -1,18 +1,43 @@
 import datetime
 import logging
-from typing import Optional
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import Optional, List, Union
 
 from dpt.domain.alerta import CreateAlertCommand, Alert, AlertTypeId
 from dpt.domain.fuel import FuelChargeSettings, FuelCharge, BeginFuelChargeCommand, EndFuelChargeCommand, \
     SetFuelChargeCommand, FuelDischargeSettings, FuelDischarge, BeginFuelDischargeCommand, SetFuelDischargeCommand, \
-    EndFuelDischargeCommand, DeleteFuelDischargeCommand
+    EndFuelDischargeCommand, DeleteFuelDischargeCommand, FuelDischargeConfirmation
 from dpt.domain.identity import OrganizationId, ObjectId
 from dpt.domain.telemetry import AnalyticEntity
 from dpt.fuel.logic.state import ChargeState, FuelDataEvent, State, FuelStateData, DischargeState, DischargeStateEnum
+from dpt.fuel.metrics import FuelMetrics
 
 logger = logging.getLogger(__name__)
 
 
+class FuelIntentAction(StrEnum):
+    BEGIN = 'BEGIN'
+    """Начало заправки/слива (команда + оповещение)"""
+    UPDATE = 'UPDATE'
+    """Продолжение заправки/слива"""
+    END = 'END'
+    """Окончание заправки/слива (команда + оповещение)"""
+    CANCEL = 'CANCEL'
+    """Отмена слива (не подтвердился)"""
+
+
+@dataclass
+class FuelIntent:
+    """Побочный эффект перехода State машины, который нужно применить"""
+    action: FuelIntentAction
+    """Действие"""
+    object: Union[FuelCharge, FuelDischarge]
+    """Заправка/слив"""
+    time: datetime.datetime
+    """Время события (для оповещения)"""
+
+
 class ChargeFSM:
     """State машина для определения Заправок"""
     SPEED = 0
@@ -24,41 +49,59 @@ class ChargeFSM:
             analytic_entity: AnalyticEntity,
             settings: FuelChargeSettings,
             object_state: ChargeState,
+            deterministic_id: bool = False,
     ):
         self.organization_id = organization_id
         self.object_id = object_id
         self.analytic_entity = analytic_entity
         self.settings = settings
         self.object_state = object_state
+        self.deterministic_id = deterministic_id
 
     def __repr__(self):
         return "<ChargeFSM {!r}>".format(self.object_state)
 
     async def process(self, event: FuelDataEvent) -> Optional[FuelCharge]:
         """Обработать событие с данными о топливе"""
+        intents = self.transition(event)
+        if intents is None:
+            return
+        await self.apply(intents)
+        return self.object_state.current_charge
 
+    def transition(self, event: FuelDataEvent) -> Optional[List[FuelIntent]]:
+        """
+        Переход State машины без побочных эффектов (синхронно, без event loop).
+        Возвращает эффекты для применения или None, если сообщение из прошлого.
+        """
         if event.state_data.time < self.object_state.current_data.time:
-            logger.warning(
-                f"Time from past {event.object_id=} {event.state_data.time=} < {self.object_state.current_data.time}")
+            FuelMetrics().incr("fsm_time_from_past")
+            logger.debug(
+                "Time from past object_id=%s %s < %s",
+                event.object_id, event.state_data.time, self.object_state.current_data.time
+            )
             return
 
         handler = self._map.get(self.object_state.state)
         if handler is None:
             raise TypeError(f"Unknown state {self.object_state.state}")
 
-        await self.begin_move_handler(event)
-        state = await handler(self, event)
+        intents = []
+        self.begin_move_handler(event)
+        state = handler(self, event, intents)
+        if state != self.object_state.state:
+            FuelMetrics().incr("fsm_transitions")
         self.object_state.set_event(event, state)
-        return self.object_state.current_charge
+        return intents
 
-    async def begin_move_handler(self, event: FuelDataEvent) -> None:
+    def begin_move_handler(self, event: FuelDataEvent) -> None:
         """Обработчик начала движения."""
         if self.settings.ignore_duration_begin_move:
             if self.object_state.current_data.speed == 0 and event.state_data.speed > 0:
                 self.object_state.set_begin_move_threshold(
                     event.state_data.time + self.settings.ignore_duration_begin_move)
 
-    async def fsm_charging(self, event: FuelDataEvent) -> State:
+    def fsm_charging(self, event: FuelDataEvent, intents: List[FuelIntent]) -> State:
         """Обработка сообщения в состоянии "ЗАПРАВКА" """
 
         # Если уровень топлива стал меньше, чем в предыдущем состоянии - входим в MAYBE_FREE
@@ -66,10 +109,10 @@ class ChargeFSM:
             self.object_state.set_time_threshold(self.settings.min_duration_out)
             return State.MAYBE_FREE
         else:
-            await self.continue_charging(event)
+            intents.append(self.continue_charging(event))
             return State.CHARGING
 
-    async def fsm_free(self, event: FuelDataEvent) -> State:
+    def fsm_free(self, event: FuelDataEvent, intents: List[FuelIntent]) -> State:
         """Обработка сообщения в состоянии "СВОБОДЕН ОТ ЗАПРАВКИ" """
 
         # Если уровень топлива стал больше, чем в предыдущем сообщении - входим в MAYBE_CHARGING
@@ -87,7 +130,7 @@ class ChargeFSM:
                         time_threshold=self.settings.min_duration_sudden
                 ):
                     # Начинаем заправку с момента предыдущего сообщения
-                    await self.start_charging(begin_state=self.object_state.current_data, event=event)
+                    intents.append(self.start_charging(begin_state=self.object_state.current_data, event=event))
                     return State.CHARGING
 
             self.object_state.set_time_threshold(self.settings.min_duration_in)
@@ -96,7 +139,7 @@ class ChargeFSM:
         else:
             return State.FREE
 
-    async def fsm_maybe_charging(self, event: FuelDataEvent) -> State:
+    def fsm_maybe_charging(self, event: FuelDataEvent, intents: List[FuelIntent]) -> State:
         """Обработка сообщения в состоянии "ВОЗМОЖНО ЗАПРАВКА" """
 
         # Если игнорируем нечаянное определение заправок на скорости и есть скорость - FREE
@@ -116,17 +159,17 @@ class ChargeFSM:
             if self.object_state.time_threshold_is_completed(event.state_data.time) and \
                     self.object_state.fuel_volume_threshold_is_completed(event.state_data.fuel_volume):
                 # Начинаем заправку с момента попадания в MAYBE_CHARGING
-                await self.start_charging(begin_state=self.object_state.state_data, event=event)
+                intents.append(self.start_charging(begin_state=self.object_state.state_data, event=event))
                 return State.CHARGING
             return State.MAYBE_CHARGING
 
-    async def fsm_maybe_free(self, event: FuelDataEvent) -> State:
+    def fsm_maybe_free(self, event: FuelDataEvent, intents: List[FuelIntent]) -> State:
         """Обработка сообщения в состоянии "ВОЗМОЖНО СВОБОДЕН ОТ ЗАПРАВКИ" """
 
         # Если уровень топлива меньше или равен, чем в предыдущем сообщении (+ порог времени) - входим в FREE
         if event.state_data.fuel_volume <= self.object_state.current_data.fuel_volume:
             if self.object_state.time_threshold_is_completed(event.state_data.time):
-                await self.stop_charging(event)
+                intents.append(self.stop_charging(event))
                 return State.FREE
             else:
                 return State.MAYBE_FREE
@@ -144,45 +187,45 @@ class ChargeFSM:
         State.MAYBE_FREE: fsm_maybe_free,
     }
 
-    async def start_charging(self, begin_state: FuelStateData, event: FuelDataEvent):
-        fuel_charge = await self.object_state.start_charging(begin_state, event)
-        await BeginFuelChargeCommand(object=fuel_charge).execute()
-        await CreateAlertCommand(
-            organization_id=self.organization_id,
-            object_id=self.object_id,
-            alert=Alert(
-                resource=self.object_id.hex,
-                event=AlertTypeId("fuel_charge_begin"),
-                service=["fuel"],
-                createTime=begin_state.time,
-                attributes={
-                    "tank_name": self.analytic_entity.name,
-                    "volume_begin": fuel_charge.volume_begin,
-                    "volume_end": fuel_charge.volume_end,
-                    "volume": fuel_charge.volume,
-                    "begin_time": fuel_charge.begin.isoformat(),
-                    "end_time": fuel_charge.end.isoformat(),
-                },
-                text=f"Началась заправка ({self.analytic_entity.name})"
-            ),
-        ).execute()
-        logger.info('Start charging %s', fuel_charge)
-
-    async def continue_charging(self, event: FuelDataEvent):
-        fuel_charge = await self.object_state.continue_charging(event)
-        await SetFuelChargeCommand(object=fuel_charge).execute()
-
-    async def stop_charging(self, event: FuelDataEvent):
-        fuel_charge = await self.object_state.stop_charging(event)
-        await EndFuelChargeCommand(object=fuel_charge).execute()
+    def start_charging(self, begin_state: FuelStateData, event: FuelDataEvent) -> FuelIntent:
+        fuel_charge = self.object_state.start_charging(begin_state, event, self.deterministic_id)
+        return FuelIntent(action=FuelIntentAction.BEGIN, object=fuel_charge, time=begin_state.time)
+
+    def continue_charging(self, event: FuelDataEvent) -> FuelIntent:
+        fuel_charge = self.object_state.continue_charging(event)
+        return FuelIntent(action=FuelIntentAction.UPDATE, object=fuel_charge, time=event.state_data.time)
+
+    def stop_charging(self, event: FuelDataEvent) -> FuelIntent:
+        fuel_charge = self.object_state.stop_charging(event)
+        return FuelIntent(action=FuelIntentAction.END, object=fuel_charge, time=event.state_data.time)
+
+    async def apply(self, intents: List[FuelIntent]) -> None:
+        """Применить эффекты перехода: команды и оповещения"""
+        if intents:
+            FuelMetrics().incr("fsm_writes", len(intents))
+        for intent in intents:
+            fuel_charge = intent.object
+            if intent.action == FuelIntentAction.BEGIN:
+                await BeginFuelChargeCommand(object=fuel_charge).execute()
+                await self.create_alert(intent, "fuel_charge_begin", f"Началась заправка ({self.analytic_entity.name})")
+                logger.info('Start charging %s', fuel_charge)
+            elif intent.action == FuelIntentAction.UPDATE:
+                await SetFuelChargeCommand(object=fuel_charge).execute()
+            elif intent.action == FuelIntentAction.END:
+                await EndFuelChargeCommand(object=fuel_charge).execute()
+                await self.create_alert(intent, "fuel_charge_end", f"Окончилась заправка ({self.analytic_entity.name})")
+                logger.info('Stop charging %s', fuel_charge)
+
+    async def create_alert(self, intent: FuelIntent, alert_type: str, text: str) -> None:
+        fuel_charge = intent.object
         await CreateAlertCommand(
             organization_id=self.organization_id,
             object_id=self.object_id,
             alert=Alert(
                 resource=self.object_id.hex,
-                event=AlertTypeId("fuel_charge_end"),
+                event=AlertTypeId(alert_type),
                 service=["fuel"],
-                createTime=event.state_data.time,
+                createTime=intent.time,
                 attributes={
                     "tank_name": self.analytic_entity.name,
                     "volume_begin": fuel_charge.volume_begin,
@@ -191,10 +234,9 @@ class ChargeFSM:
                     "begin_time": fuel_charge.begin.isoformat(),
                     "end_time": fuel_charge.end.isoformat(),
                 },
-                text=f"Окончилась заправка ({self.analytic_entity.name})"
+                text=text
             ),
         ).execute()
-        logger.info('Stop charging %s', fuel_charge)
 
 
 class DischargeFSM:
@@ -208,35 +250,53 @@ class DischargeFSM:
             analytic_entity: AnalyticEntity,
             settings: FuelDischargeSettings,
             object_state: DischargeState,
+            deterministic_id: bool = False,
     ):
         self.organization_id = organization_id
         self.object_id = object_id
         self.analytic_entity = analytic_entity
         self.settings = settings
         self.object_state = object_state
+        self.deterministic_id = deterministic_id
 
     def __repr__(self):
         return "<DischargeFSM {!r}>".format(self.object_state)
 
     async def process(self, event: FuelDataEvent) -> Optional[FuelDischarge]:
         """Обработать событие с данными о топливе"""
+        intents = self.transition(event)
+        if intents is None:
+            return
+        await self.apply(intents)
+        return self.object_state.current_discharge
 
+    def transition(self, event: FuelDataEvent) -> Optional[List[FuelIntent]]:
+        """
+        Переход State машины без побочных эффектов (синхронно, без event loop).
+        Возвращает эффекты для применения или None, если сообщение из прошлого.
+        """
         if event.state_data.time < self.object_state.current_data.time:
-            logger.warning(
-                f"Time from past {event.object_id=} {event.state_data.time=} < {self.object_state.current_data.time}")
+            FuelMetrics().incr("fsm_time_from_past")
+            logger.debug(
+                "Time from past object_id=%s %s < %s",
+                event.object_id, event.state_data.time, self.object_state.current_data.time
+            )
             return
 
         handler = self._map.get(self.object_state.state)
         if handler is None:
             raise TypeError(f"Unknown state {self.object_state.state}")
 
+        intents = []
         event.state_data.set_fuel_speed(prev_state=self.object_state.current_data)
-        await self.move_handler(event)
-        state = await handler(self, event)
+        self.move_handler(event)
+        state = handler(self, event, intents)
+        if state != self.object_state.state:
+            FuelMetrics().incr("fsm_transitions")
         self.object_state.set_event(event, state)
-        return self.object_state.current_discharge
+        return intents
 
-    async def move_handler(self, event: FuelDataEvent) -> None:
+    def move_handler(self, event: FuelDataEvent) -> None:
         """Обработчик начала движения|остановки"""
 
         # Если началось движение
@@ -252,26 +312,27 @@ class DischargeFSM:
                     event.state_data.time + self.settings.min_stoppage_duration)
                 # todo этот трешходл должен работать только пока машина стоит в остановке
 
-    async def fsm_discharging(self, event: FuelDataEvent) -> DischargeStateEnum:
+    def fsm_discharging(self, event: FuelDataEvent, intents: List[FuelIntent]) -> DischargeStateEnum:
         """Обработка сообщения в состоянии "СЛИВ" """
 
         # Если "скорость уменьшения топлива" стоит на месте (уровень не меняется) - ничего не меняем
         if event.state_data.fuel_speed == 0:
-            await self.continue_discharging(event)
+            intents.append(self.continue_discharging(event))
             return DischargeStateEnum.DISCHARGING
 
         # Если "скорость уменьшения топлива" ВСЁ ВРЕМЯ превышает максимальную - Всё ещё слив
         if event.state_data.fuel_speed < 0 and \
                 abs(event.state_data.fuel_speed) > abs(self.settings.max_fuel_speed):
-            await self.continue_discharging(event)
+            intents.append(self.continue_discharging(event))
             return DischargeStateEnum.DISCHARGING
         else:
             # Выход в состояние "Проверка ложности слива"
             self.object_state.set_check_time_threshold(event.state_data.time + self.CHECK_DISCHARGE_DURATION)
-            self.object_state.clear_check_values()
+            self.object_state.clear_check_values(
+                median=self.settings.confirmation == FuelDischargeConfirmation.MEDIAN)
             return DischargeStateEnum.EXIT_DISCHARGING
 
-    async def fsm_norm(self, event: FuelDataEvent) -> DischargeStateEnum:
+    def fsm_norm(self, event: FuelDataEvent, intents: List[FuelIntent]) -> DischargeStateEnum:
         """Обработка сообщения в состоянии "НОРМА" """
 
         # Если игнорируем нечаянное определение сливов на скорости и есть скорость - NORM
@@ -290,7 +351,7 @@ class DischargeFSM:
         else:
             return DischargeStateEnum.NORM
 
-    async def fsm_maybe_discharging(self, event: FuelDataEvent) -> DischargeStateEnum:
+    def fsm_maybe_discharging(self, event: FuelDataEvent, intents: List[FuelIntent]) -> DischargeStateEnum:
         """Обработка сообщения в состоянии "ВОЗМОЖНО СЛИВ" """
 
         # Если игнорируем сообщения после начала движения, и ещё не дождались порога - NORM
@@ -310,14 +371,14 @@ class DischargeFSM:
             if self.object_state.stop_time_threshold_is_completed(event.state_data.time) and \
                     self.object_state.fuel_volume_threshold_is_completed(event.state_data.fuel_volume):
                 # Начинаем заправку с момента попадания в MAYBE_CHARGING
-                await self.start_discharging(begin_state=self.object_state.state_data, event=event)
+                intents.append(self.start_discharging(begin_state=self.object_state.state_data, event=event))
                 return DischargeStateEnum.DISCHARGING
 
             return DischargeStateEnum.MAYBE_DISCHARGING
         else:
             return DischargeStateEnum.NORM
 
-    async def fsm_exit_discharging(self, event: FuelDataEvent) -> DischargeStateEnum:
+    def fsm_exit_discharging(self, event: FuelDataEvent, intents: List[FuelIntent]) -> DischargeStateEnum:
         """Обработка сообщения в состоянии Выход из слива (Проверка подлинности слива)"""
 
         # Если порог времени на выход ещё не окончен
@@ -334,12 +395,15 @@ class DischargeFSM:
                 self.object_state.add_check_value(event.state_data.fuel_volume)
                 return DischargeStateEnum.EXIT_DISCHARGING
         else:
-            if self.object_state.check_discharge_is_confirmed(min_volume=self.settings.min_volume):
+            if self.object_state.check_discharge_is_confirmed(
+                    min_volume=self.settings.min_volume,
+                    confirmation=self.settings.confirmation,
+            ):
                 # Если слив подтвердился - заканчиваем, сохраняем
-                await self.stop_discharging(event)
+                intents.append(self.stop_discharging(event))
             else:
                 # Если слив НЕ подтвердился - удаляем
-                await self.cancel_discharging()
+                intents.append(self.cancel_discharging(event))
 
             return DischargeStateEnum.NORM
 
@@ -350,17 +414,61 @@ class DischargeFSM:
         DischargeStateEnum.EXIT_DISCHARGING: fsm_exit_discharging,
     }
 
-    async def start_discharging(self, begin_state: FuelStateData, event: FuelDataEvent):
-        fuel_discharge = await self.object_state.start_discharging(begin_state, event)
-        await BeginFuelDischargeCommand(object=fuel_discharge).execute()
+    def start_discharging(self, begin_state: FuelStateData, event: FuelDataEvent) -> FuelIntent:
+        fuel_discharge = self.object_state.start_discharging(begin_state, event, self.deterministic_id)
+        return FuelIntent(action=FuelIntentAction.BEGIN, object=fuel_discharge, time=begin_state.time)
+
+    def continue_discharging(self, event: FuelDataEvent) -> FuelIntent:
+        fuel_discharge = self.object_state.continue_discharging(event)
+        return FuelIntent(action=FuelIntentAction.UPDATE, object=fuel_discharge, time=event.state_data.time)
+
+    def stop_discharging(self, event: FuelDataEvent) -> FuelIntent:
+        """Закончить слив"""
+        fuel_discharge = self.object_state.stop_discharging(event)
+        return FuelIntent(action=FuelIntentAction.END, object=fuel_discharge, time=event.state_data.time)
+
+    def cancel_discharging(self, event: FuelDataEvent) -> FuelIntent:
+        """Отменить неподтвердившийся слив"""
+        fuel_discharge = self.object_state.current_discharge
+        self.object_state.cancel_discharging()
+        return FuelIntent(action=FuelIntentAction.CANCEL, object=fuel_discharge, time=event.state_data.time)
+
+    async def apply(self, intents: List[FuelIntent]) -> None:
+        """Применить эффекты перехода: команды и оповещения"""
+        if intents:
+            FuelMetrics().incr("fsm_writes", len(intents))
+        for intent in intents:
+            fuel_discharge = intent.object
+            if intent.action == FuelIntentAction.BEGIN:
+                await BeginFuelDischargeCommand(object=fuel_discharge).execute()
+                await self.create_alert(
+                    intent, "fuel_discharge_begin", f"Возможно, начался слив топлива ({self.analytic_entity.name})")
+                logger.info('Start Discharging %s', fuel_discharge)
+            elif intent.action == FuelIntentAction.UPDATE:
+                await SetFuelDischargeCommand(object=fuel_discharge).execute()
+            elif intent.action == FuelIntentAction.END:
+                # Оповестить о зафиксированном сливе
+                await EndFuelDischargeCommand(object=fuel_discharge).execute()
+                await self.create_alert(
+                    intent, "fuel_discharge_end", f"Зафиксирован слив топлива ({self.analytic_entity.name})")
+                logger.info('Stop Discharging %s', fuel_discharge)
+            elif intent.action == FuelIntentAction.CANCEL:
+                logger.info('Cancel Discharging id=%s', fuel_discharge)
+                await DeleteFuelDischargeCommand(
+                    object_id=fuel_discharge.id,
+                    organization_id=fuel_discharge.organization_id
+                ).execute()
+
+    async def create_alert(self, intent: FuelIntent, alert_type: str, text: str) -> None:
+        fuel_discharge = intent.object
         await CreateAlertCommand(
             organization_id=self.organization_id,
             object_id=self.object_id,
             alert=Alert(
                 resource=self.object_id.hex,
-                event=AlertTypeId("fuel_discharge_begin"),
+                event=AlertTypeId(alert_type),
                 service=["fuel"],
-                createTime=begin_state.time,
+                createTime=intent.time,
                 attributes={
                     "tank_name": self.analytic_entity.name,
                     "volume_begin": fuel_discharge.volume_begin,
@@ -370,45 +478,6 @@ class DischargeFSM:
                     "begin_time": fuel_discharge.begin.isoformat(),
                     "end_time": fuel_discharge.end.isoformat(),
                 },
-                text=f"Возможно, начался слив топлива ({self.analytic_entity.name})"
-            ),
-        ).execute()
-        logger.info('Start Discharging %s', fuel_discharge)
-
-    async def continue_discharging(self, event: FuelDataEvent):
-        fuel_discharge = await self.object_state.continue_discharging(event)
-        await SetFuelDischargeCommand(object=fuel_discharge).execute()
-
-    async def stop_discharging(self, event: FuelDataEvent):
-        """Закончить слив. Оповестить о зафиксированном сливе"""
-        fuel_discharge = await self.object_state.stop_discharging(event)
-        await EndFuelDischargeCommand(object=fuel_discharge).execute()
-        await CreateAlertCommand(
-            organization_id=self.organization_id,
-            object_id=self.object_id,
-            alert=Alert(
-                resource=self.object_id.hex,
-                event=AlertTypeId("fuel_discharge_end"),
-                service=["fuel"],
-                createTime=event.state_data.time,
-                attributes={
-                    "tank_name": self.analytic_entity.name,
-                    "volume_begin": fuel_discharge.volume_begin,
-                    "volume_end": fuel_discharge.volume_end,
-                    "volume": fuel_discharge.volume,
-                    "begin_time": fuel_discharge.begin.isoformat(),
-                    "end_time": fuel_discharge.end.isoformat(),
-                },
-                text=f"Зафиксирован слив топлива ({self.analytic_entity.name})"
+                text=text
             ),
         ).execute()
-        logger.info('Stop Discharging %s', fuel_discharge)
-
-    async def cancel_discharging(self):
-        logger.info('Cancel Discharging id=%s', self.object_state.current_discharge)
-        await DeleteFuelDischargeCommand(
-            object_id=self.object_state.current_discharge.id,
-            organization_id=self.object_state.current_discharge.organization_id
-        ).execute()
-        await self.object_state.cancel_discharging()
-
@@ -0,0 +1,98 @@
+import datetime
+from array import array
+from typing import List, Optional
+
+from .state import FuelStateData
+from .timeutils import datetime_to_us, us_to_datetime
+
+__all__ = (
+    "FuelHistory",
+)
+
+
+class FuelHistory:
+    """
+    Кольцевой буфер последних значений бака (время, топливо, скорость) фиксированной ёмкости.
+    Данные лежат в трёх array (8 байт на значение), память не больше capacity * 24 байт.
+    Значения добавляются по возрастанию времени, поиск по времени - двоичный.
+    """
+    ITEM_SIZE = 3 * 8
+    """Байт на одно значение"""
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError(f"Capacity must be positive: {capacity}")
+        self.capacity = capacity
+        self._time = array('q', bytes(8 * capacity))
+        self._fuel = array('d', bytes(8 * capacity))
+        self._speed = array('d', bytes(8 * capacity))
+        self._start = 0
+        """Позиция самого старого значения"""
+        self._size = 0
+        self._tzinfo: Optional[datetime.tzinfo] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> FuelStateData:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        position = (self._start + index) % self.capacity
+        return FuelStateData(
+            time=us_to_datetime(self._time[position], self._tzinfo),
+            speed=self._speed[position],
+            fuel_volume=self._fuel[position],
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Занимаемая значениями память, байт"""
+        return self.capacity * self.ITEM_SIZE
+
+    def _time_at(self, index: int) -> int:
+        return self._time[(self._start + index) % self.capacity]
+
+    def append(self, time: datetime.datetime, fuel_volume: float, speed: float) -> bool:
+        """Добавить значение (самое старое вытесняется). Значение раньше последнего не добавляется"""
+        time_us = datetime_to_us(time)
+        if self._size and time_us < self._time_at(self._size - 1):
+            return False
+        if not self._size:
+            self._tzinfo = time.tzinfo
+        if self._size < self.capacity:
+            position = (self._start + self._size) % self.capacity
+            self._size += 1
+        else:
+            position = self._start
+            self._start = (self._start + 1) % self.capacity
+        self._time[position] = time_us
+        self._fuel[position] = fuel_volume
+        self._speed[position] = speed
+        return True
+
+    def bisect(self, time: datetime.datetime) -> int:
+        """Индекс первого значения со временем >= time (len, если таких нет)"""
+        time_us = datetime_to_us(time)
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            if self._time_at(middle) < time_us:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get_at(self, time: datetime.datetime) -> Optional[FuelStateData]:
+        """Последнее значение на момент time (со временем <= time)"""
+        index = self.bisect(time + datetime.timedelta(microseconds=1)) - 1
+        return self[index] if index >= 0 else None
+
+    def between(self, begin: datetime.datetime, end: datetime.datetime) -> List[FuelStateData]:
+        """Значения на интервале [begin, end]"""
+        stop = self.bisect(end + datetime.timedelta(microseconds=1))
+        return [self[index] for index in range(self.bisect(begin), stop)]
+
+    def clear(self) -> None:
+        self._start = self._size = 0
@@ -0,0 +1,82 @@
+import datetime
+import heapq
+import itertools
+from typing import Dict, List, Tuple
+
+from dpt.domain.identity import ObjectId
+from dpt.domain.telemetry import AnalyticEntityId
+from dpt.fuel.metrics import FuelMetrics
+from .state import FuelDataEvent
+
+__all__ = (
+    "FuelReorderBuffer",
+)
+
+
+class FuelReorderBuffer:
+    """
+    Буфер переупорядочивания топливных событий (по каждому объекту и баку).
+    Событие отдаётся в State машину, когда водяной знак (макс. время - допустимое опоздание) его догоняет,
+    или когда буфер ключа переполнен. События старше уже отданных считаются опоздавшими и отбрасываются.
+    """
+
+    def __init__(self, lateness: datetime.timedelta = datetime.timedelta(0), capacity: int = 64):
+        self.lateness = lateness
+        """Допустимое опоздание сообщений"""
+        self.capacity = capacity
+        """Макс. количество событий в буфере одного ключа"""
+        self._heaps: Dict[Tuple[ObjectId, AnalyticEntityId], List[Tuple[datetime.datetime, int, FuelDataEvent]]] = {}
+        self._max_time: Dict[Tuple[ObjectId, AnalyticEntityId], datetime.datetime] = {}
+        self._released_time: Dict[Tuple[ObjectId, AnalyticEntityId], datetime.datetime] = {}
+        self._sequence = itertools.count()
+
+    def pending(self, object_id: ObjectId, analytic_entity_id: AnalyticEntityId) -> bool:
+        """Есть ли в буфере ключа задержанные события ?"""
+        return (object_id, analytic_entity_id) in self._heaps
+
+    def advance(self, object_id: ObjectId, analytic_entity_id: AnalyticEntityId, time: datetime.datetime) -> None:
+        """Отметить событие, обработанное в обход буфера (быстрый путь), как уже отданное"""
+        key = (object_id, analytic_entity_id)
+        max_time = self._max_time.get(key)
+        if max_time is None or time > max_time:
+            self._max_time[key] = time
+        self._released_time[key] = time
+
+    def flush(self, object_id: ObjectId, analytic_entity_id: AnalyticEntityId) -> List[FuelDataEvent]:
+        """Отдать все задержанные события ключа в порядке времени (ключ замолчал - ждать больше нечего)"""
+        key = (object_id, analytic_entity_id)
+        heap = self._heaps.pop(key, [])
+        ready = [heapq.heappop(heap)[2] for _ in range(len(heap))]
+        if ready:
+            self._released_time[key] = ready[-1].state_data.time
+        return ready
+
+    def push(self, event: FuelDataEvent) -> List[FuelDataEvent]:
+        """Положить событие в буфер. Возвращает события, готовые к обработке, в порядке времени"""
+        key = (event.object_id, event.fuel_entity.id)
+        time = event.state_data.time
+
+        released_time = self._released_time.get(key)
+        if released_time is not None and time < released_time:
+            FuelMetrics().incr("reorder_too_late")
+            return []
+
+        max_time = self._max_time.get(key)
+        if max_time is None or time >= max_time:
+            max_time = self._max_time[key] = time
+        else:
+            FuelMetrics().incr("reorder_reordered")
+
+        heap = self._heaps.setdefault(key, [])
+        heapq.heappush(heap, (time, next(self._sequence), event))
+
+        watermark = max_time - self.lateness
+        ready = []
+        while heap and (heap[0][0] <= watermark or len(heap) > self.capacity):
+            ready.append(heapq.heappop(heap)[2])
+
+        if ready:
+            self._released_time[key] = ready[-1].state_data.time
+        if not heap:
+            del self._heaps[key]
+        return ready
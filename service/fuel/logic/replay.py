@@ -0,0 +1,125 @@
+from typing import Dict, List, Optional, Tuple
+
+from dpt.domain.fuel import FuelCharge, FuelDischarge, ObjectFuelSettings, FuelChargeSettings, FuelDischargeSettings
+from dpt.domain.identity import ObjectId, FuelChargeId, FuelDischargeId
+from dpt.domain.telemetry import FullTelemetryEvent, AnalyticEntity, AnalyticEntityId
+from dpt.fuel.storage.interface import IObjectFuelSettingsStorage, IObjectFuelIntervalSettingsStorage
+from dpt.geojson import Point
+from .fsm import ChargeFSM, DischargeFSM, FuelIntent, FuelIntentAction
+from .smoothing import FuelFilterCache
+from .state import ChargeState, DischargeState, FuelDataEvent, FuelStateData
+from .telemetry import make_fuel_data_events
+
+__all__ = (
+    "FuelReplay",
+)
+
+
+class FuelReplay:
+    """
+    Повторная обработка телеметрии (пересчёт истории) без побочных эффектов:
+    State машины только делают переходы, эффекты собираются в charges/discharges.
+    Настройки берутся те, что действовали на время каждого сообщения. Идентификаторы детерминированные,
+    поэтому результат можно записывать поверх ранее найденных заправок/сливов.
+    """
+
+    def __init__(
+            self,
+            fuel_entities: List[AnalyticEntity],
+            settings_storage: IObjectFuelSettingsStorage,
+            interval_settings_storage: IObjectFuelIntervalSettingsStorage,
+    ):
+        self._fuel_entities = fuel_entities
+        self._settings_storage = settings_storage
+        self._interval_settings_storage = interval_settings_storage
+        self._charge_states: Dict[Tuple[ObjectId, AnalyticEntityId], ChargeState] = {}
+        self._discharge_states: Dict[Tuple[ObjectId, AnalyticEntityId], DischargeState] = {}
+        self._filters = FuelFilterCache()
+        self.charges: Dict[FuelChargeId, FuelCharge] = {}
+        """Найденные заправки"""
+        self.discharges: Dict[FuelDischargeId, FuelDischarge] = {}
+        """Найденные сливы"""
+
+    async def process(self, event: FullTelemetryEvent) -> None:
+        """Обработать сообщение телеметрии"""
+        for fuel_entity in self._fuel_entities:
+            fuel_value = event.get_parameter_value(fuel_entity.msg_attr, None)
+            if fuel_value is not None:
+                fuel_event = FuelDataEvent(
+                    organization_id=event.enterprise_id,
+                    model_id=event.model_id,
+                    object_id=event.object_id,
+                    fuel_entity=fuel_entity,
+                    state_data=FuelStateData(
+                        time=event.time,
+                        speed=event.get_parameter_value("speed", 0.0),
+                        location=Point(event.location) if event.location else None,
+                        fuel_volume=fuel_value,
+                    )
+                )
+                await self.process_fuel_event(fuel_event)
+
+    async def process_message(self, message: Dict) -> None:
+        """Обработать сырое сообщение телеметрии (без промежуточного FullTelemetryEvent)"""
+        for fuel_event in make_fuel_data_events(message, self._fuel_entities):
+            await self.process_fuel_event(fuel_event)
+
+    async def process_fuel_event(self, fuel_event: FuelDataEvent) -> None:
+        """Обработать топливное событие обеими State машинами"""
+        key = (fuel_event.object_id, fuel_event.fuel_entity.id)
+        settings = await self.get_settings(fuel_event)
+        fuel_event.state_data.fuel_volume = self._filters.apply(
+            key, settings.smoothing if settings else None, fuel_event.state_data.fuel_volume)
+
+        charge_state = self._charge_states.get(key)
+        if charge_state is None:
+            charge_state = self._charge_states[key] = ChargeState.from_event(fuel_event)
+        intents = ChargeFSM(
+            organization_id=fuel_event.organization_id,
+            object_id=fuel_event.object_id,
+            analytic_entity=fuel_event.fuel_entity,
+            settings=settings.charge if settings else FuelChargeSettings(),
+            object_state=charge_state,
+            deterministic_id=True,
+        ).transition(fuel_event)
+        self.collect(self.charges, intents)
+
+        discharge_state = self._discharge_states.get(key)
+        if discharge_state is None:
+            discharge_state = self._discharge_states[key] = DischargeState.from_event(fuel_event)
+        intents = DischargeFSM(
+            organization_id=fuel_event.organization_id,
+            object_id=fuel_event.object_id,
+            analytic_entity=fuel_event.fuel_entity,
+            settings=settings.discharge if settings else FuelDischargeSettings(),
+            object_state=discharge_state,
+            deterministic_id=True,
+        ).transition(fuel_event)
+        self.collect(self.discharges, intents)
+
+    @staticmethod
+    def collect(results: Dict, intents: Optional[List[FuelIntent]]) -> None:
+        """Применить эффекты перехода к результатам: вместо команд и оповещений - запись/удаление в results"""
+        for intent in intents or ():
+            if intent.action == FuelIntentAction.CANCEL:
+                results.pop(intent.object.id, None)
+            else:
+                results[intent.object.id] = intent.object
+
+    async def get_settings(self, fuel_event: FuelDataEvent) -> Optional[ObjectFuelSettings]:
+        """Настройки, действовавшие на время события (интервальные, затем постоянные)"""
+        settings = await self._interval_settings_storage.get_settings(
+            time=fuel_event.state_data.time,
+            organization_id=fuel_event.organization_id,
+            analytic_entity_id=fuel_event.fuel_entity.id,
+            object_id=fuel_event.object_id,
+            model_id=fuel_event.model_id,
+        )
+        if not settings:
+            settings = await self._settings_storage.get_settings(
+                organization_id=fuel_event.organization_id,
+                analytic_entity_id=fuel_event.fuel_entity.id,
+                object_id=fuel_event.object_id,
+                model_id=fuel_event.model_id
+            )
+        return settings
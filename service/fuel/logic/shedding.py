@@ -0,0 +1,67 @@
+import datetime
+import logging
+from typing import Optional
+
+from dpt.domain.telemetry import FullTelemetryEvent
+from dpt.fuel.metrics import FuelMetrics
+from .state import ChargeState, DischargeState
+
+__all__ = (
+    "FuelLoadShedding",
+)
+
+logger = logging.getLogger(__name__)
+
+
+class FuelLoadShedding:
+    """
+    Сброс нагрузки при отставании от шины.
+    Когда отставание (текущее время - время получения сообщения) превышает порог, сообщения баков
+    в стабильном состоянии (FREE/NORM) прореживаются до одного за interval.
+    Баки в остальных состояниях получают все сообщения. Режим выключается, когда отставание падает ниже половины порога.
+    """
+
+    def __init__(
+            self,
+            lag: Optional[datetime.timedelta] = None,
+            interval: datetime.timedelta = datetime.timedelta(seconds=10),
+    ):
+        self.lag = lag
+        """Отставание, при котором включается режим (None - режим выключен)"""
+        self.interval = interval
+        """Мин. интервал между обрабатываемыми сообщениями стабильного бака"""
+        self.active = False
+        """Режим сброса нагрузки включен"""
+
+    @staticmethod
+    def get_lag(event: FullTelemetryEvent) -> datetime.timedelta:
+        """Отставание обработки сообщения"""
+        receive_time = event.receive_time or event.time
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if receive_time.tzinfo is None:
+            now = now.replace(tzinfo=None)
+        return now - receive_time
+
+    def update(self, event: FullTelemetryEvent) -> bool:
+        """Пересчитать режим по отставанию сообщения. Возвращает, включен ли режим"""
+        if self.lag is None:
+            return False
+
+        lag = self.get_lag(event)
+        if not self.active and lag > self.lag:
+            self.active = True
+            FuelMetrics().incr("shedding_activated")
+            logger.info('Load shedding on, lag %s', lag)
+        elif self.active and lag < self.lag / 2:
+            self.active = False
+            logger.info('Load shedding off, lag %s', lag)
+        return self.active
+
+    def should_drop(self, object_state: Optional[ChargeState | DischargeState], time: datetime.datetime) -> bool:
+        """Можно ли пропустить сообщение бака (только в стабильном состоянии и чаще, чем interval)"""
+        if not self.active or object_state is None or not object_state.is_stable():
+            return False
+        if time - object_state.current_data.time < self.interval:
+            FuelMetrics().incr("shedding_dropped")
+            return True
+        return False
@@ -0,0 +1,197 @@
+import bisect
+from collections import deque
+from typing import Dict, Hashable, Optional, Tuple
+
+from dpt.domain.fuel import FuelSmoothingSettings, FuelSmoothingMethod, FUEL_SMOOTHING_MAX_WINDOW
+from dpt.fuel.metrics import FuelMetrics
+
+__all__ = (
+    "FuelFilter",
+    "MedianFilter",
+    "EmaFilter",
+    "HampelFilter",
+    "make_fuel_filter",
+    "FuelFilterCache",
+)
+
+MAD_SCALE = 1.4826
+"""Масштаб MAD к стандартному отклонению для нормального распределения"""
+
+MAX_WINDOW = FUEL_SMOOTHING_MAX_WINDOW
+"""Макс. окно медианы/Хампеля: обновление фильтра - O(окна), окно ограничено (проверяется при сохранении настроек)"""
+
+
+class FuelFilter:
+    """Фильтр значений датчика бака: значение на входе - сглаженное на выходе"""
+
+    def update(self, value: float) -> float:
+        raise NotImplementedError
+
+
+class _SlidingWindow:
+    """
+    Последние window значений: в порядке поступления и отсортированные (для медианы).
+    Окно ограничено MAX_WINDOW: вставка/удаление в отсортированном списке - O(window) сдвигом памяти,
+    медиана - O(1), MAD - O(window) слиянием без сортировки, т.е. на значение - O(MAX_WINDOW) = O(1).
+    """
+
+    def __init__(self, window: int):
+        self._values: deque = deque()
+        self._sorted = []
+        # Окно проверяется при сохранении настроек, ограничение - защита от записанных до проверки
+        self._window = min(max(1, window), MAX_WINDOW)
+
+    def push(self, value: float) -> None:
+        if len(self._values) == self._window:
+            old = self._values.popleft()
+            del self._sorted[bisect.bisect_left(self._sorted, old)]
+        self._values.append(value)
+        bisect.insort(self._sorted, value)
+
+    def median(self) -> float:
+        return _median(self._sorted)
+
+    def mad(self, median: float) -> float:
+        """
+        Медиана абсолютных отклонений от median.
+        Отклонения значений слева от медианы убывают, справа - возрастают: это два отсортированных ряда,
+        нужные элементы объединения берутся слиянием с двух концов, без сортировки
+        """
+        values = self._sorted
+        size = len(values)
+        right = bisect.bisect_left(values, median)
+        left = right - 1
+        previous = current = 0.0
+        for _ in range(size // 2 + 1):
+            previous = current
+            if right < size and (left < 0 or values[right] - median <= median - values[left]):
+                current = values[right] - median
+                right += 1
+            else:
+                current = median - values[left]
+                left -= 1
+        return current if size % 2 else (previous + current) / 2
+
+
+def _median(values) -> float:
+    """Медиана отсортированного списка"""
+    size = len(values)
+    middle = size // 2
+    return values[middle] if size % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+class MedianFilter(FuelFilter):
+    """Медиана последних window значений (обновление - O(window), окно не больше MAX_WINDOW)"""
+
+    def __init__(self, window: int):
+        self._window = _SlidingWindow(window)
+
+    def update(self, value: float) -> float:
+        self._window.push(value)
+        return self._window.median()
+
+
+class EmaFilter(FuelFilter):
+    """Экспоненциальное скользящее среднее, O(1)"""
+
+    def __init__(self, alpha: float):
+        self._alpha = alpha
+        self._value: Optional[float] = None
+
+    def update(self, value: float) -> float:
+        if self._value is None:
+            self._value = value
+        else:
+            self._value += self._alpha * (value - self._value)
+        return self._value
+
+
+class HampelFilter(FuelFilter):
+    """
+    Фильтр Хампеля по последним window значениям: если значение отличается от медианы окна
+    больше чем на threshold * MAD * 1.4826 - заменяется медианой, иначе проходит без изменений.
+    """
+
+    def __init__(self, window: int, threshold: float):
+        self._window = _SlidingWindow(window)
+        self._threshold = threshold
+
+    def update(self, value: float) -> float:
+        self._window.push(value)
+        median = self._window.median()
+        if abs(value - median) > self._threshold * MAD_SCALE * self._window.mad(median):
+            return median
+        return value
+
+
+def make_fuel_filter(settings: Optional[FuelSmoothingSettings]) -> Optional[FuelFilter]:
+    """Фильтр по настройкам (None - без сглаживания)"""
+    if settings is None:
+        return None
+    match settings.method:
+        case FuelSmoothingMethod.MEDIAN:
+            return MedianFilter(settings.window)
+        case FuelSmoothingMethod.EMA:
+            return EmaFilter(settings.alpha)
+        case FuelSmoothingMethod.HAMPEL:
+            return HampelFilter(settings.window, settings.threshold)
+    return None
+
+
+class _FilterEntry:
+    """Фильтр бака и счётчики разворотов направления изменения уровня до и после фильтра"""
+
+    def __init__(self, settings: FuelSmoothingSettings, fuel_filter: FuelFilter):
+        self.settings = settings
+        self.fuel_filter = fuel_filter
+        self.raw: Optional[float] = None
+        self.raw_direction = 0
+        self.smoothed: Optional[float] = None
+        self.smoothed_direction = 0
+
+
+def _reversal(previous: Optional[float], value: float, direction: int) -> Tuple[int, bool]:
+    """Новое направление изменения значения и был ли разворот (рост после падения или наоборот)"""
+    if previous is None or value == previous:
+        return direction, False
+    new_direction = 1 if value > previous else -1
+    return new_direction, direction != 0 and new_direction != direction
+
+
+class FuelFilterCache:
+    """
+    Фильтры по бакам (объект + бак), пересоздаются при смене настроек сглаживания.
+    Эффект сглаживания - счётчики FuelMetrics: smoothing_reversals_raw / smoothing_reversals_smoothed
+    (развороты направления уровня топлива, каждый - потенциальный ложный переход State машины)
+    и smoothing_changed / smoothing_total.
+    """
+
+    def __init__(self):
+        self._filters: Dict[Hashable, _FilterEntry] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._filters
+
+    def apply(self, key: Hashable, settings: Optional[FuelSmoothingSettings], value: float) -> float:
+        """Сгладить значение бака фильтром по настройкам"""
+        entry = self._filters.get(key)
+        if entry is None or entry.settings != settings:
+            fuel_filter = make_fuel_filter(settings)
+            if fuel_filter is None:
+                self._filters.pop(key, None)
+                return value
+            entry = self._filters[key] = _FilterEntry(settings, fuel_filter)
+
+        smoothed = entry.fuel_filter.update(value)
+        metrics = FuelMetrics()
+        metrics.incr("smoothing_total")
+        if smoothed != value:
+            metrics.incr("smoothing_changed")
+        entry.raw_direction, reversal = _reversal(entry.raw, value, entry.raw_direction)
+        if reversal:
+            metrics.incr("smoothing_reversals_raw")
+        entry.smoothed_direction, reversal = _reversal(entry.smoothed, smoothed, entry.smoothed_direction)
+        if reversal:
+            metrics.incr("smoothing_reversals_smoothed")
+        entry.raw, entry.smoothed = value, smoothed
+        return smoothed
@@ -1,13 +1,35 @@
 import datetime
+import uuid
 from dataclasses import dataclass, replace, field
 from enum import StrEnum
-from typing import Optional, Self, List
+from typing import Optional, Self
 
-from dpt.domain.fuel import FuelCharge, FuelDischarge
+from dpt.domain.fuel import FuelCharge, FuelDischarge, FuelDischargeConfirmation, LiveFuelState, LiveFuelStateKind
 from dpt.domain.identity import OrganizationId, ObjectId, ObjectModelId, FuelChargeId, FuelDischargeId
-from dpt.domain.telemetry import AnalyticEntity
+from dpt.domain.telemetry import AnalyticEntity, AnalyticEntityId
 from dpt.geojson import Point
 from dpt.utils import gen_uuid
+from .stats import RunningStats, P2Quantile
+
+
+FUEL_CHARGE_NAMESPACE = uuid.UUID("6f3b2a1e-8d4c-5b7a-9e0f-1c2d3e4f5a6b")
+"""Пространство имён для детерминированных идентификаторов заправок/сливов"""
+
+
+def make_fuel_charge_uuid(
+        kind: str,
+        organization_id: OrganizationId,
+        object_id: ObjectId,
+        analytic_entity_id: AnalyticEntityId,
+        begin: datetime.datetime,
+) -> uuid.UUID:
+    """
+    Детерминированный идентификатор заправки/слива.
+    Одинаковые (организация, объект, бак, время начала) всегда дают один и тот же идентификатор,
+    поэтому повторная обработка телеметрии перезаписывает документ, а не создаёт дубликат.
+    """
+    name = f"{kind}:{organization_id}:{object_id}:{analytic_entity_id}:{begin.isoformat()}"
+    return uuid.uuid5(FUEL_CHARGE_NAMESPACE, name)
 
 
 @dataclass
@@ -84,6 +106,31 @@ class ChargeState:
 
         self.current_data = replace(event.state_data)     # Меняем текущие данные state
 
+    def is_stable(self) -> bool:
+        """Стабильное состояние (нет заправки и подозрения на неё)"""
+        return self.state == State.FREE
+
+    def advance_quiescent(
+            self,
+            time: datetime.datetime,
+            speed: float,
+            fuel_volume: float,
+            location: Optional[Point] = None,
+    ) -> bool:
+        """
+        Быстрый путь для стоящей техники в состоянии FREE: скорости нет, уровень топлива не изменился.
+        Такое сообщение заведомо не меняет состояние, поэтому только сдвигаем время и положение текущих данных
+        (как State машина, которая заменяет текущие данные данными сообщения).
+        """
+        current_data = self.current_data
+        if self.state != State.FREE or speed != 0 or current_data.speed != 0 or \
+                fuel_volume != current_data.fuel_volume or time < current_data.time:
+            return False
+        current_data.time = time
+        current_data.location = location
+        current_data.fuel_speed = 0.0
+        return True
+
     def set_begin_move_threshold(self, begin_move_threshold: datetime.datetime):
         """Время, когда можно обрабатывать сообщения (после начала движения)"""
         self.begin_move_threshold = begin_move_threshold
@@ -112,6 +159,34 @@ class ChargeState:
         """Задать текущую заправку"""
         self.current_charge = current_charge
 
+    def pending_threshold(self) -> Optional[datetime.datetime]:
+        """Пороговое время, по наступлении которого состояние должно завершиться даже без новых сообщений"""
+        if self.state == State.MAYBE_FREE:
+            return self.time_threshold
+
+    def get_live_state(
+            self,
+            organization_id: OrganizationId,
+            object_id: ObjectId,
+            analytic_entity_id: AnalyticEntityId,
+    ) -> LiveFuelState:
+        """Снимок состояния"""
+        return LiveFuelState(
+            kind=LiveFuelStateKind.CHARGE,
+            organization_id=organization_id,
+            object_id=object_id,
+            analytic_entity_id=analytic_entity_id,
+            state=self.state,
+            time=self.current_data.time,
+            fuel_volume=self.current_data.fuel_volume,
+            speed=self.current_data.speed,
+            state_time=self.state_data.time,
+            begin=self.current_charge.begin if self.current_charge else None,
+            volume=self.current_charge.volume if self.current_charge else None,
+            time_threshold=self.time_threshold,
+            fuel_volume_threshold=self.fuel_volume_threshold,
+        )
+
     def is_sudden_charge(self, event: FuelDataEvent, min_fuel_volume: float, time_threshold: datetime.timedelta) -> bool:
         """
         Произошла ли внезапная заправка в этом сообщении ?
@@ -121,11 +196,21 @@ class ChargeState:
         delta = event.state_data.time - self.current_data.time
         return volume > min_fuel_volume and delta > time_threshold
 
-    async def start_charging(self, begin_state: FuelStateData, event: FuelDataEvent) -> FuelCharge:
+    def start_charging(
+            self,
+            begin_state: FuelStateData,
+            event: FuelDataEvent,
+            deterministic_id: bool = False,
+    ) -> FuelCharge:
         """Начинаем заправку, когда мы в состоянии MAYBE_CHARGING (перед переходом в CHARGING) """
         volume = event.state_data.fuel_volume - begin_state.fuel_volume
+        if deterministic_id:
+            charge_id = make_fuel_charge_uuid(
+                "charge", event.organization_id, event.object_id, event.fuel_entity.id, begin_state.time)
+        else:
+            charge_id = gen_uuid()
         fuel_charge = FuelCharge(
-            id=FuelChargeId(gen_uuid()),
+            id=FuelChargeId(charge_id),
             organization_id=event.organization_id,
             object_id=event.object_id,
             analytic_entity_id=event.fuel_entity.id,
@@ -142,14 +227,14 @@ class ChargeState:
         self.set_current_charge(fuel_charge)
         return fuel_charge
 
-    async def continue_charging(self, event: FuelDataEvent) -> FuelCharge:
+    def continue_charging(self, event: FuelDataEvent) -> FuelCharge:
         """Продолжаем заправку, когда мы в состоянии CHARGING """
         self.current_charge.end = event.state_data.time
         self.current_charge.volume_end = event.state_data.fuel_volume
         self.current_charge.volume = self.current_charge.volume_end - self.current_charge.volume_begin
         return self.current_charge
 
-    async def stop_charging(self, event: FuelDataEvent) -> FuelCharge:
+    def stop_charging(self, event: FuelDataEvent) -> FuelCharge:
         """Оканчиваем заправку, когда мы в состоянии MAYBE_FREE (перед переходом в FREE) """
         self.current_charge.is_complete = True
         return self.current_charge
@@ -222,8 +307,10 @@ class DischargeState:
 
     check_time_threshold: Optional[datetime.datetime] = None
     """Пороговое время. Время окончания состояния "Выход из слива" """
-    check_values: List[float] = field(default_factory=list)
-    """ Значения уровня топлива в состоянии "Выход из слива" """
+    check_stats: RunningStats = field(default_factory=RunningStats)
+    """Статистика уровня топлива в состоянии "Выход из слива" (без хранения самих значений)"""
+    check_median: Optional[P2Quantile] = None
+    """Оценка медианы уровня топлива в состоянии "Выход из слива" (при подтверждении по медиане)"""
 
     def set_event(self, event: FuelDataEvent, state: DischargeStateEnum):
         if self.state != state:
@@ -232,6 +319,31 @@ class DischargeState:
 
         self.current_data = replace(event.state_data)     # Меняем текущие данные state
 
+    def is_stable(self) -> bool:
+        """Стабильное состояние (нет слива и подозрения на него)"""
+        return self.state == DischargeStateEnum.NORM
+
+    def advance_quiescent(
+            self,
+            time: datetime.datetime,
+            speed: float,
+            fuel_volume: float,
+            location: Optional[Point] = None,
+    ) -> bool:
+        """
+        Быстрый путь для стоящей техники в состоянии NORM: скорости нет, уровень топлива не изменился.
+        Такое сообщение заведомо не меняет состояние, поэтому только сдвигаем время и положение текущих данных
+        (как State машина, которая заменяет текущие данные данными сообщения).
+        """
+        current_data = self.current_data
+        if self.state != DischargeStateEnum.NORM or speed != 0 or current_data.speed != 0 or \
+                fuel_volume != current_data.fuel_volume or time < current_data.time:
+            return False
+        current_data.time = time
+        current_data.location = location
+        current_data.fuel_speed = 0.0
+        return True
+
     def set_begin_move_threshold(self, begin_move_threshold: datetime.datetime):
         """Время, когда можно обрабатывать сообщения (после начала движения)"""
         self.begin_move_threshold = begin_move_threshold
@@ -267,35 +379,88 @@ class DischargeState:
     def add_check_value(self, value: float):
         """Добавить значение топлива в период проверки ложности слива"""
         if value is not None:
-            self.check_values.append(value)
+            self.check_stats.add(value)
+            if self.check_median is not None:
+                self.check_median.add(value)
 
-    def clear_check_values(self):
-        """Очистить значения проверки ложности слива"""
-        self.check_values = []
+    def clear_check_values(self, median: bool = False):
+        """Очистить значения проверки ложности слива (median - оценивать также медиану)"""
+        self.check_stats = RunningStats()
+        self.check_median = P2Quantile() if median else None
 
     def check_time_threshold_is_complete(self, time: datetime.datetime):
         """Наступило ли пороговое время проверки ложности слива ?"""
         return time >= self.check_time_threshold
 
-    def check_discharge_is_confirmed(self, min_volume: float) -> bool:
+    def pending_threshold(self) -> Optional[datetime.datetime]:
+        """Пороговое время, по наступлении которого состояние должно завершиться даже без новых сообщений"""
+        if self.state == DischargeStateEnum.EXIT_DISCHARGING:
+            return self.check_time_threshold
+
+    def get_live_state(
+            self,
+            organization_id: OrganizationId,
+            object_id: ObjectId,
+            analytic_entity_id: AnalyticEntityId,
+    ) -> LiveFuelState:
+        """Снимок состояния"""
+        return LiveFuelState(
+            kind=LiveFuelStateKind.DISCHARGE,
+            organization_id=organization_id,
+            object_id=object_id,
+            analytic_entity_id=analytic_entity_id,
+            state=self.state,
+            time=self.current_data.time,
+            fuel_volume=self.current_data.fuel_volume,
+            speed=self.current_data.speed,
+            state_time=self.state_data.time,
+            begin=self.current_discharge.begin if self.current_discharge else None,
+            volume=self.current_discharge.volume if self.current_discharge else None,
+            time_threshold=self.stop_time_threshold,
+            fuel_volume_threshold=self.fuel_volume_threshold,
+            check_time_threshold=self.check_time_threshold,
+        )
+
+    def check_discharge_is_confirmed(
+            self,
+            min_volume: float,
+            confirmation: FuelDischargeConfirmation = FuelDischargeConfirmation.MEAN,
+    ) -> bool:
         """Проверка подтвердилась ли заправка или ложная"""
-        avg_fuel_volume = self.get_check_avg_fuel_volume()
-        if avg_fuel_volume is not None:
-            # Если разница уровня топлива на начало слива и средним значение на выходе из слива больше MIN
+        if confirmation == FuelDischargeConfirmation.MEDIAN and self.check_median is not None:
+            check_fuel_volume = self.get_check_median_fuel_volume()
+        else:
+            check_fuel_volume = self.get_check_avg_fuel_volume()
+        if check_fuel_volume is not None:
+            # Если разница уровня топлива на начало слива и средним (медианой) на выходе из слива больше MIN
             # И общий объём слива больше MIN - считаем слив подтвержденным.
-            delta = self.current_discharge.volume_begin - avg_fuel_volume
+            delta = self.current_discharge.volume_begin - check_fuel_volume
             return delta > min_volume and self.current_discharge.volume > min_volume
 
     def get_check_avg_fuel_volume(self) -> Optional[float]:
         """Получить средний уровень топлива за время проверки ложности слива"""
-        if self.check_values:
-            return sum(self.check_values) / len(self.check_values)
-
-    async def start_discharging(self, begin_state: FuelStateData, event: FuelDataEvent) -> FuelDischarge:
+        return self.check_stats.get_mean()
+
+    def get_check_median_fuel_volume(self) -> Optional[float]:
+        """Получить оценку медианы уровня топлива за время проверки ложности слива"""
+        if self.check_median is not None:
+            return self.check_median.get_value()
+
+    def start_discharging(
+            self,
+            begin_state: FuelStateData,
+            event: FuelDataEvent,
+            deterministic_id: bool = False,
+    ) -> FuelDischarge:
         """Начинаем слив"""
         volume = begin_state.fuel_volume - event.state_data.fuel_volume
+        if deterministic_id:
+            discharge_id = make_fuel_charge_uuid(
+                "discharge", event.organization_id, event.object_id, event.fuel_entity.id, begin_state.time)
+        else:
+            discharge_id = gen_uuid()
         fuel_discharge = FuelDischarge(
-            id=FuelDischargeId(gen_uuid()),
+            id=FuelDischargeId(discharge_id),
             organization_id=event.organization_id,
             object_id=event.object_id,
             analytic_entity_id=event.fuel_entity.id,
@@ -312,17 +477,17 @@ class DischargeState:
         self.set_current_discharge(fuel_discharge)
         return fuel_discharge
 
-    async def continue_discharging(self, event: FuelDataEvent) -> Optional[FuelDischarge]:
+    def continue_discharging(self, event: FuelDataEvent) -> Optional[FuelDischarge]:
         """Продолжаем слив"""
         self.current_discharge.end = event.state_data.time
         self.current_discharge.volume_end = event.state_data.fuel_volume
         self.current_discharge.volume = self.current_discharge.volume_begin - self.current_discharge.volume_end
         return self.current_discharge
 
-    async def cancel_discharging(self) -> None:
+    def cancel_discharging(self) -> None:
         self.current_discharge = None
 
-    async def stop_discharging(self, event: FuelDataEvent) -> Optional[FuelDischarge]:
+    def stop_discharging(self, event: FuelDataEvent) -> Optional[FuelDischarge]:
         """Оканчиваем слив """
         self.current_discharge.is_complete = True
         return self.current_discharge
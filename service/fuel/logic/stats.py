@@ -0,0 +1,110 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+__all__ = (
+    "RunningStats",
+    "P2Quantile",
+)
+
+
+@dataclass
+class RunningStats:
+    """Потоковые среднее и дисперсия (алгоритм Уэлфорда), память не зависит от количества значений"""
+    count: int = 0
+    """Количество значений"""
+    mean: float = 0.0
+    """Среднее"""
+    m2: float = 0.0
+    """Сумма квадратов отклонений от среднего"""
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        """Выборочная дисперсия"""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def get_mean(self) -> Optional[float]:
+        """Среднее или None, если значений не было"""
+        return self.mean if self.count else None
+
+
+@dataclass
+class P2Quantile:
+    """
+    Потоковая оценка квантиля алгоритмом P² (Jain, Chlamtac) на пяти маркерах.
+    Пока значений меньше пяти - квантиль считается точно по ним.
+    """
+    p: float = 0.5
+    """Квантиль (0.5 - медиана)"""
+    count: int = 0
+    """Количество значений"""
+    heights: List[float] = field(default_factory=list)
+    """Высоты маркеров (первые пять значений до инициализации)"""
+    positions: List[int] = field(default_factory=lambda: [1, 2, 3, 4, 5])
+    """Позиции маркеров"""
+    desired: List[float] = field(default_factory=list)
+    """Желаемые позиции маркеров"""
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        heights = self.heights
+        if self.count <= 5:
+            heights.append(value)
+            if self.count == 5:
+                heights.sort()
+                p = self.p
+                self.desired = [1.0, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5.0]
+            return
+
+        if value < heights[0]:
+            heights[0] = value
+            k = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= heights[k + 1]:
+                k += 1
+
+        positions = self.positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        p = self.p
+        for i, increment in enumerate((0.0, p / 2, p, (1 + p) / 2, 1.0)):
+            self.desired[i] += increment
+
+        for i in (1, 2, 3):
+            delta = self.desired[i] - positions[i]
+            if (delta >= 1 and positions[i + 1] - positions[i] > 1) or \
+                    (delta <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if delta > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def get_value(self) -> Optional[float]:
+        """Оценка квантиля или None, если значений не было"""
+        if not self.count:
+            return None
+        if self.count < 5:
+            values = sorted(self.heights)
+            position = self.p * (len(values) - 1)
+            lower = int(position)
+            upper = min(lower + 1, len(values) - 1)
+            return values[lower] + (values[upper] - values[lower]) * (position - lower)
+        return self.heights[2]
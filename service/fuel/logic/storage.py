@@ -1,10 +1,11 @@
-from typing import Optional, Dict, Tuple
+from typing import Optional, Dict, Iterator, List, Set, Tuple
 from dpt.component.utils import Singleton
 from dpt.domain.identity import ObjectId, OrganizationId
 from dpt.domain.telemetry import AnalyticEntityId
-from .state import ChargeState, FuelDataEvent, DischargeState
+from .history import FuelHistory
+from .state import ChargeState, FuelDataEvent, DischargeState, FuelStateData
 
-from dpt.domain.fuel import LastFuelChargeQuery, LastFuelDischargeQuery
+from dpt.domain.fuel import LastFuelChargeQuery, LastFuelDischargeQuery, LiveFuelState
 
 __all__ = (
     "FuelChargeStateStorage",
@@ -12,11 +13,77 @@ __all__ = (
 )
 
 
-class FuelChargeStateStorage(metaclass=Singleton):
+class LiveStateIndexMixin:
+    """
+    Баки с состоянием в памяти по организациям и объектам - для снимка текущих состояний.
+    Только этого процесса: одного вида (заправки или сливы) и только его части объектов
+    """
+
+    def _init_live_index(self) -> None:
+        self._objects: Dict[OrganizationId, Dict[ObjectId, Set[AnalyticEntityId]]] = {}
+        self._organizations: Dict[ObjectId, OrganizationId] = {}
+
+    def _index_key(self, organization_id: OrganizationId, object_id: ObjectId, analytic_entity_id: AnalyticEntityId):
+        previous = self._organizations.get(object_id)
+        analytic_entity_ids = self._objects.setdefault(organization_id, {}).get(object_id)
+        if previous is not None and previous != organization_id:
+            # Объект перешёл в другую организацию - вместе со всеми своими баками
+            moved = self._objects[previous].pop(object_id, set())
+            if not self._objects[previous]:
+                del self._objects[previous]
+            analytic_entity_ids = moved | (analytic_entity_ids or set())
+        if analytic_entity_ids is None:
+            analytic_entity_ids = set()
+        analytic_entity_ids.add(analytic_entity_id)
+        self._objects[organization_id][object_id] = analytic_entity_ids
+        self._organizations[object_id] = organization_id
+
+    def _select_keys(
+            self,
+            organization_id: Optional[OrganizationId] = None,
+            object_id: Optional[ObjectId | List[ObjectId]] = None,
+    ) -> Iterator[Tuple[OrganizationId, ObjectId, AnalyticEntityId]]:
+        """Баки организации и/или объектов (без фильтров - все)"""
+        if object_id is not None:
+            object_ids = object_id if isinstance(object_id, list) else [object_id]
+            pairs = [
+                (self._organizations[item], item) for item in object_ids
+                if item in self._organizations
+                and (organization_id is None or self._organizations[item] == organization_id)
+            ]
+        elif organization_id is not None:
+            pairs = [(organization_id, item) for item in self._objects.get(organization_id, ())]
+        else:
+            pairs = [(organization, item) for organization, objects in self._objects.items() for item in objects]
+        for organization, item in pairs:
+            for analytic_entity_id in self._objects[organization][item]:
+                yield organization, item, analytic_entity_id
+
+    def get_live_states(
+            self,
+            organization_id: Optional[OrganizationId] = None,
+            object_id: Optional[ObjectId | List[ObjectId]] = None,
+    ) -> List[LiveFuelState]:
+        """
+        Снимки текущих состояний баков этого процесса (только память, без обращения к базе).
+        Не снимок всего парка: баки, которые обрабатывают другие процессы, сюда не попадают
+        """
+        states = []
+        for organization, item, analytic_entity_id in self._select_keys(organization_id, object_id):
+            state = self._state.get((item, analytic_entity_id))
+            if state is not None:
+                states.append(state.get_live_state(organization, item, analytic_entity_id))
+        return states
+
+
+class FuelChargeStateStorage(LiveStateIndexMixin, metaclass=Singleton):
     """Хранилище состояний заправки"""
 
     def __init__(self):
         self._state: Dict[Tuple[ObjectId, AnalyticEntityId], ChargeState] = {}
+        self._history: Dict[Tuple[ObjectId, AnalyticEntityId], FuelHistory] = {}
+        self._history_depth = 0
+        self._init_live_index()
 
     async def get(self, event: FuelDataEvent) -> ChargeState:
         object_id = event.object_id
@@ -28,11 +95,39 @@ class FuelChargeStateStorage(metaclass=Singleton):
             if state is None:
                 state = ChargeState.from_event(event)
             self._state[key] = state
+            self._index_key(organization_id, object_id, analytic_entity_id)
+        elif self._organizations.get(object_id) != organization_id:
+            # Объект перешёл в другую организацию, бак уже в памяти - переносим объект в индексе
+            self._index_key(organization_id, object_id, analytic_entity_id)
         return self._state[key]
 
     async def set(self, object_id: ObjectId, analytic_entity_id: AnalyticEntityId, state: ChargeState) -> None:
         self._state[(object_id, analytic_entity_id)] = state
 
+    def peek(self, object_id: ObjectId, analytic_entity_id: AnalyticEntityId) -> Optional[ChargeState]:
+        """Состояние, если оно уже есть в памяти (без загрузки)"""
+        return self._state.get((object_id, analytic_entity_id))
+
+    def set_history_depth(self, depth: int) -> None:
+        """Хранить по каждому баку последние depth значений (0 - не хранить)"""
+        self._history_depth = depth
+        if not depth:
+            self._history.clear()
+
+    def record(self, object_id: ObjectId, analytic_entity_id: AnalyticEntityId, state_data: FuelStateData) -> None:
+        """Запомнить значение бака в истории (если история включена)"""
+        if not self._history_depth:
+            return
+        key = (object_id, analytic_entity_id)
+        history = self._history.get(key)
+        if history is None:
+            history = self._history[key] = FuelHistory(self._history_depth)
+        history.append(state_data.time, state_data.fuel_volume, state_data.speed)
+
+    def get_history(self, object_id: ObjectId, analytic_entity_id: AnalyticEntityId) -> Optional[FuelHistory]:
+        """Последние значения бака (None, если история выключена или значений не было)"""
+        return self._history.get((object_id, analytic_entity_id))
+
     async def load_state(
             self,
             object_id:
@@ -49,11 +144,14 @@ class FuelChargeStateStorage(metaclass=Singleton):
             return ChargeState.from_charge(charge)
 
 
-class FuelDischargeStateStorage(metaclass=Singleton):
+class FuelDischargeStateStorage(LiveStateIndexMixin, metaclass=Singleton):
     """Хранилище состояний сливов"""
 
     def __init__(self):
         self._state: Dict[Tuple[ObjectId, AnalyticEntityId], DischargeState] = {}
+        self._history: Dict[Tuple[ObjectId, AnalyticEntityId], FuelHistory] = {}
+        self._history_depth = 0
+        self._init_live_index()
 
     async def get(self, event: FuelDataEvent) -> DischargeState:
         object_id = event.object_id
@@ -65,11 +163,39 @@ class FuelDischargeStateStorage(metaclass=Singleton):
             if state is None:
                 state = DischargeState.from_event(event)
             self._state[key] = state
+            self._index_key(organization_id, object_id, analytic_entity_id)
+        elif self._organizations.get(object_id) != organization_id:
+            # Объект перешёл в другую организацию, бак уже в памяти - переносим объект в индексе
+            self._index_key(organization_id, object_id, analytic_entity_id)
         return self._state[key]
 
     async def set(self, object_id: ObjectId, analytic_entity_id: AnalyticEntityId, state: DischargeState) -> None:
         self._state[(object_id, analytic_entity_id)] = state
 
+    def peek(self, object_id: ObjectId, analytic_entity_id: AnalyticEntityId) -> Optional[DischargeState]:
+        """Состояние, если оно уже есть в памяти (без загрузки)"""
+        return self._state.get((object_id, analytic_entity_id))
+
+    def set_history_depth(self, depth: int) -> None:
+        """Хранить по каждому баку последние depth значений (0 - не хранить)"""
+        self._history_depth = depth
+        if not depth:
+            self._history.clear()
+
+    def record(self, object_id: ObjectId, analytic_entity_id: AnalyticEntityId, state_data: FuelStateData) -> None:
+        """Запомнить значение бака в истории (если история включена)"""
+        if not self._history_depth:
+            return
+        key = (object_id, analytic_entity_id)
+        history = self._history.get(key)
+        if history is None:
+            history = self._history[key] = FuelHistory(self._history_depth)
+        history.append(state_data.time, state_data.fuel_volume, state_data.speed)
+
+    def get_history(self, object_id: ObjectId, analytic_entity_id: AnalyticEntityId) -> Optional[FuelHistory]:
+        """Последние значения бака (None, если история выключена или значений не было)"""
+        return self._history.get((object_id, analytic_entity_id))
+
     async def load_state(
             self,
             object_id: ObjectId,
@@ -0,0 +1,87 @@
+import dataclasses
+import datetime
+import itertools
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple, Union
+
+from dpt.domain.fuel import FuelChargeSettings, FuelDischargeSettings
+from .batch import PreparedFuelSeries, ChargeBatchEngine, DischargeBatchEngine
+
+__all__ = (
+    "SweepTotals",
+    "make_settings_variants",
+    "parse_settings_value",
+    "sweep_series",
+)
+
+Settings = Union[FuelChargeSettings, FuelDischargeSettings]
+
+
+@dataclass
+class SweepTotals:
+    """Итог варианта настроек по всем рядам"""
+    count: int = 0
+    """Найдено заправок/сливов"""
+    complete: int = 0
+    """Из них окончено"""
+    volume: float = 0.0
+    """Суммарный объём, л"""
+    series: int = 0
+    """Рядов (объект + бак), в которых что-то найдено"""
+
+    def add(self, other: "SweepTotals") -> None:
+        self.count += other.count
+        self.complete += other.complete
+        self.volume += other.volume
+        self.series += other.series
+
+
+def parse_settings_value(settings_class: type, name: str, value: str):
+    """Значение параметра настроек из строки (timedelta - в секундах)"""
+    field_type = {item.name: item.type for item in dataclasses.fields(settings_class)}[name]
+    if field_type is datetime.timedelta:
+        return datetime.timedelta(seconds=float(value))
+    if field_type is bool:
+        return value.lower() in ('1', 'true', 'yes')
+    return field_type(value)
+
+
+def make_settings_variants(base: Settings, grid: Dict[str, Sequence]) -> List[Settings]:
+    """Все сочетания значений параметров (декартово произведение) поверх базовых настроек"""
+    names = list(grid)
+    return [
+        dataclasses.replace(base, **dict(zip(names, values)))
+        for values in itertools.product(*(grid[name] for name in names))
+    ]
+
+
+def sweep_series(
+        prepared: PreparedFuelSeries,
+        charge_variants: Sequence[FuelChargeSettings],
+        discharge_variants: Sequence[FuelDischargeSettings],
+) -> Tuple[List[SweepTotals], List[SweepTotals]]:
+    """
+    Определить заправки/сливы в одном ряду для каждого варианта настроек.
+    Разбор сообщений, разности и скорость изменения топлива посчитаны в prepared один раз на все варианты.
+    """
+    fuel_volume = prepared.fuel_volume
+    charge_totals = []
+    for settings in charge_variants:
+        intervals = ChargeBatchEngine(None, None, None, settings).detect_intervals(prepared)
+        charge_totals.append(SweepTotals(
+            count=len(intervals),
+            complete=sum(1 for _, _, is_complete in intervals if is_complete),
+            volume=sum(fuel_volume[end] - fuel_volume[begin] for begin, end, _ in intervals),
+            series=1 if intervals else 0,
+        ))
+
+    discharge_totals = []
+    for settings in discharge_variants:
+        intervals = DischargeBatchEngine(None, None, None, settings).detect_intervals(prepared)
+        discharge_totals.append(SweepTotals(
+            count=len(intervals),
+            complete=sum(1 for _, _, is_complete in intervals if is_complete),
+            volume=sum(fuel_volume[begin] - fuel_volume[end] for begin, end, _ in intervals),
+            series=1 if intervals else 0,
+        ))
+    return charge_totals, discharge_totals
@@ -1,8 +1,23 @@
 import datetime
-from typing import List, Dict
+import gzip
+import json
+from typing import List, Dict, Iterator, TextIO, Sequence
 
-from dpt.domain.telemetry import FullTelemetryEvent
+from dpt.domain.telemetry import FullTelemetryEvent, AnalyticEntity
+from dpt.geojson import Point
 from dpt.serde.encoder.json import JsonEncoder
+from .state import FuelDataEvent, FuelStateData
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+JSON_SEPARATORS = ' \t\r\n,'
+
+JSON_STRUCTURE = ' \t\r\n,:{}[]"'
+"""Символы, которых не может быть внутри недописанного числа/литерала"""
+
+JSON_MAX_TRUNCATED_TOKEN = 64
+"""Макс. длина недописанного токена в конце куска"""
 
 
 def load_telemetry_file(file_name: str) -> List[Dict]:
@@ -11,12 +26,122 @@ def load_telemetry_file(file_name: str) -> List[Dict]:
         return JsonEncoder().loads(telemetry_file.read())
 
 
+def open_telemetry_file(file_name: str) -> TextIO:
+    """Открыть файл телеметрии на чтение (сжатый gzip определяется по сигнатуре)"""
+    with open(file_name, 'rb') as raw_file:
+        is_gzip = raw_file.read(2) == GZIP_MAGIC
+    if is_gzip:
+        return gzip.open(file_name, 'rt', encoding='utf-8')
+    return open(file_name, 'r', encoding='utf-8')
+
+
+def iter_telemetry_file(file_name: str, chunk_size: int = 1 << 20) -> Iterator[Dict]:
+    """
+    Читать сообщения телеметрии из файла по одному, не загружая файл целиком.
+    Поддерживаются NDJSON (сообщение на строку) и JSON-массив сообщений, в том числе сжатые gzip.
+    """
+    with open_telemetry_file(file_name) as telemetry_file:
+        buffer = telemetry_file.read(chunk_size)
+        while buffer and not buffer.lstrip():
+            buffer = telemetry_file.read(chunk_size)
+        if buffer.lstrip().startswith('['):
+            yield from iter_json_array(telemetry_file, buffer, chunk_size)
+        else:
+            yield from iter_ndjson(telemetry_file, buffer)
+
+
+def iter_ndjson(telemetry_file: TextIO, buffer: str = '') -> Iterator[Dict]:
+    """Сообщения из NDJSON (buffer - уже прочитанное начало файла)"""
+    encoder = JsonEncoder()
+    lines = buffer.split('\n')
+    tail = lines.pop()
+    for line in lines:
+        if line.strip():
+            yield encoder.loads(line)
+    for line in telemetry_file:
+        if tail:
+            line, tail = tail + line, ''
+        if line.strip():
+            yield encoder.loads(line)
+    if tail.strip():
+        yield encoder.loads(tail)
+
+
+def is_truncated_json(error: json.JSONDecodeError) -> bool:
+    """
+    Ошибка разбора только из-за того, что кусок закончился посреди элемента (дочитав файл, её можно исправить):
+    незакрытая до конца куска строка или недописанный токен/разделитель в самом конце куска.
+    """
+    if error.msg.startswith('Unterminated string'):
+        return True
+    if len(error.doc) - error.pos > JSON_MAX_TRUNCATED_TOKEN:
+        return False
+    return not any(char in JSON_STRUCTURE for char in error.doc[error.pos:].rstrip())
+
+
+def iter_json_array(telemetry_file: TextIO, buffer: str, chunk_size: int) -> Iterator[Dict]:
+    """
+    Сообщения из JSON-массива, разбираемого кусками по chunk_size символов. В памяти держится только текущий кусок.
+    Все целые сообщения куска разбираются JsonEncoder (как в load_telemetry_file) одним вызовом: кусок обрезается
+    по последней "}". Если обрезка пришлась не на конец сообщения (вложенный объект, элемент не объект),
+    до конца куска границы элементов находит потоковый json.JSONDecoder.raw_decode.
+    Ошибка в данных (не в конце куска) выбрасывается сразу, без дочитывания файла.
+    """
+    boundary_decoder = json.JSONDecoder()
+    encoder = JsonEncoder()
+    position = buffer.index('[') + 1
+    batch = True
+    while True:
+        while position < len(buffer) and buffer[position] in JSON_SEPARATORS:
+            position += 1
+
+        if position < len(buffer) and buffer[position] == ']':
+            return
+
+        if batch:
+            end = buffer.rfind('}') + 1
+            if end > position:
+                try:
+                    messages = encoder.loads('[' + buffer[position:end] + ']')
+                except ValueError:
+                    batch = False
+                else:
+                    yield from messages
+                    position = end
+                    continue
+
+        try:
+            if position == len(buffer):
+                raise json.JSONDecodeError("Need more data", buffer, position)
+            _, end = boundary_decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            if not is_truncated_json(error):
+                raise
+            chunk = telemetry_file.read(chunk_size)
+            if not chunk:
+                raise
+            buffer = buffer[position:] + chunk
+            position = 0
+            batch = True
+            continue
+
+        yield encoder.loads(buffer[position:end])
+        position = end
+
+
+def iter_telemetry_events(file_name: str, chunk_size: int = 1 << 20) -> Iterator[FullTelemetryEvent]:
+    """Читать события телеметрии из файла по одному"""
+    for message in iter_telemetry_file(file_name, chunk_size=chunk_size):
+        yield make_full_telemetry_event(message)
+
+
 def make_full_telemetry_event(message: Dict):
     """Сделать из сырого сообщения FullTelemetryEvent"""
     location = message.get('location')
     return FullTelemetryEvent(
         object_id=message['object_id'],
         enterprise_id=message['enterprise_id'],
+        model_id=message.get('model_id'),
         time=message['time'],
         receive_time=message.get('receive_time', None) or datetime.datetime.utcnow(),
         location=tuple(location) if location else None,
@@ -26,3 +151,32 @@ def make_full_telemetry_event(message: Dict):
             and value is not None
         }
     )
+
+
+def make_fuel_data_events(message: Dict, fuel_entities: Sequence[AnalyticEntity]) -> List[FuelDataEvent]:
+    """
+    Сделать из сырого сообщения топливные события сразу, без FullTelemetryEvent и фильтрации параметров.
+    Читаются только параметры переданных баков, скорость и положение - один раз на сообщение.
+    """
+    events = []
+    state_fields = None
+    for fuel_entity in fuel_entities:
+        fuel_value = message.get(fuel_entity.msg_attr)
+        if fuel_value is None:
+            continue
+        if state_fields is None:
+            location = message.get('location')
+            state_fields = (
+                message['time'],
+                message.get('speed') if message.get('speed') is not None else 0.0,
+                Point(tuple(location)) if location else None,
+            )
+        time, speed, location = state_fields
+        events.append(FuelDataEvent(
+            organization_id=message['enterprise_id'],
+            model_id=message.get('model_id'),
+            object_id=message['object_id'],
+            fuel_entity=fuel_entity,
+            state_data=FuelStateData(time=time, speed=speed, location=location, fuel_volume=fuel_value),
+        ))
+    return events
@@ -0,0 +1,92 @@
+import math
+from typing import Any, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+__all__ = (
+    "TimerWheel",
+)
+
+K = TypeVar("K", bound=Hashable)
+
+
+class TimerWheel(Generic[K]):
+    """
+    Иерархическое колесо таймеров.
+    Постановка и отмена таймера - O(1), продвижение времени - O(1) на тик (плюс сработавшие таймеры).
+    Таймер на уровне level попадает в слот (deadline // slots ** level) % slots,
+    при переходе старшего уровня на новый слот таймеры каскадом переносятся на младшие уровни.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 64, levels: int = 4, now: float = 0.0):
+        self.tick = tick
+        self._slots = slots
+        self._levels = levels
+        self._wheels: List[List[Dict[K, Tuple[int, Any]]]] = [[{} for _ in range(slots)] for _ in range(levels)]
+        self._timers: Dict[K, Tuple[int, int]] = {}
+        """Расположение таймера: ключ -> (уровень, слот)"""
+        self._current = self._to_tick(now)
+        """Текущий тик"""
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._timers
+
+    def _to_tick(self, time: float) -> int:
+        return int(time // self.tick)
+
+    def schedule(self, key: K, delay: float, payload: Any = None) -> None:
+        """Поставить (или переставить) таймер на delay секунд"""
+        self.cancel(key)
+        deadline = self._current + max(1, math.ceil(delay / self.tick))
+        self._place(key, deadline, payload)
+
+    def cancel(self, key: K) -> Optional[Any]:
+        """Отменить таймер. Возвращает payload отменённого таймера"""
+        position = self._timers.pop(key, None)
+        if position is None:
+            return None
+        level, slot = position
+        _, payload = self._wheels[level][slot].pop(key)
+        return payload
+
+    def advance(self, now: float) -> List[Tuple[K, Any]]:
+        """Продвинуть время до now. Возвращает сработавшие таймеры (ключ, payload)"""
+        expired = []
+        target = self._to_tick(now)
+        while self._current < target:
+            self._current += 1
+            self._cascade()
+            slot = self._wheels[0][self._current % self._slots]
+            if slot:
+                self._wheels[0][self._current % self._slots] = {}
+                for key, (deadline, payload) in slot.items():
+                    if deadline <= self._current:
+                        del self._timers[key]
+                        expired.append((key, payload))
+                    else:
+                        self._place(key, deadline, payload)
+        return expired
+
+    def _place(self, key: K, deadline: int, payload: Any) -> None:
+        delta = deadline - self._current
+        level = 0
+        span = self._slots
+        while delta >= span and level < self._levels - 1:
+            level += 1
+            span *= self._slots
+        slot = (max(deadline, self._current) // self._slots ** level) % self._slots
+        self._wheels[level][slot][key] = (deadline, payload)
+        self._timers[key] = (level, slot)
+
+    def _cascade(self) -> None:
+        """Перенести таймеры со старших уровней, чей слот наступил на текущем тике"""
+        for level in range(self._levels - 1, 0, -1):
+            if self._current % self._slots ** level:
+                continue
+            slot_index = (self._current // self._slots ** level) % self._slots
+            slot = self._wheels[level][slot_index]
+            if slot:
+                self._wheels[level][slot_index] = {}
+                for key, (deadline, payload) in slot.items():
+                    self._place(key, deadline, payload)
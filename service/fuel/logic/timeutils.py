@@ -0,0 +1,32 @@
+import datetime
+from typing import Optional
+
+__all__ = (
+    "datetime_to_us",
+    "us_to_datetime",
+    "to_utc",
+)
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_UTC = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def datetime_to_us(time: datetime.datetime) -> int:
+    """Время в микросекундах от начала эпохи UTC (точно, без потерь float). Время без пояса считается UTC"""
+    epoch = _EPOCH if time.tzinfo is None else _EPOCH_UTC
+    return (time - epoch) // _MICROSECOND
+
+
+def us_to_datetime(value: int, tzinfo: Optional[datetime.tzinfo] = None) -> datetime.datetime:
+    """Время из микросекунд от начала эпохи (обратно к datetime_to_us)"""
+    if tzinfo is None:
+        return _EPOCH + datetime.timedelta(microseconds=value)
+    return (_EPOCH_UTC + datetime.timedelta(microseconds=value)).astimezone(tzinfo)
+
+
+def to_utc(time: datetime.datetime) -> datetime.datetime:
+    """Время с часовым поясом UTC (время без пояса считается UTC)"""
+    if time.tzinfo is None:
+        return time.replace(tzinfo=datetime.timezone.utc)
+    return time.astimezone(datetime.timezone.utc)
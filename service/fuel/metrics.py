@@ -0,0 +1,54 @@
+from collections import Counter
+from typing import Dict, Tuple
+
+from dpt.component.utils import Singleton
+
+
+__all__ = (
+    'FuelMetrics',
+)
+
+RATES: Dict[str, Tuple[str, str]] = {
+    "quiescent_skipped_rate": ("quiescent_skipped", "quiescent_total"),
+    "smoothing_changed_rate": ("smoothing_changed", "smoothing_total"),
+}
+"""Производные доли для экспорта: имя -> (часть, всего)"""
+
+
+class FuelMetrics(metaclass=Singleton):
+    """Счётчики сервиса определения заправок/сливов"""
+
+    def __init__(self):
+        self._counters: Counter = Counter()
+
+    def incr(self, name: str, value: int = 1) -> None:
+        """Увеличить счётчик"""
+        self._counters[name] += value
+
+    def get(self, name: str) -> int:
+        """Значение счётчика"""
+        return self._counters[name]
+
+    def ratio(self, part: str, total: str) -> float:
+        """Доля одного счётчика от другого (например, доля пропущенных сообщений)"""
+        total_value = self._counters[total]
+        return self._counters[part] / total_value if total_value else 0.0
+
+    def snapshot(self) -> Dict[str, int]:
+        """Текущие значения всех счётчиков"""
+        return dict(self._counters)
+
+    def report(self) -> Dict[str, float]:
+        """
+        Счётчики и производные доли для экспорта: RATES и {name}_hit_rate по парам {name}_hit / {name}_miss
+        (индекс последних заправок/сливов, кэш графиков)
+        """
+        report: Dict[str, float] = dict(self._counters)
+        for name, (part, total) in RATES.items():
+            report[name] = self.ratio(part, total)
+        for name in list(self._counters):
+            if name.endswith("_hit"):
+                prefix = name[:-len("_hit")]
+                hits, misses = self._counters[name], self._counters[f"{prefix}_miss"]
+                report[f"{prefix}_hit_rate"] = hits / (hits + misses) if hits + misses else 0.0
+        return report
@@ -0,0 +1,187 @@
+"""
+Пересчёт истории заправок/сливов по файлам телеметрии.
+
+    python -m dpt.fuel.run.backfill --file telemetry.json --object <uuid> --object <uuid> \
+        --begin 2024-01-01T00:00:00 --end 2024-02-01T00:00:00 --workers 8 --checkpoint backfill.done
+
+Объекты делятся на пачки. Файлы телеметрии читаются один раз: сообщения выбранных объектов за интервал
+раскладываются по временным файлам пачек (NDJSON), пачки обрабатываются в пуле процессов, каждая - по своему файлу.
+Результат записывается в хранилища заправок/сливов (bulk upsert) или в файл --output, по строке JSON
+на заправку/слив. Обработанные объекты дописываются в файл --checkpoint, при повторном запуске они пропускаются.
+Время без часового пояса (в аргументах и в сообщениях) считается UTC.
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from dataclasses import asdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from dpt.component import get_utility
+from dpt.config import Configuration
+from dpt.domain.fuel import FuelCharge, FuelDischarge
+from dpt.fuel.analytic_entity import FuelAnalyticEntitiesStorage
+from dpt.fuel.logic.replay import FuelReplay
+from dpt.fuel.logic.telemetry import iter_telemetry_file
+from dpt.fuel.logic.timeutils import to_utc
+from dpt.fuel.storage.interface import IObjectFuelSettingsStorage, IObjectFuelIntervalSettingsStorage, \
+    IFuelChargeStorage, IFuelDischargeStorage
+from dpt.serde.encoder.json import JsonEncoder
+
+logger = logging.getLogger(__name__)
+
+
+def init_worker(config_file: str) -> None:
+    """Инициализация процесса пула: конфигурация и настройки определения заправок/сливов"""
+    from dpt.fuel.analytic_entity import AnalyticEntityConfigProvider  # Чтобы подключился провайдер
+    Configuration.from_file(config_file)
+    asyncio.run(load_settings())
+
+
+async def load_settings() -> None:
+    await get_utility(IObjectFuelSettingsStorage).load()
+    await get_utility(IObjectFuelIntervalSettingsStorage).load()
+
+
+def partition_messages(
+        files: List[str],
+        chunks: List[List[str]],
+        begin: datetime.datetime,
+        end: datetime.datetime,
+        directory: str,
+) -> List[str]:
+    """
+    Разложить сообщения объектов пачек за интервал [begin, end) по файлам пачек за один проход по файлам.
+    Возвращает файлы пачек (NDJSON) в порядке пачек
+    """
+    begin, end = to_utc(begin), to_utc(end)
+    chunk_files = [os.path.join(directory, f"chunk-{index}.ndjson") for index in range(len(chunks))]
+    chunk_by_object: Dict[str, int] = {
+        object_id: index for index, chunk in enumerate(chunks) for object_id in chunk
+    }
+    encoder = JsonEncoder()
+    with ExitStack() as stack:
+        outputs = [stack.enter_context(open(file_name, 'w')) for file_name in chunk_files]
+        for file_name in files:
+            for message in iter_telemetry_file(file_name):
+                index = chunk_by_object.get(str(message['object_id']))
+                if index is not None and begin <= to_utc(message['time']) < end:
+                    outputs[index].write(encoder.dumps(message))
+                    outputs[index].write('\n')
+    return chunk_files
+
+
+def backfill_objects(
+        chunk_file: str,
+        object_ids: List[str],
+) -> Tuple[List[str], List[FuelCharge], List[FuelDischarge]]:
+    """Пересчитать заправки/сливы для пачки объектов по её файлу сообщений (выполняется в процессе пула)"""
+    return asyncio.run(replay_objects(chunk_file, object_ids))
+
+
+async def replay_objects(
+        chunk_file: str,
+        object_ids: List[str],
+) -> Tuple[List[str], List[FuelCharge], List[FuelDischarge]]:
+    messages = list(iter_telemetry_file(chunk_file))
+    messages.sort(key=lambda message: (str(message['object_id']), to_utc(message['time'])))
+
+    replay = FuelReplay(
+        fuel_entities=FuelAnalyticEntitiesStorage().list,
+        settings_storage=get_utility(IObjectFuelSettingsStorage),
+        interval_settings_storage=get_utility(IObjectFuelIntervalSettingsStorage),
+    )
+    for message in messages:
+        await replay.process_message(message)
+    return object_ids, list(replay.charges.values()), list(replay.discharges.values())
+
+
+async def save_to_storage(charges: List[FuelCharge], discharges: List[FuelDischarge]) -> None:
+    """Записать (перезаписать) заправки и сливы - по одному bulk upsert на хранилище"""
+    await get_utility(IFuelChargeStorage).set_many(charges)
+    await get_utility(IFuelDischargeStorage).set_many(discharges)
+
+
+def save_to_file(output: str, charges: List[FuelCharge], discharges: List[FuelDischarge]) -> None:
+    """Дописать заправки и сливы в файл, по строке JSON на каждый"""
+    encoder = JsonEncoder()
+    with open(output, 'a') as output_file:
+        for kind, items in (('charge', charges), ('discharge', discharges)):
+            for item in items:
+                output_file.write(encoder.dumps({'type': kind, 'object': asdict(item)}))
+                output_file.write('\n')
+
+
+def load_checkpoint(checkpoint: Optional[str]) -> Set[str]:
+    """Объекты, обработанные в предыдущих запусках"""
+    if not checkpoint or not os.path.exists(checkpoint):
+        return set()
+    with open(checkpoint, 'r') as checkpoint_file:
+        return {line.strip() for line in checkpoint_file if line.strip()}
+
+
+def save_checkpoint(checkpoint: Optional[str], object_ids: List[str]) -> None:
+    if checkpoint:
+        with open(checkpoint, 'a') as checkpoint_file:
+            checkpoint_file.writelines(f"{object_id}\n" for object_id in object_ids)
+
+
+def run(args: argparse.Namespace) -> None:
+    done = load_checkpoint(args.checkpoint)
+    object_ids = [object_id for object_id in dict.fromkeys(args.object) if object_id not in done]
+    chunks = [object_ids[i:i + args.chunk_size] for i in range(0, len(object_ids), args.chunk_size)]
+    logger.info('Backfill: %d objects (%d already done), %d chunks', len(object_ids), len(done), len(chunks))
+
+    processed = total_charges = total_discharges = 0
+    with tempfile.TemporaryDirectory(prefix='backfill-') as directory, ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=init_worker,
+            initargs=(args.config,),
+    ) as executor:
+        chunk_files = partition_messages(args.file, chunks, args.begin, args.end, directory)
+        logger.info('Backfill: messages partitioned into %d chunk files', len(chunk_files))
+        futures = [
+            executor.submit(backfill_objects, chunk_file, chunk)
+            for chunk_file, chunk in zip(chunk_files, chunks)
+        ]
+        for future in as_completed(futures):
+            chunk, charges, discharges = future.result()
+            if args.output:
+                save_to_file(args.output, charges, discharges)
+            else:
+                asyncio.run(save_to_storage(charges, discharges))
+            save_checkpoint(args.checkpoint, chunk)
+
+            processed += len(chunk)
+            total_charges += len(charges)
+            total_discharges += len(discharges)
+            logger.info(
+                'Backfill: %d/%d objects, %d charges, %d discharges',
+                processed, len(object_ids), total_charges, total_discharges
+            )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Пересчёт заправок/сливов по файлам телеметрии")
+    parser.add_argument('--file', action='append', required=True, help="Файл телеметрии (можно несколько)")
+    parser.add_argument('--object', action='append', required=True, help="Идентификатор объекта (можно несколько)")
+    parser.add_argument('--begin', type=datetime.datetime.fromisoformat, required=True, help="Начало интервала")
+    parser.add_argument('--end', type=datetime.datetime.fromisoformat, required=True, help="Окончание интервала")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Количество процессов")
+    parser.add_argument('--chunk-size', type=int, default=50, help="Объектов в одной пачке")
+    parser.add_argument('--output', help="Записать результат в файл вместо хранилищ")
+    parser.add_argument('--checkpoint', help="Файл обработанных объектов (для продолжения)")
+    parser.add_argument('--config', default=os.getenv("CONFIGURATION_FILE", "config.toml"))
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    from dpt.fuel.analytic_entity import AnalyticEntityConfigProvider  # Чтобы подключился провайдер
+    logging.basicConfig(level=logging.INFO)
+    arguments = parse_args()
+    config = Configuration.from_file(arguments.config)
+    run(arguments)
@@ -0,0 +1,341 @@
+import asyncio
+import datetime
+import logging
+import time
+from dataclasses import replace
+from typing import Any, Dict, Optional, Tuple, Type
+
+from dpt.common import IPort
+from dpt.component import get_utility
+from dpt.cqrs import IEventBus
+from dpt.domain.fuel import ObjectFuelSettings, FuelCharge, FuelDischarge, FuelChargeSettings, \
+    FuelDischargeSettings, ObjectFuelSettingsModifiedEvent, ObjectFuelSettingsDeletedEvent, \
+    ObjectFuelIntervalSettingsModifiedEvent, ObjectFuelIntervalSettingsDeletedEvent, \
+    ObjectFuelSettingsBulkModifiedEvent, ObjectFuelIntervalSettingsBulkModifiedEvent
+from dpt.domain.identity import ObjectId
+from dpt.domain.telemetry import FullTelemetryEvent, AnalyticEntityId, AnalyticEntity, ObjectConfigurationModifiedEvent
+from dpt.fuel.analytic_entity import FuelAnalyticEntitiesStorage, ObjectFuelAnalyticEntitiesStorage, \
+    make_object_fuel_analytic_entity
+from dpt.fuel.logic.fsm import ChargeFSM, DischargeFSM
+from dpt.fuel.logic.reorder import FuelReorderBuffer
+from dpt.fuel.logic.shedding import FuelLoadShedding
+from dpt.fuel.logic.smoothing import FuelFilterCache
+from dpt.fuel.logic.state import FuelDataEvent, FuelStateData
+from dpt.fuel.logic.storage import FuelChargeStateStorage, FuelDischargeStateStorage
+from dpt.fuel.logic.timer import TimerWheel
+from dpt.fuel.metrics import FuelMetrics
+from dpt.fuel.storage.interface import IObjectFuelSettingsStorage, IObjectFuelIntervalSettingsStorage, \
+    IFuelVolumeRollupStorage, IObjectFuelAnalyticEntityStorage
+from dpt.geojson import Point
+
+__all__ = (
+    "BaseFuelService",
+)
+
+
+class BaseFuelService(IPort):
+    """
+    Общий конвейер сервисов определения заправок и сливов: телеметрия -> буфер переупорядочивания ->
+    сглаживание -> State машина, таймеры порогового времени, сброс нагрузки и метрики.
+    Наследник задаёт State машину, хранилище её состояний и настройки State машины
+    """
+    fsm_class: Type[ChargeFSM | DischargeFSM]
+    """State машина сервиса"""
+    state_storage_class: Type[FuelChargeStateStorage | FuelDischargeStateStorage]
+    """Хранилище состояний State машины"""
+    storage_interface: Type
+    """Хранилище заправок/сливов (для создания индексов)"""
+
+    def __init__(
+            self,
+            deterministic_id: bool = False,
+            timer_tick: float = 1.0,
+            silence_timeout: float = 60.0,
+            reorder_lateness: float = 0.0,
+            reorder_capacity: int = 64,
+            shedding_lag: Optional[float] = None,
+            shedding_interval: float = 10.0,
+            history_depth: int = 0,
+            metrics_interval: float = 60.0,
+            **kwargs: Any
+    ):
+        self._bus = get_utility(IEventBus)
+        self._deterministic_id = deterministic_id
+        self._silence_timeout = silence_timeout
+        self._timers: TimerWheel[Tuple[ObjectId, AnalyticEntityId]] = TimerWheel(tick=timer_tick, now=time.monotonic())
+        self._timers_task: Optional[asyncio.Task] = None
+        self._sources: Dict[Tuple[ObjectId, AnalyticEntityId], FuelDataEvent] = {}
+        """Последнее обработанное событие бака: организация, модель и параметр для события порогового времени"""
+        self._metrics_interval = metrics_interval
+        self._metrics_task: Optional[asyncio.Task] = None
+        self._lag = datetime.timedelta(0)
+        """Последнее отставание обработки от шины (время получения сообщения -> время обработки)"""
+        self._lock = asyncio.Lock()
+        self._reorder = FuelReorderBuffer(
+            lateness=datetime.timedelta(seconds=reorder_lateness),
+            capacity=reorder_capacity,
+        )
+        self._shedding = FuelLoadShedding(
+            lag=datetime.timedelta(seconds=shedding_lag) if shedding_lag is not None else None,
+            interval=datetime.timedelta(seconds=shedding_interval),
+        )
+        self._state_storage = self.state_storage_class()
+        self._state_storage.set_history_depth(history_depth)
+        self._filters = FuelFilterCache()
+        self._fuel_entities = FuelAnalyticEntitiesStorage()
+        self._object_fuel_entities = ObjectFuelAnalyticEntitiesStorage()
+        self._settings_storage = get_utility(IObjectFuelSettingsStorage)
+        self._interval_settings_storage = get_utility(IObjectFuelIntervalSettingsStorage)
+        self._logger = logging.getLogger(self.__class__.__name__)
+        super().__init__(**kwargs)
+
+    async def _on_start(self):
+        await get_utility(self.storage_interface).create_indexes()
+        await get_utility(IFuelVolumeRollupStorage).create_indexes()
+        # Сервис подписан на события изменения настроек (_start) - запросы настроек могут читать кэш
+        self._settings_storage.track()
+        self._interval_settings_storage.track()
+        await self.load_settings()
+        await self._object_fuel_entities.load(get_utility(IObjectFuelAnalyticEntityStorage))
+
+    async def load_settings(self):
+        await self._settings_storage.load()
+        await self._interval_settings_storage.load()
+        self._logger.info('FuelSettingsStorage loaded.')
+
+    async def _stop(self, err: Exception = None) -> None:
+        if self._timers_task is not None:
+            self._timers_task.cancel()
+        if self._metrics_task is not None:
+            self._metrics_task.cancel()
+
+    async def _start(self):
+        await self._on_start()
+        self._timers_task = asyncio.create_task(self.run_timers())
+        if self._metrics_interval > 0:
+            self._metrics_task = asyncio.create_task(self.run_metrics())
+
+        async with self._bus as bus:
+            async for event in bus.consume(
+                    FullTelemetryEvent,
+                    ObjectFuelSettingsModifiedEvent,
+                    ObjectFuelSettingsDeletedEvent,
+                    ObjectFuelIntervalSettingsModifiedEvent,
+                    ObjectFuelIntervalSettingsDeletedEvent,
+                    ObjectFuelSettingsBulkModifiedEvent,
+                    ObjectFuelIntervalSettingsBulkModifiedEvent,
+                    ObjectConfigurationModifiedEvent,
+            ):
+                match event:
+                    case FullTelemetryEvent():
+                        await self.on_telemetry_event(event)
+                    case ObjectFuelSettingsModifiedEvent():
+                        await self.load_settings()
+                    case ObjectFuelSettingsDeletedEvent():
+                        await self.load_settings()
+                    case ObjectFuelIntervalSettingsModifiedEvent():
+                        await self.load_settings()
+                    case ObjectFuelIntervalSettingsDeletedEvent():
+                        await self.load_settings()
+                    case ObjectFuelSettingsBulkModifiedEvent():
+                        await self.load_settings()
+                    case ObjectFuelIntervalSettingsBulkModifiedEvent():
+                        await self.load_settings()
+                    case ObjectConfigurationModifiedEvent():
+                        self._object_fuel_entities.set(event.object.id, make_object_fuel_analytic_entity(event))
+
+    async def on_telemetry_event(self, event: FullTelemetryEvent):
+        """Обработать событие телеметрии"""
+        self._lag = max(datetime.timedelta(0), FuelLoadShedding.get_lag(event))
+        shedding = self._shedding.update(event)
+        async with self._lock:
+            # Только баки/цистерны, настроенные у объекта (неизвестный объект - все топливные параметры)
+            for fuel_entity in self._object_fuel_entities.entities(event.object_id):
+                fuel_value = event.get_parameter_value(fuel_entity.msg_attr, None)
+                if fuel_value is not None:
+                    if shedding and self._shedding.should_drop(
+                            self._state_storage.peek(event.object_id, fuel_entity.id), event.time):
+                        continue
+                    if self.skip_quiescent(event, fuel_entity, fuel_value):
+                        continue
+                    fuel_event = FuelDataEvent(
+                        organization_id=event.enterprise_id,
+                        model_id=event.model_id,
+                        object_id=event.object_id,
+                        fuel_entity=fuel_entity,
+                        state_data=FuelStateData(
+                            time=event.time,
+                            speed=event.get_parameter_value("speed", 0.0),
+                            location=Point(event.location) if event.location else None,
+                            fuel_volume=fuel_value,
+                        )
+                    )
+                    for ready_event in self._reorder.push(fuel_event):
+                        await self.process_fuel_event(ready_event)
+
+    def skip_quiescent(self, event: FullTelemetryEvent, fuel_entity: AnalyticEntity, fuel_value: float) -> bool:
+        """
+        Быстрый путь: сообщение стоящей техники без изменения уровня топлива не проходит через State машину,
+        у состояния только сдвигается время. Доля таких сообщений - метрика quiescent_skipped / quiescent_total
+        """
+        metrics = FuelMetrics()
+        metrics.incr("quiescent_total")
+        key = (event.object_id, fuel_entity.id)
+        if self._reorder.pending(*key) or key in self._filters:
+            return False
+        object_state = self._state_storage.peek(event.object_id, fuel_entity.id)
+        if object_state is None or not object_state.advance_quiescent(
+                event.time,
+                event.get_parameter_value("speed", 0.0),
+                fuel_value,
+                Point(event.location) if event.location else None,
+        ):
+            return False
+        self._reorder.advance(event.object_id, fuel_entity.id, event.time)
+        self._state_storage.record(event.object_id, fuel_entity.id, object_state.current_data)
+        metrics.incr("quiescent_skipped")
+        return True
+
+    async def process_fuel_event(self, fuel_event: FuelDataEvent) -> Optional[FuelCharge | FuelDischarge]:
+        """Обработать топливное событие"""
+        object_settings = await self.get_object_settings(fuel_event)
+        fsm = await self.create_fsm(fuel_event, object_settings)
+        self._sources[(fuel_event.object_id, fuel_event.fuel_entity.id)] = fuel_event
+        if fuel_event.state_data.time >= fsm.object_state.current_data.time:
+            # Опоздавшее сообщение State машина отбросит - в окно фильтра и историю оно не попадает
+            self.smooth(fuel_event, object_settings)
+            self._state_storage.record(fuel_event.object_id, fuel_event.fuel_entity.id, fuel_event.state_data)
+        result = await fsm.process(fuel_event)
+        await self.save_fsm(fsm)
+        self.schedule_threshold(fsm)
+        return result
+
+    def schedule_threshold(self, fsm: ChargeFSM | DischargeFSM):
+        """Поставить таймер на пороговое время состояния (или снять, если ждать нечего)"""
+        key = (fsm.object_id, fsm.analytic_entity.id)
+        threshold = fsm.object_state.pending_threshold()
+        if threshold is None:
+            self._timers.cancel(key)
+        else:
+            delay = (threshold - fsm.object_state.current_data.time).total_seconds() + self._silence_timeout
+            self._timers.schedule(key, delay, self._lag)
+
+    async def run_metrics(self):
+        """Раз в metrics_interval секунд выводить счётчики сервиса в лог"""
+        while True:
+            await asyncio.sleep(self._metrics_interval)
+            self._logger.info('Fuel metrics: %s', FuelMetrics().report())
+
+    async def run_timers(self):
+        """Завершать состояния по пороговому времени у объектов, от которых перестали приходить сообщения"""
+        while True:
+            await asyncio.sleep(self._timers.tick)
+            for key, scheduled_lag in self._timers.advance(time.monotonic()):
+                try:
+                    async with self._lock:
+                        await self.on_timer(key, scheduled_lag)
+                except Exception:
+                    self._logger.exception('Threshold expiration failed %s', key)
+
+    async def on_timer(
+            self,
+            key: Tuple[ObjectId, AnalyticEntityId],
+            scheduled_lag: datetime.timedelta,
+    ) -> None:
+        """
+        Сработал таймер порогового времени.
+        Таймер идёт по часам сервиса, а пороговое время - по времени телеметрии, поэтому тишина может быть ложной:
+        задержанные в буфере переупорядочивания сообщения бака обрабатываются вместо порогового события,
+        а при выросшем с момента постановки отставании от шины таймер откладывается на величину роста
+        """
+        if self._reorder.pending(*key):
+            FuelMetrics().incr("threshold_flushed")
+            for fuel_event in self._reorder.flush(*key):
+                await self.process_fuel_event(fuel_event)
+            return
+        lag_growth = (self._lag - scheduled_lag).total_seconds()
+        if lag_growth >= self._timers.tick:
+            FuelMetrics().incr("threshold_deferred")
+            self._timers.schedule(key, lag_growth, self._lag)
+            return
+        await self.on_threshold_expired(key)
+
+    async def on_threshold_expired(self, key: Tuple[ObjectId, AnalyticEntityId]):
+        """
+        Довести State машину до завершения: повторяем последние данные бака на момент порогового времени.
+        State машина собирается заново с актуальными на момент срабатывания настройками
+        """
+        source = self._sources.get(key)
+        object_state = self._state_storage.peek(*key)
+        if source is None or object_state is None:
+            return
+        threshold = object_state.pending_threshold()
+        if threshold is None:
+            return
+        current_data = object_state.current_data
+        fuel_event = replace(
+            source,
+            state_data=replace(current_data, time=max(threshold, current_data.time), fuel_speed=0.0),
+        )
+        object_settings = await self.get_object_settings(fuel_event)
+        fsm = await self.create_fsm(fuel_event, object_settings)
+        await fsm.process(fuel_event)
+        await self.save_fsm(fsm)
+        self.schedule_threshold(fsm)
+
+    def smooth(self, fuel_event: FuelDataEvent, object_settings: Optional[ObjectFuelSettings]) -> None:
+        """Сгладить значение датчика фильтром бака (по настройкам сглаживания модели/объекта)"""
+        fuel_event.state_data.fuel_volume = self._filters.apply(
+            (fuel_event.object_id, fuel_event.fuel_entity.id),
+            object_settings.smoothing if object_settings else None,
+            fuel_event.state_data.fuel_volume,
+        )
+
+    def get_fsm_settings(
+            self,
+            object_settings: Optional[ObjectFuelSettings],
+    ) -> FuelChargeSettings | FuelDischargeSettings:
+        """Настройки State машины сервиса из настроек объекта"""
+        raise NotImplementedError
+
+    async def get_settings(self, fuel_event: FuelDataEvent) -> FuelChargeSettings | FuelDischargeSettings:
+        return self.get_fsm_settings(await self.get_object_settings(fuel_event))
+
+    async def get_object_settings(self, fuel_event: FuelDataEvent) -> Optional[ObjectFuelSettings]:
+        # Поиск интервальных настроек на текущее время
+        settings = await self._interval_settings_storage.get_settings(
+            time=fuel_event.state_data.time,
+            organization_id=fuel_event.organization_id,
+            analytic_entity_id=fuel_event.fuel_entity.id,
+            object_id=fuel_event.object_id,
+            model_id=fuel_event.model_id,
+        )
+        if not settings:
+            # Поиск постоянных настроек
+            settings = await self._settings_storage.get_settings(
+                organization_id=fuel_event.organization_id,
+                analytic_entity_id=fuel_event.fuel_entity.id,
+                object_id=fuel_event.object_id,
+                model_id=fuel_event.model_id
+            )
+        return settings
+
+    async def create_fsm(
+            self,
+            fuel_event: FuelDataEvent,
+            object_settings: Optional[ObjectFuelSettings],
+    ) -> ChargeFSM | DischargeFSM:
+        """Создать State машину сервиса"""
+        object_state = await self._state_storage.get(fuel_event)
+        return self.fsm_class(
+            organization_id=fuel_event.organization_id,
+            object_id=fuel_event.object_id,
+            analytic_entity=fuel_event.fuel_entity,
+            settings=self.get_fsm_settings(object_settings),
+            object_state=object_state,
+            deterministic_id=self._deterministic_id,
+        )
+
+    async def save_fsm(self, fsm: ChargeFSM | DischargeFSM):
+        await self._state_storage.set(fsm.object_id, fsm.analytic_entity.id, fsm.object_state)
+
@@ -0,0 +1,27 @@
+"""
+Преобразование файлов телеметрии в колоночный формат для многократного воспроизведения.
+
+    python -m dpt.fuel.run.columnar --file telemetry.json.gz --attr fuel_level_1 --attr fuel_level_2 --output replay/
+"""
+import argparse
+import logging
+from typing import List, Optional
+
+from dpt.fuel.logic.columnar import convert_telemetry_to_columnar
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Преобразование телеметрии в колоночный формат")
+    parser.add_argument('--file', action='append', required=True, help="Файл телеметрии (можно несколько)")
+    parser.add_argument('--attr', action='append', required=True, help="Топливный параметр msg_attr (можно несколько)")
+    parser.add_argument('--output', required=True, help="Каталог колоночного файла")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    arguments = parse_args()
+    convert_telemetry_to_columnar(arguments.file, arguments.output, arguments.attr)
+    logger.info('Telemetry converted to %s', arguments.output)
@@ -0,0 +1,113 @@
+"""
+Пересчёт суточных итогов заправок/сливов по хранилищам заправок и сливов
+(после backfill или для заполнения итогов по уже записанной истории).
+
+    python -m dpt.fuel.run.rollup --begin 2024-01-01 --end 2024-02-01 --object <uuid> --object <uuid>
+
+Пересчитываются целые сутки: от начала суток --begin до конца суток --end. Итоги за эти сутки
+перезаписываются ($set по ключу) значениями по окончившимся заправкам/сливам, которые начались в эти сутки;
+итоги, для которых заправок/сливов не нашлось, обнуляются.
+Заправки/сливы читаются курсором, в памяти - только итоги (по объекту, баку и суткам).
+
+Сервисы заправок/сливов во время пересчёта продолжают прибавлять к итогам ($inc): изменения, записанные
+между чтением заправок/сливов и записью итогов, перезапишутся. Сутки, в которых ещё могут окончиться
+заправки/сливы (текущие), нужно пересчитывать при остановленных сервисах заправок/сливов.
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import uuid
+from contextlib import aclosing
+from typing import Dict, List, Optional, Tuple
+
+from dpt.component import get_utility
+from dpt.config import Configuration
+from dpt.domain.fuel import FuelVolumeRollup
+from dpt.domain.identity import ObjectId, OrganizationId
+from dpt.domain.telemetry import AnalyticEntityId
+from dpt.fuel.storage.interface import IFuelChargeStorage, IFuelDischargeStorage, IFuelVolumeRollupStorage, \
+    make_volume_rollup
+from dpt.utils import DateTimeInterval
+
+logger = logging.getLogger(__name__)
+
+RollupKey = Tuple[OrganizationId, ObjectId, AnalyticEntityId, datetime.datetime]
+
+
+def make_interval(begin: datetime.datetime, end: datetime.datetime) -> DateTimeInterval:
+    """Интервал целых суток от начала суток begin до конца суток end"""
+    return DateTimeInterval(
+        begin=FuelVolumeRollup.get_day(begin),
+        end=FuelVolumeRollup.get_day(end) + datetime.timedelta(days=1, microseconds=-1),
+    )
+
+
+async def collect_rollups(
+        interval: DateTimeInterval,
+        object_ids: Optional[List[ObjectId]] = None,
+        organization_id: Optional[OrganizationId] = None,
+) -> Dict[RollupKey, FuelVolumeRollup]:
+    """Суточные итоги по окончившимся заправкам/сливам, начавшимся на интервале"""
+    rollups = {}
+    for storage_class in (IFuelChargeStorage, IFuelDischargeStorage):
+        async with aclosing(get_utility(storage_class).iterate(
+                object_id=object_ids,
+                organization_id=organization_id,
+                interval=interval,
+        )) as charges:
+            async for charge in charges:
+                if not charge.is_complete or not interval.begin <= charge.begin <= interval.end:
+                    continue
+                item = make_volume_rollup(charge)
+                key = (item.organization_id, item.object_id, item.analytic_entity_id, item.day)
+                if key in rollups:
+                    rollups[key].add(item)
+                else:
+                    rollups[key] = item
+    return rollups
+
+
+async def rebuild(
+        interval: DateTimeInterval,
+        object_ids: Optional[List[ObjectId]] = None,
+        organization_id: Optional[OrganizationId] = None,
+) -> int:
+    """Пересчитать суточные итоги на интервале, вернуть количество записанных итогов"""
+    rollups = await collect_rollups(interval, object_ids, organization_id)
+    storage = get_utility(IFuelVolumeRollupStorage)
+    await storage.create_indexes()
+    for item in await storage.query(object_id=object_ids, organization_id=organization_id, interval=interval):
+        key = (item.organization_id, item.object_id, item.analytic_entity_id, item.day)
+        if key not in rollups:
+            # Заправок/сливов за эти сутки больше нет - итог обнуляется
+            rollups[key] = FuelVolumeRollup(*key)
+    await storage.set_many(list(rollups.values()))
+    return len(rollups)
+
+
+def run(args: argparse.Namespace) -> None:
+    interval = make_interval(args.begin, args.end)
+    object_ids = [ObjectId(uuid.UUID(object_id)) for object_id in args.object] if args.object else None
+    organization_id = OrganizationId(uuid.UUID(args.organization)) if args.organization else None
+    logger.info('Rollup: %s - %s, objects: %s', interval.begin, interval.end, len(object_ids) if object_ids else 'all')
+    count = asyncio.run(rebuild(interval, object_ids, organization_id))
+    logger.info('Rollup: %d daily rollups written', count)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Пересчёт суточных итогов заправок/сливов")
+    parser.add_argument('--begin', type=datetime.datetime.fromisoformat, required=True, help="Первые сутки")
+    parser.add_argument('--end', type=datetime.datetime.fromisoformat, required=True, help="Последние сутки")
+    parser.add_argument('--object', action='append', help="Идентификатор объекта (по умолчанию все)")
+    parser.add_argument('--organization', help="Идентификатор организации (по умолчанию все)")
+    parser.add_argument('--config', default=os.getenv("CONFIGURATION_FILE", "config.toml"))
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    arguments = parse_args()
+    config = Configuration.from_file(arguments.config)
+    run(arguments)
@@ -0,0 +1,150 @@
+"""
+Подбор настроек определения заправок/сливов: сетка вариантов на одной и той же телеметрии.
+
+    python -m dpt.fuel.run.sweep --columnar replay/ --attr fuel_level_1 \
+        --charge min_volume=50,100,150 --charge min_duration_in=10,30 \
+        --discharge max_fuel_speed=0.1,0.3 --discharge min_stoppage_duration=0,30 --workers 8 --output sweep.json
+
+Телеметрия - колоночный файл (python -m dpt.fuel.run.columnar). Каждый ряд (объект + бак) готовится один раз
+и прогоняется пакетными движками для всех вариантов. Ряды делятся на пачки, пачки считаются в пуле процессов.
+Результат - по строке JSON на вариант: настройки и количество/объём найденных заправок или сливов.
+"""
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from dpt.domain.fuel import FuelChargeSettings, FuelDischargeSettings
+from dpt.fuel.logic.batch import PreparedFuelSeries
+from dpt.fuel.logic.columnar import ColumnarTelemetry
+from dpt.fuel.logic.sweep import SweepTotals, make_settings_variants, parse_settings_value, sweep_series
+from dpt.serde.encoder.json import JsonEncoder
+
+logger = logging.getLogger(__name__)
+
+_telemetry: Optional[ColumnarTelemetry] = None
+"""Колоночный файл, открытый в процессе пула"""
+
+
+def init_worker(path: str) -> None:
+    """Инициализация процесса пула: открыть колоночный файл (memory map общий для всех процессов)"""
+    global _telemetry
+    _telemetry = ColumnarTelemetry(path)
+
+
+def sweep_chunk(
+        series_keys: List[Tuple[str, str]],
+        charge_variants: Sequence[FuelChargeSettings],
+        discharge_variants: Sequence[FuelDischargeSettings],
+) -> Tuple[int, List[SweepTotals], List[SweepTotals]]:
+    """Прогнать все варианты по пачке рядов (выполняется в процессе пула)"""
+    charge_totals = [SweepTotals() for _ in charge_variants]
+    discharge_totals = [SweepTotals() for _ in discharge_variants]
+    objects = {str(object_id): object_id for object_id in _telemetry.objects}
+    for object_id, attr in series_keys:
+        prepared = PreparedFuelSeries.prepare(_telemetry.series(objects[object_id], attr))
+        if len(prepared) < 2:
+            continue
+        charges, discharges = sweep_series(prepared, charge_variants, discharge_variants)
+        for total, item in zip(charge_totals, charges):
+            total.add(item)
+        for total, item in zip(discharge_totals, discharges):
+            total.add(item)
+    return len(series_keys), charge_totals, discharge_totals
+
+
+def parse_grid(settings_class: type, items: Optional[List[str]]) -> Dict[str, list]:
+    """Сетка из аргументов вида name=value1,value2"""
+    grid = {}
+    for item in items or ():
+        name, _, values = item.partition('=')
+        grid[name.strip()] = [parse_settings_value(settings_class, name.strip(), value) for value in values.split(',')]
+    return grid
+
+
+def save_results(
+        output: Optional[str],
+        charge_variants: Sequence[FuelChargeSettings],
+        charge_totals: List[SweepTotals],
+        discharge_variants: Sequence[FuelDischargeSettings],
+        discharge_totals: List[SweepTotals],
+) -> None:
+    encoder = JsonEncoder()
+    lines = [
+        encoder.dumps({'type': kind, 'variant': index, 'settings': asdict(settings), **asdict(total)})
+        for kind, variants, totals in (
+            ('charge', charge_variants, charge_totals),
+            ('discharge', discharge_variants, discharge_totals),
+        )
+        for index, (settings, total) in enumerate(zip(variants, totals))
+    ]
+    if output:
+        with open(output, 'w') as output_file:
+            output_file.writelines(f"{line}\n" for line in lines)
+    else:
+        print(*lines, sep='\n')
+
+
+def run(args: argparse.Namespace) -> None:
+    telemetry = ColumnarTelemetry(args.columnar)
+    attrs = args.attr or telemetry.attrs
+    selected = set(args.object or ())
+    series_keys = [
+        (str(object_id), attr)
+        for object_id in telemetry.objects
+        if not selected or str(object_id) in selected
+        for attr in attrs
+    ]
+    chunks = [series_keys[i:i + args.chunk_size] for i in range(0, len(series_keys), args.chunk_size)]
+
+    charge_grid = parse_grid(FuelChargeSettings, args.charge)
+    discharge_grid = parse_grid(FuelDischargeSettings, args.discharge)
+    charge_variants = make_settings_variants(FuelChargeSettings(), charge_grid) if charge_grid else []
+    discharge_variants = make_settings_variants(FuelDischargeSettings(), discharge_grid) if discharge_grid else []
+    logger.info(
+        'Sweep: %d series, %d charge variants, %d discharge variants, %d chunks',
+        len(series_keys), len(charge_variants), len(discharge_variants), len(chunks)
+    )
+
+    charge_totals = [SweepTotals() for _ in charge_variants]
+    discharge_totals = [SweepTotals() for _ in discharge_variants]
+    processed = 0
+    with ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=init_worker,
+            initargs=(args.columnar,),
+    ) as executor:
+        futures = [
+            executor.submit(sweep_chunk, chunk, charge_variants, discharge_variants)
+            for chunk in chunks
+        ]
+        for future in as_completed(futures):
+            count, charges, discharges = future.result()
+            for total, item in zip(charge_totals, charges):
+                total.add(item)
+            for total, item in zip(discharge_totals, discharges):
+                total.add(item)
+            processed += count
+            logger.info('Sweep: %d/%d series', processed, len(series_keys))
+
+    save_results(args.output, charge_variants, charge_totals, discharge_variants, discharge_totals)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Подбор настроек определения заправок/сливов")
+    parser.add_argument('--columnar', required=True, help="Каталог колоночного файла телеметрии")
+    parser.add_argument('--attr', action='append', help="Топливный параметр msg_attr (по умолчанию все из файла)")
+    parser.add_argument('--object', action='append', help="Идентификатор объекта (по умолчанию все из файла)")
+    parser.add_argument('--charge', action='append', help="Параметр заправки: name=value1,value2 (timedelta в секундах)")
+    parser.add_argument('--discharge', action='append', help="Параметр слива: name=value1,value2 (timedelta в секундах)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Количество процессов")
+    parser.add_argument('--chunk-size', type=int, default=20, help="Рядов в одной пачке")
+    parser.add_argument('--output', help="Файл результата (по умолчанию stdout)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run(parse_args())
@@ -4,6 +4,10 @@ from dpt.domain.fuel import BeginFuelChargeCommand, FuelCharge, BeginFuelChargeE
 from dpt.domain.fuel.event.charge import FuelChargeModifiedEvent
 from dpt.fuel.storage.interface import IFuelChargeStorage
 from dpt.monro.command.implements import MongoSetObjectMixin
+from dpt.fuel.storage.last import FuelChargeLastIndex
+
+from .last import SetLastIndexMixin
+from .rollup import SetVolumeRollupMixin
 
 
 __all__ = (
@@ -13,22 +17,33 @@ __all__ = (
 )
 
 
-class BeginFuelChargeCommandHandler(MongoSetObjectMixin, CommandHandler[BeginFuelChargeCommand]):
+class BeginFuelChargeCommandHandler(SetLastIndexMixin, MongoSetObjectMixin, CommandHandler[BeginFuelChargeCommand]):
     """Обработчик начала заправки"""
     model_class = FuelCharge
     storage_class = IFuelChargeStorage
     event_class = BeginFuelChargeEvent
+    last_index_class = FuelChargeLastIndex
 
 
-class EndFuelChargeCommandHandler(MongoSetObjectMixin, CommandHandler[EndFuelChargeCommand]):
-    """Обработчик окончания заправки"""
+class EndFuelChargeCommandHandler(
+    SetLastIndexMixin,
+    SetVolumeRollupMixin,
+    CommandHandler[EndFuelChargeCommand],
+):
+    """Обработчик окончания заправки (заправка учитывается в суточных итогах)"""
     model_class = FuelCharge
     storage_class = IFuelChargeStorage
     event_class = EndFuelChargeEvent
+    last_index_class = FuelChargeLastIndex
 
 
-class SetFuelChargeCommandHandler(MongoSetObjectMixin, CommandHandler[SetFuelChargeCommand]):
-    """Обработчик изменения заправки"""
+class SetFuelChargeCommandHandler(
+    SetLastIndexMixin,
+    SetVolumeRollupMixin,
+    CommandHandler[SetFuelChargeCommand],
+):
+    """Обработчик изменения заправки (изменение окончившейся заправки учитывается в суточных итогах)"""
     model_class = FuelCharge
     storage_class = IFuelChargeStorage
     event_class = FuelChargeModifiedEvent
+    last_index_class = FuelChargeLastIndex
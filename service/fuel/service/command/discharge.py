@@ -3,7 +3,11 @@ from dpt.domain.fuel import BeginFuelDischargeCommand, FuelDischarge, BeginFuelD
     EndFuelDischargeEvent, SetFuelDischargeCommand, DeleteFuelDischargeCommand
 from dpt.domain.fuel.event.discharge import FuelDischargeModifiedEvent, CancelFuelDischargeEvent
 from dpt.fuel.storage.interface import IFuelDischargeStorage
-from dpt.monro.command.implements import MongoSetObjectMixin, MongoDeleteObjectMixin
+from dpt.monro.command.implements import MongoSetObjectMixin
+from dpt.fuel.storage.last import FuelDischargeLastIndex
+
+from .last import SetLastIndexMixin, DeleteLastIndexMixin
+from .rollup import SetVolumeRollupMixin, DeleteVolumeRollupMixin
 
 __all__ = (
     "BeginFuelDischargeCommandHandler",
@@ -13,29 +17,49 @@ __all__ = (
 )
 
 
-class BeginFuelDischargeCommandHandler(MongoSetObjectMixin, CommandHandler[BeginFuelDischargeCommand]):
+class BeginFuelDischargeCommandHandler(
+    SetLastIndexMixin,
+    MongoSetObjectMixin,
+    CommandHandler[BeginFuelDischargeCommand],
+):
     """Обработчик начала слива (Возможно начался слив)"""
     model_class = FuelDischarge
     storage_class = IFuelDischargeStorage
     event_class = BeginFuelDischargeEvent
+    last_index_class = FuelDischargeLastIndex
 
 
-class EndFuelDischargeCommandHandler(MongoSetObjectMixin, CommandHandler[EndFuelDischargeCommand]):
-    """Обработчик окончания слива (Зафиксирован слив)"""
+class EndFuelDischargeCommandHandler(
+    SetLastIndexMixin,
+    SetVolumeRollupMixin,
+    CommandHandler[EndFuelDischargeCommand],
+):
+    """Обработчик окончания слива (Зафиксирован слив, учитывается в суточных итогах)"""
     model_class = FuelDischarge
     storage_class = IFuelDischargeStorage
     event_class = EndFuelDischargeEvent
+    last_index_class = FuelDischargeLastIndex
 
 
-class SetFuelDischargeCommandHandler(MongoSetObjectMixin, CommandHandler[SetFuelDischargeCommand]):
-    """Обработчик изменения слива (Слив продолжается) """
+class SetFuelDischargeCommandHandler(
+    SetLastIndexMixin,
+    SetVolumeRollupMixin,
+    CommandHandler[SetFuelDischargeCommand],
+):
+    """Обработчик изменения слива (Слив продолжается; изменение окончившегося слива учитывается в итогах)"""
     model_class = FuelDischarge
     storage_class = IFuelDischargeStorage
     event_class = FuelDischargeModifiedEvent
+    last_index_class = FuelDischargeLastIndex
 
 
-class DeleteFuelDischargeCommandHandler(MongoDeleteObjectMixin, CommandHandler[DeleteFuelDischargeCommand]):
+class DeleteFuelDischargeCommandHandler(
+    DeleteLastIndexMixin,
+    DeleteVolumeRollupMixin,
+    CommandHandler[DeleteFuelDischargeCommand],
+):
     """Обработчик удаления слива (Слив отменен (ложная тревога)) """
     model_class = FuelDischarge
     storage_class = IFuelDischargeStorage
     event_class = CancelFuelDischargeEvent
+    last_index_class = FuelDischargeLastIndex
@@ -0,0 +1,21 @@
+from dpt.fuel.storage.last import FuelLastIndex
+
+
+class SetLastIndexMixin:
+    """Запись заправки/слива с обновлением индекса последних заправок/сливов по бакам"""
+    last_index_class: type[FuelLastIndex]
+
+    async def handle(self, command, *args, **kwargs):
+        result = await super().handle(command, *args, **kwargs)
+        self.last_index_class().set(command.object)
+        return result
+
+
+class DeleteLastIndexMixin:
+    """Удаление заправки/слива с обновлением индекса последних заправок/сливов по бакам"""
+    last_index_class: type[FuelLastIndex]
+
+    async def handle(self, command, *args, **kwargs):
+        result = await super().handle(command, *args, **kwargs)
+        self.last_index_class().remove(command.object_id)
+        return result
@@ -0,0 +1,54 @@
+from typing import Optional
+
+from dpt.component import get_utility
+from dpt.cqrs import IEventBus
+from dpt.domain.fuel import FuelCharge, FuelDischarge
+from dpt.fuel.storage.interface import IFuelVolumeRollupStorage
+
+
+class VolumeRollupMixin:
+    """
+    Запись заправки/слива с обновлением суточных итогов.
+    Запись в хранилище - одна и атомарна с чтением предыдущей версии: параллельная или повторная команда
+    с тем же идентификатором получит уже записанную версию и не учтёт заправку/слив второй раз.
+    Итоги обновляются после записи; событие публикуется после обновления итогов
+    """
+    storage_class: type
+    event_class: type
+
+    @property
+    def fuel_storage(self):
+        return get_utility(self.storage_class)
+
+    async def update_rollup(
+            self,
+            previous: Optional[FuelCharge | FuelDischarge],
+            current: Optional[FuelCharge | FuelDischarge],
+    ) -> None:
+        # В итогах только окончившиеся: изменения незаконченной заправки/слива итогов не касаются
+        if (previous is None or not previous.is_complete) and (current is None or not current.is_complete):
+            return
+        await get_utility(IFuelVolumeRollupStorage).update(previous, current)
+
+
+class SetVolumeRollupMixin(VolumeRollupMixin):
+    """Запись заправки/слива (вместо записи MongoSetObjectMixin) с обновлением суточных итогов"""
+
+    async def handle(self, command, *args, **kwargs):
+        instance = command.object
+        previous = await self.fuel_storage.set_returning_previous(instance)
+        await self.update_rollup(previous, instance)
+        await get_utility(IEventBus).publish(self.event_class(object=instance))
+        return instance
+
+
+class DeleteVolumeRollupMixin(VolumeRollupMixin):
+    """Удаление заправки/слива (вместо удаления MongoDeleteObjectMixin) с вычитанием из суточных итогов"""
+
+    async def handle(self, command, *args, **kwargs):
+        previous = await self.fuel_storage.delete_returning_previous(command.object_id, command.organization_id)
+        if previous is None:
+            # Нечего удалять (уже удалено или другой организации): ни итогов, ни события
+            return
+        await self.update_rollup(previous, None)
+        await get_utility(IEventBus).publish(self.event_class(object_id=command.object_id))
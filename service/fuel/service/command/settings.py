@@ -1,14 +1,21 @@
-from typing import Optional, List
+import datetime
+from collections import defaultdict
+from typing import Dict, Hashable, Optional, List, Set, Tuple
 
 from dpt.component import get_utility
-from dpt.cqrs import CommandHandler
+from dpt.cqrs import CommandHandler, IEventBus
 from dpt.cqrs.exception import ValidationError
 from dpt.domain.fuel import SetObjectFuelSettingsCommand, DeleteObjectFuelSettingsCommand, \
     RestoreObjectFuelSettingsCommand, SetObjectFuelIntervalSettingsCommand, ObjectFuelIntervalSettings, \
     ObjectFuelIntervalSettingsModifiedEvent, DeleteObjectFuelIntervalSettingsCommand, \
-    ObjectFuelIntervalSettingsDeletedEvent, RestoreObjectFuelIntervalSettingsCommand
-from dpt.domain.fuel.entity import ObjectFuelSettings
-from dpt.domain.fuel.event import ObjectFuelSettingsModifiedEvent, ObjectFuelSettingsDeletedEvent
+    ObjectFuelIntervalSettingsDeletedEvent, RestoreObjectFuelIntervalSettingsCommand, \
+    SetObjectFuelSettingsBulkCommand, SetObjectFuelIntervalSettingsBulkCommand, FuelSmoothingSettings, \
+    FUEL_SMOOTHING_MAX_WINDOW
+from dpt.domain.fuel.entity import ObjectFuelSettings, ObjectFuelAnalyticEntity, ObjectFuelSettingsId
+from dpt.domain.fuel.event import ObjectFuelSettingsModifiedEvent, ObjectFuelSettingsDeletedEvent, \
+    ObjectFuelSettingsBulkModifiedEvent, ObjectFuelIntervalSettingsBulkModifiedEvent
+from dpt.domain.identity import ObjectId, OrganizationId
+from dpt.domain.telemetry import AnalyticEntityId
 from dpt.fuel.analytic_entity import FuelAnalyticEntitiesStorage
 from dpt.fuel.storage.interface import IObjectFuelSettingsStorage, IObjectFuelAnalyticEntityStorage, \
     IObjectFuelIntervalSettingsStorage
@@ -20,15 +27,41 @@ __all__ = (
     "SetObjectFuelSettingsCommandHandler",
     "DeleteObjectFuelSettingsCommandHandler",
     "RestoreObjectFuelSettingsCommandHandler",
+    "SetObjectFuelSettingsBulkCommandHandler",
 
     "SetObjectFuelIntervalSettingsCommandHandler",
     "DeleteObjectFuelIntervalSettingsCommandHandler",
-    "RestoreObjectFuelIntervalSettingsCommandHandler"
+    "RestoreObjectFuelIntervalSettingsCommandHandler",
+    "SetObjectFuelIntervalSettingsBulkCommandHandler",
 )
 
 
+async def get_object_analytic_entity(object_id: ObjectId) -> Optional[ObjectFuelAnalyticEntity]:
+    """Топливные параметры объекта (из хранилища)"""
+    object_storage = get_utility(IObjectFuelAnalyticEntityStorage)
+    found = await object_storage.query(id=object_id)
+    return found[0] if found else None
+
+
+def get_smoothing_error(smoothing: FuelSmoothingSettings) -> Optional[str]:
+    """Ошибка параметров сглаживания (None - параметры в допустимых пределах)"""
+    if not 1 <= smoothing.window <= FUEL_SMOOTHING_MAX_WINDOW:
+        return f"Окно сглаживания должно быть от 1 до {FUEL_SMOOTHING_MAX_WINDOW}."
+    if not 0 < smoothing.alpha <= 1:
+        return "Коэффициент сглаживания должен быть больше 0 и не больше 1."
+    if smoothing.threshold < 0:
+        return "Порог выброса не может быть отрицательным."
+    return None
+
+
 class ValidateSettingsMixin:
 
+    def validate_smoothing(self, instance: ObjectFuelSettings | ObjectFuelIntervalSettings) -> None:
+        """Проверка, что параметры сглаживания в допустимых пределах"""
+        error = get_smoothing_error(instance.smoothing)
+        if error:
+            raise ValidationError(f"Настройки нельзя сохранить. {error}")
+
     async def get_existed_settings_by_model_id(self, instance: ObjectFuelSettings | ObjectFuelIntervalSettings)\
             -> List[ObjectFuelSettings | ObjectFuelIntervalSettings]:
         """Запросить существующие настройки для этой модели и этого анал. параметра"""
@@ -64,19 +97,15 @@ class ValidateSettingsMixin:
 
     async def validate_object_id(self, instance: ObjectFuelSettings | ObjectFuelIntervalSettings) -> bool:
         """Проверка, что объект диспетчеризации доступен для топливных настроек """
-        object_storage = get_utility(IObjectFuelAnalyticEntityStorage)
-        object_analytic_entity = await object_storage.query(id=instance.object_id)
-        return bool(object_analytic_entity)
+        return await get_object_analytic_entity(instance.object_id) is not None
 
     async def validate_analytic_entity_by_object_id(self, instance: ObjectFuelSettings | ObjectFuelIntervalSettings)\
             -> bool:
         """Проверка, что выбранный аналитический параметр доступен для объекта диспетчеризации """
-        object_storage = get_utility(IObjectFuelAnalyticEntityStorage)
-        object_analytic_entity = await object_storage.query(id=instance.object_id)
-        if not object_analytic_entity:
+        object_analytic_entity = await get_object_analytic_entity(instance.object_id)
+        if object_analytic_entity is None:
             return False
-        available_analytic_entity_ids = object_analytic_entity[0].analytic_entity_ids
-        return instance.analytic_entity_id in available_analytic_entity_ids
+        return instance.analytic_entity_id in object_analytic_entity.analytic_entity_ids
 
     async def validate_existed_settings_by_object_id(self, instance: ObjectFuelSettings | ObjectFuelIntervalSettings)\
             -> bool:
@@ -85,6 +114,158 @@ class ValidateSettingsMixin:
         return (not existed_settings) or (existed_settings[0].id == instance.id)
 
 
+def get_settings_key(instance: ObjectFuelSettings | ObjectFuelIntervalSettings) -> Tuple[Hashable, ...]:
+    """Настройки с одинаковым ключом не могут существовать одновременно (объект или модель + параметр)"""
+    if instance.object_id:
+        return instance.organization_id, instance.object_id, None, instance.analytic_entity_id
+    return instance.organization_id, None, instance.model_id, instance.analytic_entity_id
+
+
+class BulkSetSettingsMixin:
+    """
+    Массовое сохранение настроек: объекты и существующие настройки читаются несколькими запросами ($in)
+    на всю пачку, проверки - в памяти, запись - одним запросом.
+    Событие - одно на всю пачку (event_class с objects), событий по каждым настройкам нет:
+    подписчики изменений настроек должны обрабатывать и массовое событие.
+    """
+    storage_class: type
+    event_class: type
+    existed_message_suffix = "."
+
+    async def handle(self, command: SetObjectFuelSettingsBulkCommand | SetObjectFuelIntervalSettingsBulkCommand):
+        instances = command.objects
+        if not instances:
+            return instances
+        for number, instance in enumerate(instances, 1):
+            if instance.organization_id != command.organization_id:
+                raise ValidationError(f"Настройки №{number} нельзя сохранить. Настройки другой организации.")
+        stored = await self.prefetch_stored_settings(instances)
+        await self.validate_bulk(instances, command.organization_id, stored)
+        self.fill_created_at(instances, stored)
+        await get_utility(self.storage_class).set_many(instances)
+        await get_utility(IEventBus).publish(self.event_class(objects=instances))
+        return instances
+
+    async def prefetch_stored_settings(
+            self,
+            instances: List[ObjectFuelSettings | ObjectFuelIntervalSettings],
+    ) -> Dict[ObjectFuelSettingsId, ObjectFuelSettings | ObjectFuelIntervalSettings]:
+        """Сохранённые ранее настройки с идентификаторами пачки (одним запросом)"""
+        storage = get_utility(self.storage_class)
+        return {
+            item.id: item
+            for item in await storage.find(FilterBuilder(instance_id=[instance.id for instance in instances]))
+        }
+
+    @staticmethod
+    def fill_created_at(
+            instances: List[ObjectFuelSettings | ObjectFuelIntervalSettings],
+            stored: Dict[ObjectFuelSettingsId, ObjectFuelSettings | ObjectFuelIntervalSettings],
+    ) -> None:
+        """Время создания - как при сохранении по одной: у новых - сейчас, у существующих - сохранённое"""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for instance in instances:
+            previous = stored.get(instance.id)
+            instance.created_at = previous.created_at if previous is not None and previous.created_at else now
+
+    async def prefetch_analytic_entities(
+            self,
+            instances: List[ObjectFuelSettings | ObjectFuelIntervalSettings],
+            organization_id: OrganizationId,
+    ) -> Dict[ObjectId, Set[AnalyticEntityId]]:
+        """Доступные топливные параметры объектов пачки (одним запросом)"""
+        object_ids = list({instance.object_id for instance in instances if instance.object_id})
+        if not object_ids:
+            return {}
+        object_storage = get_utility(IObjectFuelAnalyticEntityStorage)
+        return {
+            item.id: set(item.analytic_entity_ids)
+            for item in await object_storage.query(id=object_ids, organization_id=organization_id)
+        }
+
+    async def prefetch_existed_settings(
+            self,
+            instances: List[ObjectFuelSettings | ObjectFuelIntervalSettings],
+            organization_id: OrganizationId,
+    ) -> List[ObjectFuelSettings | ObjectFuelIntervalSettings]:
+        """Существующие настройки организации для объектов и моделей пачки (запрос по объектам и по моделям)"""
+        storage = get_utility(self.storage_class)
+        object_ids = list({instance.object_id for instance in instances if instance.object_id})
+        model_ids = list({instance.model_id for instance in instances if not instance.object_id})
+        existed = []
+        if object_ids:
+            existed += await storage.find(
+                FilterBuilder(organization_id=organization_id).by_equal(object_id=object_ids)
+            )
+        if model_ids:
+            existed += await storage.find(
+                FilterBuilder(organization_id=organization_id).by_equal(model_id=model_ids).is_null(object_id=True)
+            )
+        return existed
+
+    def is_conflict(
+            self,
+            instance: ObjectFuelSettings | ObjectFuelIntervalSettings,
+            other: ObjectFuelSettings | ObjectFuelIntervalSettings,
+    ) -> bool:
+        """Конфликтуют ли настройки с одинаковым ключом"""
+        return True
+
+    @staticmethod
+    def validate_foreign_settings(
+            instances: List[ObjectFuelSettings | ObjectFuelIntervalSettings],
+            organization_id: OrganizationId,
+            stored: Dict[ObjectFuelSettingsId, ObjectFuelSettings | ObjectFuelIntervalSettings],
+    ) -> None:
+        """Запись по идентификатору не должна перезаписать настройки другой организации"""
+        for number, instance in enumerate(instances, 1):
+            previous = stored.get(instance.id)
+            if previous is not None and previous.organization_id != organization_id:
+                raise ValidationError(f"Настройки №{number} нельзя сохранить. Настройки другой организации.")
+
+    async def validate_bulk(
+            self,
+            instances: List[ObjectFuelSettings | ObjectFuelIntervalSettings],
+            organization_id: OrganizationId,
+            stored: Dict[ObjectFuelSettingsId, ObjectFuelSettings | ObjectFuelIntervalSettings],
+    ) -> None:
+        self.validate_foreign_settings(instances, organization_id, stored)
+        analytic_entities = await self.prefetch_analytic_entities(instances, organization_id)
+        batch_ids = {instance.id for instance in instances}
+        settings_by_key = defaultdict(list)
+        for item in await self.prefetch_existed_settings(instances, organization_id):
+            # Настройки, которые перезаписываются этой же пачкой, не учитываем
+            if item.id not in batch_ids:
+                settings_by_key[get_settings_key(item)].append(item)
+
+        for number, instance in enumerate(instances, 1):
+            prefix = f"Настройки №{number} нельзя сохранить."
+            smoothing_error = get_smoothing_error(instance.smoothing)
+            if smoothing_error:
+                raise ValidationError(f"{prefix} {smoothing_error}")
+            others = settings_by_key[get_settings_key(instance)]
+            if instance.object_id:
+                available_analytic_entity_ids = analytic_entities.get(instance.object_id)
+                if available_analytic_entity_ids is None:
+                    raise ValidationError(f"{prefix} Выбранный объект недоступен для определения заправок.")
+                if instance.analytic_entity_id not in available_analytic_entity_ids:
+                    raise ValidationError(f"{prefix} Выбранный топливный параметр недоступен для объекта.")
+                if any(self.is_conflict(instance, other) for other in others):
+                    raise ValidationError(
+                        f"{prefix} Настройки для выбранного объекта и параметра уже существуют"
+                        f"{self.existed_message_suffix}"
+                    )
+            else:
+                if instance.analytic_entity_id not in FuelAnalyticEntitiesStorage().ids:
+                    raise ValidationError(f"{prefix} Выбранный топливный параметр недоступен.")
+                if any(self.is_conflict(instance, other) for other in others):
+                    raise ValidationError(
+                        f"{prefix} Настройки для выбранной модели и параметра уже существуют"
+                        f"{self.existed_message_suffix}"
+                    )
+            others.append(instance)
+
+
 class SetObjectFuelSettingsCommandHandler(MongoSetObjectMixin, ValidateSettingsMixin, CommandHandler[SetObjectFuelSettingsCommand]):
     """Сохранение настроек заправок/сливов"""
     model_class = ObjectFuelSettings
@@ -92,6 +273,7 @@ class SetObjectFuelSettingsCommandHandler(MongoSetObjectMixin, ValidateSettingsM
     event_class = ObjectFuelSettingsModifiedEvent
 
     async def validate(self, instance: ObjectFuelSettings, is_created: Optional[bool] = None):
+        self.validate_smoothing(instance)
         if instance.object_id:
             if not await self.validate_object_id(instance):
                 raise ValidationError(
@@ -129,6 +311,12 @@ class RestoreObjectFuelSettingsCommandHandler(MongoRestoreObjectMixin, CommandHa
     event_class = ObjectFuelSettingsModifiedEvent
 
 
+class SetObjectFuelSettingsBulkCommandHandler(BulkSetSettingsMixin, CommandHandler[SetObjectFuelSettingsBulkCommand]):
+    """Массовое сохранение настроек заправок/сливов (импорт)"""
+    storage_class = IObjectFuelSettingsStorage
+    event_class = ObjectFuelSettingsBulkModifiedEvent
+
+
 class SetObjectFuelIntervalSettingsCommandHandler(MongoSetObjectMixin, ValidateSettingsMixin, CommandHandler[SetObjectFuelIntervalSettingsCommand]):
     """Сохранение настроек заправок/сливов на интервал времени"""
     model_class = ObjectFuelIntervalSettings
@@ -136,6 +324,7 @@ class SetObjectFuelIntervalSettingsCommandHandler(MongoSetObjectMixin, ValidateS
     event_class = ObjectFuelIntervalSettingsModifiedEvent
 
     async def validate(self, instance: ObjectFuelSettings, is_created: Optional[bool] = None):
+        self.validate_smoothing(instance)
         if instance.object_id:
             if not await self.validate_object_id(instance):
                 raise ValidationError(
@@ -195,3 +384,17 @@ class RestoreObjectFuelIntervalSettingsCommandHandler(MongoRestoreObjectMixin, C
     model_class = ObjectFuelIntervalSettings
     storage_class = IObjectFuelIntervalSettingsStorage
     event_class = ObjectFuelIntervalSettingsModifiedEvent
+
+
+class SetObjectFuelIntervalSettingsBulkCommandHandler(
+    BulkSetSettingsMixin,
+    CommandHandler[SetObjectFuelIntervalSettingsBulkCommand],
+):
+    """Массовое сохранение настроек заправок/сливов на интервал времени (импорт)"""
+    storage_class = IObjectFuelIntervalSettingsStorage
+    event_class = ObjectFuelIntervalSettingsBulkModifiedEvent
+    existed_message_suffix = " и пересекаются с выбранным интервалом."
+
+    def is_conflict(self, instance: ObjectFuelIntervalSettings, other: ObjectFuelIntervalSettings) -> bool:
+        """Интервалы (begin, end] пересекаются"""
+        return instance.interval.begin < other.interval.end and other.interval.begin < instance.interval.end
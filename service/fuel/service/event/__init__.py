@@ -1 +1,2 @@
-from .object_config import *
\ No newline at end of file
+from .object_config import *
+from .chart_cache import *
\ No newline at end of file
@@ -0,0 +1,59 @@
+from dpt.cqrs import EventHandler
+from dpt.domain.fuel import BeginFuelChargeEvent, EndFuelChargeEvent, FuelChargeModifiedEvent, \
+    BeginFuelDischargeEvent, EndFuelDischargeEvent, FuelDischargeModifiedEvent, CancelFuelDischargeEvent
+from dpt.fuel.storage.cache import FuelChargeChartCache, FuelDischargeChartCache
+
+__all__ = (
+    "BeginFuelChargeChartCacheHandler",
+    "EndFuelChargeChartCacheHandler",
+    "FuelChargeModifiedChartCacheHandler",
+    "BeginFuelDischargeChartCacheHandler",
+    "EndFuelDischargeChartCacheHandler",
+    "FuelDischargeModifiedChartCacheHandler",
+    "CancelFuelDischargeChartCacheHandler",
+)
+
+
+class ChargeChartCacheMixin:
+    """Применить изменение заправки к кэшу графиков"""
+
+    async def handle(self, event: BeginFuelChargeEvent | EndFuelChargeEvent | FuelChargeModifiedEvent):
+        FuelChargeChartCache().upsert(event.object)
+
+
+class DischargeChartCacheMixin:
+    """Применить изменение слива к кэшу графиков"""
+
+    async def handle(self, event: BeginFuelDischargeEvent | EndFuelDischargeEvent | FuelDischargeModifiedEvent):
+        FuelDischargeChartCache().upsert(event.object)
+
+
+class BeginFuelChargeChartCacheHandler(ChargeChartCacheMixin, EventHandler[BeginFuelChargeEvent]):
+    """Кэш графиков: заправка началась"""
+
+
+class EndFuelChargeChartCacheHandler(ChargeChartCacheMixin, EventHandler[EndFuelChargeEvent]):
+    """Кэш графиков: заправка окончилась"""
+
+
+class FuelChargeModifiedChartCacheHandler(ChargeChartCacheMixin, EventHandler[FuelChargeModifiedEvent]):
+    """Кэш графиков: заправка продолжается"""
+
+
+class BeginFuelDischargeChartCacheHandler(DischargeChartCacheMixin, EventHandler[BeginFuelDischargeEvent]):
+    """Кэш графиков: слив начался"""
+
+
+class EndFuelDischargeChartCacheHandler(DischargeChartCacheMixin, EventHandler[EndFuelDischargeEvent]):
+    """Кэш графиков: слив окончился"""
+
+
+class FuelDischargeModifiedChartCacheHandler(DischargeChartCacheMixin, EventHandler[FuelDischargeModifiedEvent]):
+    """Кэш графиков: слив продолжается"""
+
+
+class CancelFuelDischargeChartCacheHandler(EventHandler[CancelFuelDischargeEvent]):
+    """Кэш графиков: слив отменён"""
+
+    async def handle(self, event: CancelFuelDischargeEvent):
+        FuelDischargeChartCache().remove(event.object_id)
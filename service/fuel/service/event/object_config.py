@@ -1,9 +1,10 @@
 from dpt.component import inject
 from dpt.cqrs import EventHandler
 from dpt.cqrs.bus import UnitOfWork
-from dpt.domain.fuel.entity import ObjectFuelAnalyticEntity
-from dpt.domain.telemetry import ObjectConfigurationModifiedEvent, AnalyticEntityId
-from dpt.fuel.analytic_entity import FuelAnalyticEntitiesStorage
+from dpt.domain.telemetry import ObjectConfigurationModifiedEvent
+from dpt.fuel.analytic_entity import ObjectFuelAnalyticEntitiesStorage, make_object_fuel_analytic_entity, \
+    is_same_object_fuel_analytic_entity
+from dpt.fuel.metrics import FuelMetrics
 from dpt.fuel.storage.interface import IObjectFuelAnalyticEntityStorage
 
 __all__ = (
@@ -16,19 +17,19 @@ class ObjectConfigurationModifiedEventHandler(EventHandler[ObjectConfigurationMo
 
     @inject
     async def handle(self, event: ObjectConfigurationModifiedEvent, storage: IObjectFuelAnalyticEntityStorage):
-        analytic_entity_ids = set()
-        for controller_config in event.object.controllers:
-            for analytic_settings in controller_config.analytic_settings:
-                if analytic_settings.analytic_entity_id in FuelAnalyticEntitiesStorage().ids:
-                    if analytic_settings.analytic_entity_id not in analytic_entity_ids:
-                        analytic_entity_ids.add(AnalyticEntityId(analytic_settings.analytic_entity_id))
+        saved_object = make_object_fuel_analytic_entity(event)
+        object_fuel_entities = ObjectFuelAnalyticEntitiesStorage()
+        if not object_fuel_entities.is_loaded:
+            await object_fuel_entities.load(storage)
+        # Сравниваем с памятью процесса: загружена из хранилища один раз и обновляется этими же событиями
+        stored_object = object_fuel_entities.get(event.object.id)
+        if is_same_object_fuel_analytic_entity(stored_object, saved_object):
+            # Набор топливных параметров не изменился - хранилище не трогаем
+            FuelMetrics().incr("object_config_unchanged")
+            object_fuel_entities.set(event.object.id, stored_object)
+            return
 
-        if analytic_entity_ids:
-            saved_object = ObjectFuelAnalyticEntity(
-                id=event.object.id,
-                organization_id=event.object.enterprise_id,
-                analytic_entity_ids=sorted(analytic_entity_ids)
-            )
+        if saved_object is not None:
             # Сохраняем список доступных топливных аналит. параметров для объекта диспетчеризации
             async with UnitOfWork() as unit_of_work:
                 await storage.set(saved_object, unit_of_work)
@@ -36,3 +37,4 @@ class ObjectConfigurationModifiedEventHandler(EventHandler[ObjectConfigurationMo
             # Удаляем список доступных топливных аналит. параметров для объекта диспетчеризации
             async with UnitOfWork() as unit_of_work:
                 await storage.delete(event.object.id, unit_of_work)
+        object_fuel_entities.set(event.object.id, saved_object)
@@ -1,24 +1,75 @@
-from typing import Optional
+from contextlib import aclosing
+from typing import Dict, List, Optional
 
 from dpt.component import inject
 from dpt.cqrs import QueryHandler
-from dpt.domain.fuel import LastFuelChargeQuery, FuelCharge
+from dpt.domain.fuel import LastFuelChargeQuery, FuelCharge, FuelChargeBatchQuery, FuelChargeQuery
+from dpt.domain.identity import ObjectId
 from dpt.fuel.storage.interface import IFuelChargeStorage
+from dpt.fuel.storage.last import FuelChargeLastIndex
 
 
 __all__ = (
     "LastFuelChargeQueryHandler",
+    "FuelChargeQueryHandler",
+    "FuelChargeBatchQueryHandler",
 )
 
 
 class LastFuelChargeQueryHandler(QueryHandler[LastFuelChargeQuery]):
-    """Запрос последней заправки по объекту и баку"""
+    """Запрос последней заправки по объекту и баку (сначала - индекс записанных в процессе, затем хранилище)"""
 
     @inject
     async def handle(self, query: LastFuelChargeQuery, storage: IFuelChargeStorage) -> Optional[FuelCharge]:
+        last_index = FuelChargeLastIndex()
+        last = last_index.get(
+            object_id=query.object_id,
+            analytic_entity_id=query.analytic_entity_id,
+            organization_id=query.organization_id,
+        )
+        if last is not None:
+            return last
+        # Прочитанное из хранилища в индекс не попадает: его заполняют только обработчики команд записи,
+        # иначе чтение, обогнавшее запись в другом процессе, закрепило бы в индексе устаревшую версию
         return await storage.get_last(
             object_id=query.object_id,
             analytic_entity_id=query.analytic_entity_id,
             organization_id=query.organization_id,
         )
 
+
+class FuelChargeQueryHandler(QueryHandler[FuelChargeQuery]):
+    """Запрос заправок по объекту (постранично - курсором хранилища, без чтения всего интервала)"""
+
+    @inject
+    async def handle(self, query: FuelChargeQuery, storage: IFuelChargeStorage) -> List[FuelCharge]:
+        items = []
+        if query.limit is not None and query.limit <= 0:
+            return items
+        async with aclosing(storage.iterate(
+                object_id=query.object_id,
+                organization_id=query.organization_id,
+                interval=query.interval,
+                after=query.after,
+        )) as charges:
+            async for item in charges:
+                items.append(item)
+                if len(items) == query.limit:
+                    break
+        return items
+
+
+class FuelChargeBatchQueryHandler(QueryHandler[FuelChargeBatchQuery]):
+    """Запрос заправок по нескольким объектам одним запросом к хранилищу"""
+
+    @inject
+    async def handle(
+            self,
+            query: FuelChargeBatchQuery,
+            storage: IFuelChargeStorage,
+    ) -> Dict[ObjectId, List[FuelCharge]]:
+        return await storage.query_by_object(
+            object_ids=query.object_ids,
+            organization_id=query.organization_id,
+            interval=query.interval,
+        )
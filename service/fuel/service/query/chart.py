@@ -1,20 +1,39 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Dict, List
 
 from dpt.component import get_utility
 from dpt.cqrs import QueryHandler
-from dpt.domain.fuel import ChargeChartIntervalQuery, DischargeChartIntervalQuery
+from dpt.domain.fuel import ChargeChartIntervalQuery, DischargeChartIntervalQuery, ChargeChartIntervalBatchQuery, \
+    DischargeChartIntervalBatchQuery
+from dpt.domain.identity import ObjectId
 from dpt.domain.telemetry import ChartIntervalQuery, ChartInterval
 from dpt.utils import DateTimeInterval
 
-from ...storage.interface import IFuelChargeStorage, IFuelDischargeStorage
+from ...storage.cache import FuelChartCache, FuelChargeChartCache, FuelDischargeChartCache
+from ...storage.interface import IFuelChargeStorage, IFuelDischargeStorage, FuelChargeRecord
 
 __all__ = (
     "ChargeChartIntervalQueryHandler",
     "DischargeChartIntervalQueryHandler",
+    "ChargeChartIntervalBatchQueryHandler",
+    "DischargeChartIntervalBatchQueryHandler",
 )
 
 
+def make_chart_interval(charge: FuelChargeRecord) -> ChartInterval:
+    return ChartInterval(
+        object_id=charge.object_id,
+        interval=DateTimeInterval(
+            begin=charge.begin,
+            end=charge.end,
+        ),
+        attributes={
+            "volume_begin": charge.volume_begin,
+            "volume_end": charge.volume_end,
+        },
+    )
+
+
 class BaseChartIntervalQueryHandler(ABC):
 
     @property
@@ -22,20 +41,16 @@ class BaseChartIntervalQueryHandler(ABC):
     def storage_class(self) -> IFuelChargeStorage | IFuelDischargeStorage:
         ...
 
+    @property
+    @abstractmethod
+    def cache_class(self) -> type[FuelChartCache]:
+        ...
+
     async def handle(self, query: ChartIntervalQuery) -> List[ChartInterval]:
         return [
-            ChartInterval(
-                object_id=charge.object_id,
-                interval=DateTimeInterval(
-                    begin=charge.begin,
-                    end=charge.end,
-                ),
-                attributes={
-                    "volume_begin": charge.volume_begin,
-                    "volume_end": charge.volume_end,
-                },
-            )
-            for charge in await get_utility(self.storage_class).query(
+            make_chart_interval(charge)
+            for charge in await self.cache_class().query(
+                storage=get_utility(self.storage_class),
                 object_id=query.object_id,
                 organization_id=query.organization_id,
                 interval=query.interval,
@@ -45,7 +60,44 @@ class BaseChartIntervalQueryHandler(ABC):
 
 class ChargeChartIntervalQueryHandler(BaseChartIntervalQueryHandler, QueryHandler[ChargeChartIntervalQuery]):
     storage_class = IFuelChargeStorage
+    cache_class = FuelChargeChartCache
 
 
 class DischargeChartIntervalQueryHandler(BaseChartIntervalQueryHandler, QueryHandler[DischargeChartIntervalQuery]):
     storage_class = IFuelDischargeStorage
+    cache_class = FuelDischargeChartCache
+
+
+class BaseChartIntervalBatchQueryHandler(BaseChartIntervalQueryHandler):
+    """Заправки/сливы для графиков по нескольким объектам: одним запросом к хранилищу для объектов не из кэша"""
+
+    async def handle(
+            self,
+            query: ChargeChartIntervalBatchQuery | DischargeChartIntervalBatchQuery,
+    ) -> Dict[ObjectId, List[ChartInterval]]:
+        grouped = await self.cache_class().query_many(
+            storage=get_utility(self.storage_class),
+            object_ids=query.object_ids,
+            organization_id=query.organization_id,
+            interval=query.interval,
+        )
+        return {
+            object_id: [make_chart_interval(charge) for charge in charges]
+            for object_id, charges in grouped.items()
+        }
+
+
+class ChargeChartIntervalBatchQueryHandler(
+    BaseChartIntervalBatchQueryHandler,
+    QueryHandler[ChargeChartIntervalBatchQuery],
+):
+    storage_class = IFuelChargeStorage
+    cache_class = FuelChargeChartCache
+
+
+class DischargeChartIntervalBatchQueryHandler(
+    BaseChartIntervalBatchQueryHandler,
+    QueryHandler[DischargeChartIntervalBatchQuery],
+):
+    storage_class = IFuelDischargeStorage
+    cache_class = FuelDischargeChartCache
@@ -1,23 +1,74 @@
-from typing import Optional
+from contextlib import aclosing
+from typing import Dict, List, Optional
 
 from dpt.component import inject
 from dpt.cqrs import QueryHandler
-from dpt.domain.fuel import LastFuelDischargeQuery, FuelDischarge
+from dpt.domain.fuel import LastFuelDischargeQuery, FuelDischarge, FuelDischargeBatchQuery, FuelDischargeQuery
+from dpt.domain.identity import ObjectId
 from dpt.fuel.storage.interface import IFuelDischargeStorage
+from dpt.fuel.storage.last import FuelDischargeLastIndex
 
 __all__ = (
     "LastFuelDischargeQueryHandler",
+    "FuelDischargeQueryHandler",
+    "FuelDischargeBatchQueryHandler",
 )
 
 
 class LastFuelDischargeQueryHandler(QueryHandler[LastFuelDischargeQuery]):
-    """Запрос последнего слива по объекту и баку"""
+    """Запрос последнего слива по объекту и баку (сначала - индекс записанных в процессе, затем хранилище)"""
 
     @inject
     async def handle(self, query: LastFuelDischargeQuery, storage: IFuelDischargeStorage) -> Optional[FuelDischarge]:
+        last_index = FuelDischargeLastIndex()
+        last = last_index.get(
+            object_id=query.object_id,
+            analytic_entity_id=query.analytic_entity_id,
+            organization_id=query.organization_id,
+        )
+        if last is not None:
+            return last
+        # Прочитанное из хранилища в индекс не попадает: его заполняют только обработчики команд записи,
+        # иначе чтение, обогнавшее запись в другом процессе, закрепило бы в индексе устаревшую версию
         return await storage.get_last(
             object_id=query.object_id,
             analytic_entity_id=query.analytic_entity_id,
             organization_id=query.organization_id,
         )
 
+
+class FuelDischargeQueryHandler(QueryHandler[FuelDischargeQuery]):
+    """Запрос сливов по объекту (постранично - курсором хранилища, без чтения всего интервала)"""
+
+    @inject
+    async def handle(self, query: FuelDischargeQuery, storage: IFuelDischargeStorage) -> List[FuelDischarge]:
+        items = []
+        if query.limit is not None and query.limit <= 0:
+            return items
+        async with aclosing(storage.iterate(
+                object_id=query.object_id,
+                organization_id=query.organization_id,
+                interval=query.interval,
+                after=query.after,
+        )) as charges:
+            async for item in charges:
+                items.append(item)
+                if len(items) == query.limit:
+                    break
+        return items
+
+
+class FuelDischargeBatchQueryHandler(QueryHandler[FuelDischargeBatchQuery]):
+    """Запрос сливов по нескольким объектам одним запросом к хранилищу"""
+
+    @inject
+    async def handle(
+            self,
+            query: FuelDischargeBatchQuery,
+            storage: IFuelDischargeStorage,
+    ) -> Dict[ObjectId, List[FuelDischarge]]:
+        return await storage.query_by_object(
+            object_ids=query.object_ids,
+            organization_id=query.organization_id,
+            interval=query.interval,
+        )
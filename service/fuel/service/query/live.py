@@ -0,0 +1,22 @@
+from typing import List
+
+from dpt.cqrs import QueryHandler
+from dpt.domain.fuel import LiveFuelStateQuery, LiveFuelState
+from dpt.fuel.logic.storage import FuelChargeStateStorage, FuelDischargeStateStorage
+
+__all__ = (
+    "LiveFuelStateQueryHandler",
+)
+
+
+class LiveFuelStateQueryHandler(QueryHandler[LiveFuelStateQuery]):
+    """
+    Текущие состояния баков из памяти процесса, который получил запрос: заправки - в процессе заправок,
+    сливы - в процессе сливов, и только баки объектов, которые обрабатывает этот процесс
+    """
+
+    async def handle(self, query: LiveFuelStateQuery) -> List[LiveFuelState]:
+        return [
+            *FuelChargeStateStorage().get_live_states(query.organization_id, query.object_id),
+            *FuelDischargeStateStorage().get_live_states(query.organization_id, query.object_id),
+        ]
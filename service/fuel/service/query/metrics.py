@@ -0,0 +1,16 @@
+from typing import Dict
+
+from dpt.cqrs import QueryHandler
+from dpt.domain.fuel import FuelMetricsQuery
+from dpt.fuel.metrics import FuelMetrics
+
+__all__ = (
+    "FuelMetricsQueryHandler",
+)
+
+
+class FuelMetricsQueryHandler(QueryHandler[FuelMetricsQuery]):
+    """Счётчики процесса и производные доли"""
+
+    async def handle(self, query: FuelMetricsQuery) -> Dict[str, float]:
+        return FuelMetrics().report()
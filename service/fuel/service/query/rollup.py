@@ -0,0 +1,23 @@
+from typing import List
+
+from dpt.component import inject
+from dpt.cqrs import QueryHandler
+from dpt.domain.fuel import FuelVolumeSummaryQuery, FuelVolumeRollup
+from dpt.fuel.storage.interface import IFuelVolumeRollupStorage
+
+__all__ = (
+    "FuelVolumeSummaryQueryHandler",
+)
+
+
+class FuelVolumeSummaryQueryHandler(QueryHandler[FuelVolumeSummaryQuery]):
+    """Запрос суточных итогов заправок/сливов (без чтения самих заправок/сливов)"""
+
+    @inject
+    async def handle(self, query: FuelVolumeSummaryQuery, storage: IFuelVolumeRollupStorage) -> List[FuelVolumeRollup]:
+        return await storage.query(
+            object_id=query.object_id,
+            organization_id=query.organization_id,
+            interval=query.interval,
+            analytic_entity_id=query.analytic_entity_id,
+        )
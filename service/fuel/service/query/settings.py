@@ -6,6 +6,7 @@ from dpt.domain.fuel import ObjectFuelIntervalSettings
 from dpt.domain.fuel.entity import ObjectFuelSettings, ObjectFuelAnalyticEntity
 from dpt.domain.fuel.query.settings import ObjectFuelSettingsQuery, ObjectFuelAnalyticEntityQuery, \
     ObjectFuelIntervalSettingsQuery
+from dpt.domain.identity import DeletionStatus
 from dpt.fuel.storage.interface import IObjectFuelSettingsStorage, IObjectFuelAnalyticEntityStorage, \
     IObjectFuelIntervalSettingsStorage
 
@@ -17,11 +18,16 @@ __all__ = (
 
 
 class ObjectFuelSettingsQueryHandler(QueryHandler[ObjectFuelSettingsQuery]):
-    """Запрос настроек определения заправок/сливов"""
+    """
+    Запрос настроек определения заправок/сливов.
+    Не удалённые - копии из локального кэша, если процесс обновляет его по событиям изменения настроек
+    """
 
     @inject
     async def handle(self, query: ObjectFuelSettingsQuery, storage: IObjectFuelSettingsStorage)\
             -> List[ObjectFuelSettings]:
+        if query.deletion == DeletionStatus.PRESENT and storage.is_tracked:
+            return storage.query_loaded(id=query.id, organization_id=query.organization_id)
         return await storage.query(
             id=query.id,
             organization_id=query.organization_id,
@@ -30,11 +36,16 @@ class ObjectFuelSettingsQueryHandler(QueryHandler[ObjectFuelSettingsQuery]):
 
 
 class ObjectFuelIntervalSettingsQueryHandler(QueryHandler[ObjectFuelIntervalSettingsQuery]):
-    """Запрос настроек определения заправок/сливов на интервал времени"""
+    """
+    Запрос настроек определения заправок/сливов на интервал времени.
+    Не удалённые - копии из локального кэша, если процесс обновляет его по событиям изменения настроек
+    """
 
     @inject
     async def handle(self, query: ObjectFuelIntervalSettingsQuery, storage: IObjectFuelIntervalSettingsStorage) \
             -> List[ObjectFuelIntervalSettings]:
+        if query.deletion == DeletionStatus.PRESENT and storage.is_tracked:
+            return storage.query_loaded(id=query.id, organization_id=query.organization_id)
         return await storage.query(
             id=query.id,
             organization_id=query.organization_id,
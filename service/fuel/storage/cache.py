@@ -0,0 +1,263 @@
+import bisect
+import datetime
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from dpt.component.utils import Singleton
+from dpt.domain.fuel import FuelCharge, FuelDischarge
+from dpt.domain.identity import ObjectId, OrganizationId
+from dpt.fuel.metrics import FuelMetrics
+from dpt.utils import DateTimeOpenInterval
+
+from .interface import IFuelChargeStorage, IFuelDischargeStorage, FuelChargeRecord
+
+__all__ = (
+    "FuelChartCache",
+    "FuelChargeChartCache",
+    "FuelDischargeChartCache",
+)
+
+
+class _ObjectIntervals:
+    """Заправки/сливы одного объекта: индекс по времени начала и загруженные из хранилища интервалы"""
+
+    def __init__(self):
+        self.items: Dict[Hashable, FuelChargeRecord] = {}
+        self.begins: List[datetime.datetime] = []
+        """Время начала, отсортировано"""
+        self.ids: List[Hashable] = []
+        """Идентификаторы в порядке begins"""
+        self.max_duration = datetime.timedelta(0)
+        """Наибольшая продолжительность - насколько раньше начала интервала искать пересекающие его"""
+        self.coverage: List[Tuple[datetime.datetime, datetime.datetime]] = []
+        """Интервалы, для которых известны все пересекающие их заправки/сливы (отсортированы, не пересекаются)"""
+
+    def upsert(self, item: FuelChargeRecord) -> None:
+        previous = self.items.get(item.id)
+        if previous is not None and previous.begin != item.begin:
+            self._unindex(previous)
+        if previous is None or previous.begin != item.begin:
+            index = bisect.bisect_right(self.begins, item.begin)
+            self.begins.insert(index, item.begin)
+            self.ids.insert(index, item.id)
+        self.items[item.id] = item
+        self.max_duration = max(self.max_duration, item.end - item.begin)
+
+    def remove(self, item_id: Hashable) -> None:
+        item = self.items.pop(item_id, None)
+        if item is not None:
+            self._unindex(item)
+
+    def _unindex(self, item: FuelChargeRecord) -> None:
+        index = bisect.bisect_left(self.begins, item.begin)
+        while self.ids[index] != item.id:
+            index += 1
+        del self.begins[index]
+        del self.ids[index]
+
+    def covers(self, begin: datetime.datetime, end: datetime.datetime) -> bool:
+        return any(cover_begin <= begin and end <= cover_end for cover_begin, cover_end in self.coverage)
+
+    def cover(self, begin: datetime.datetime, end: datetime.datetime) -> None:
+        """Добавить загруженный интервал (со слиянием пересекающихся)"""
+        merged = []
+        for cover_begin, cover_end in self.coverage:
+            if cover_end < begin or end < cover_begin:
+                merged.append((cover_begin, cover_end))
+            else:
+                begin, end = min(begin, cover_begin), max(end, cover_end)
+        bisect.insort(merged, (begin, end))
+        self.coverage = merged
+
+    def between(self, begin: datetime.datetime, end: datetime.datetime) -> List[FuelChargeRecord]:
+        """Заправки/сливы, пересекающие интервал, по времени начала"""
+        stop = bisect.bisect_right(self.begins, end)
+        start = bisect.bisect_left(self.begins, begin - self.max_duration)
+        return [
+            self.items[item_id]
+            for item_id in self.ids[start:stop]
+            if self.items[item_id].end >= begin
+        ]
+
+
+class FuelChartCache:
+    """
+    Кэш заправок/сливов для графиков (read-through).
+    По объекту запоминаются интервалы, уже загруженные из хранилища; запрос внутри них хранилище не читает.
+    Изменения (начало, продолжение, окончание, отмена) приходят событиями и применяются к кэшу,
+    поэтому незаконченные заправки/сливы в ответе всегда актуальны.
+    Хранятся и возвращаются FuelChargeRecord - только поля, нужные графику.
+    Ключ кэша - объект (как и у событий): из хранилища читаются записи объекта всех организаций,
+    организация запроса применяется фильтром при чтении.
+    Изменения, пришедшие во время чтения объекта из хранилища, откладываются и применяются после чтения;
+    в этом случае интервал не считается загруженным и следующий запрос прочитает его заново.
+    Объекты вытесняются по давности запроса (не больше capacity объектов).
+    Пересечение с интервалом запроса: begin <= interval.end и end >= interval.begin.
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+        self._objects: OrderedDict[ObjectId, _ObjectIntervals] = OrderedDict()
+        self._keys: Dict[Hashable, ObjectId] = {}
+        """Идентификатор заправки/слива -> объект в кэше"""
+        self._loading: Dict[ObjectId, List[List[Tuple[str, Any]]]] = {}
+        """Объект -> изменения, пришедшие во время каждого из незавершённых чтений из хранилища"""
+
+    async def query(
+            self,
+            storage: IFuelChargeStorage | IFuelDischargeStorage,
+            object_id: ObjectId,
+            organization_id: Optional[OrganizationId],
+            interval: Optional[DateTimeOpenInterval],
+    ) -> List[FuelChargeRecord]:
+        """Заправки/сливы объекта на интервале (из кэша или с дочиткой интервала из хранилища)"""
+        if interval is None or interval.begin is None or interval.end is None or \
+                isinstance(object_id, list) or isinstance(organization_id, list):
+            FuelMetrics().incr("chart_cache_bypass")
+            return await storage.query_records(object_id=object_id, organization_id=organization_id, interval=interval)
+
+        intervals = self._objects.get(object_id)
+        if intervals is not None and intervals.covers(interval.begin, interval.end):
+            self._objects.move_to_end(object_id)
+            FuelMetrics().incr("chart_cache_hit")
+            return self._filter(intervals.between(interval.begin, interval.end), organization_id)
+
+        FuelMetrics().incr("chart_cache_miss")
+        buffers = self._begin_load([object_id])
+        try:
+            items = await storage.query_records(object_id=object_id, organization_id=None, interval=interval)
+        finally:
+            self._end_load(buffers)
+        return self._filter(self._load(object_id, items, interval, buffers[object_id]), organization_id)
+
+    async def query_many(
+            self,
+            storage: IFuelChargeStorage | IFuelDischargeStorage,
+            object_ids: List[ObjectId],
+            organization_id: Optional[OrganizationId],
+            interval: Optional[DateTimeOpenInterval],
+    ) -> Dict[ObjectId, List[FuelChargeRecord]]:
+        """
+        Заправки/сливы нескольких объектов на интервале, по объектам.
+        Объекты, которых нет в кэше, дочитываются из хранилища одним запросом.
+        """
+        if interval is None or interval.begin is None or interval.end is None or isinstance(organization_id, list):
+            FuelMetrics().incr("chart_cache_bypass")
+            return await storage.query_records_by_object(
+                object_ids=object_ids,
+                organization_id=organization_id,
+                interval=interval,
+            )
+
+        result = {}
+        missing = []
+        for object_id in object_ids:
+            intervals = self._objects.get(object_id)
+            if intervals is not None and intervals.covers(interval.begin, interval.end):
+                self._objects.move_to_end(object_id)
+                result[object_id] = intervals.between(interval.begin, interval.end)
+            else:
+                missing.append(object_id)
+        FuelMetrics().incr("chart_cache_hit", len(result))
+
+        if missing:
+            FuelMetrics().incr("chart_cache_miss", len(missing))
+            buffers = self._begin_load(missing)
+            try:
+                loaded = await storage.query_records_by_object(
+                    object_ids=missing,
+                    organization_id=None,
+                    interval=interval,
+                )
+            finally:
+                self._end_load(buffers)
+            for object_id in missing:
+                result[object_id] = self._load(object_id, loaded[object_id], interval, buffers[object_id])
+        return {object_id: self._filter(result[object_id], organization_id) for object_id in object_ids}
+
+    @staticmethod
+    def _filter(items: List[FuelChargeRecord], organization_id: Optional[OrganizationId]) -> List[FuelChargeRecord]:
+        if organization_id is None:
+            return items
+        return [item for item in items if item.organization_id == organization_id]
+
+    def _begin_load(self, object_ids: List[ObjectId]) -> Dict[ObjectId, List[Tuple[str, Any]]]:
+        """Начать чтение объектов из хранилища: изменения объектов до конца чтения попадут в буферы"""
+        buffers = {}
+        for object_id in object_ids:
+            buffer = buffers[object_id] = []
+            self._loading.setdefault(object_id, []).append(buffer)
+        return buffers
+
+    def _end_load(self, buffers: Dict[ObjectId, List[Tuple[str, Any]]]) -> None:
+        for object_id, buffer in buffers.items():
+            pending = self._loading[object_id]
+            del pending[next(index for index, item in enumerate(pending) if item is buffer)]
+            if not pending:
+                del self._loading[object_id]
+
+    def _load(
+            self,
+            object_id: ObjectId,
+            items: List[FuelChargeRecord],
+            interval: DateTimeOpenInterval,
+            buffer: List[Tuple[str, Any]],
+    ) -> List[FuelChargeRecord]:
+        """
+        Положить прочитанные из хранилища заправки/сливы объекта в кэш, применить изменения,
+        пришедшие во время чтения, вернуть пересекающие интервал
+        """
+        intervals = self._objects.get(object_id)
+        if intervals is None:
+            intervals = self._objects[object_id] = _ObjectIntervals()
+            self._evict()
+        self._objects.move_to_end(object_id)
+        for item in items:
+            # Если заправка/слив уже изменилась событием - в кэше более новая версия
+            if item.id not in intervals.items:
+                intervals.upsert(item)
+                self._keys[item.id] = object_id
+        for action, value in buffer:
+            if action == "upsert":
+                intervals.upsert(value)
+                self._keys[value.id] = object_id
+            else:
+                intervals.remove(value)
+                self._keys.pop(value, None)
+        if not buffer:
+            intervals.cover(interval.begin, interval.end)
+        return intervals.between(interval.begin, interval.end)
+
+    def upsert(self, item: FuelCharge | FuelDischarge) -> None:
+        """Применить изменение заправки/слива (если объект есть в кэше или читается из хранилища)"""
+        record = FuelChargeRecord.from_charge(item)
+        for buffer in self._loading.get(item.object_id, ()):
+            buffer.append(("upsert", record))
+        intervals = self._objects.get(item.object_id)
+        if intervals is not None:
+            intervals.upsert(record)
+            self._keys[item.id] = item.object_id
+
+    def remove(self, item_id: Hashable) -> None:
+        """Удалить заправку/слив (отмена)"""
+        # Объект отменённой записи неизвестен - отмена попадает во все незавершённые чтения
+        for buffers in self._loading.values():
+            for buffer in buffers:
+                buffer.append(("remove", item_id))
+        object_id = self._keys.pop(item_id, None)
+        if object_id is not None and object_id in self._objects:
+            self._objects[object_id].remove(item_id)
+
+    def _evict(self) -> None:
+        while len(self._objects) > self.capacity:
+            _, intervals = self._objects.popitem(last=False)
+            for item_id in intervals.items:
+                self._keys.pop(item_id, None)
+
+
+class FuelChargeChartCache(FuelChartCache, metaclass=Singleton):
+    """Кэш заправок для графиков"""
+
+
+class FuelDischargeChartCache(FuelChartCache, metaclass=Singleton):
+    """Кэш сливов для графиков"""
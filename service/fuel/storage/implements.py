@@ -1,16 +1,134 @@
-from typing import List, Optional
+import dataclasses
+from typing import AsyncIterator, List, Optional
 import pymongo
-from dpt.domain.fuel import FuelCharge, FuelDischarge, ObjectFuelIntervalSettings, ObjectFuelIntervalSettingsId
+from dpt.domain.fuel import FuelCharge, FuelDischarge, ObjectFuelIntervalSettings, ObjectFuelIntervalSettingsId, \
+    FuelVolumeRollup
 from dpt.domain.fuel.entity import ObjectFuelSettings, ObjectFuelAnalyticEntity, ObjectFuelSettingsId
-from dpt.domain.identity import OrganizationId, DeletionStatus, ObjectId, FuelChargeId, ObjectModelId
+from dpt.domain.identity import OrganizationId, DeletionStatus, ObjectId, FuelChargeId, ObjectModelId, FuelDischargeId
 from dpt.domain.telemetry import AnalyticEntityId
 from dpt.fuel.storage.interface import IObjectFuelSettingsStorage, IObjectFuelAnalyticEntityStorage, IFuelChargeStorage, \
-    IFuelDischargeStorage, IObjectFuelIntervalSettingsStorage
+    IFuelDischargeStorage, IObjectFuelIntervalSettingsStorage, FuelChargeRecord, FuelChargeKey, order_after, \
+    IFuelVolumeRollupStorage
 from dpt.monro import BaseCRUDRepository, FilterBuilder
 from dpt.utils import DateTimeOpenInterval
 
+FUEL_CHARGE_INDEX = [
+    ('object_id', pymongo.ASCENDING),
+    ('begin', pymongo.ASCENDING),
+]
+"""Индекс заправок/сливов: объект (или список объектов через $in) + время начала (интервал, последняя по объекту)"""
 
-class ObjectFuelSettingsStorage(IObjectFuelSettingsStorage, BaseCRUDRepository):
+FUEL_CHARGE_CURSOR_BATCH_SIZE = 500
+"""Документов в одной пачке курсора при чтении заправок/сливов по одной"""
+
+FUEL_CHARGE_RECORD_PROJECTION = {field.name: True for field in dataclasses.fields(FuelChargeRecord)}
+"""Поля документа заправки/слива, нужные для FuelChargeRecord"""
+
+
+def charge_filter(
+        id: Optional[FuelChargeId | List[FuelChargeId]] = None,
+        object_id: Optional[ObjectId | List[ObjectId]] = None,
+        organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+        interval: Optional[DateTimeOpenInterval] = None,
+) -> FilterBuilder:
+    """Фильтр заправок/сливов"""
+    return FilterBuilder(
+        instance_id=id,
+        organization_id=organization_id,
+    ).by_equal(
+        object_id=object_id,
+    ).by_interval(
+        is_interval=False,
+        begin=interval,
+        end=interval,
+    )
+
+
+class MongoSetManyMixin:
+    """Запись пачки объектов одним неупорядоченным bulk_write: ReplaceOne(upsert) по идентификатору"""
+
+    async def set_many(self, items: List) -> None:
+        if items:
+            await self.collection.bulk_write(
+                [
+                    pymongo.ReplaceOne(
+                        FilterBuilder(instance_id=item.id).build(),
+                        self._serde.serialize(item),
+                        upsert=True,
+                    )
+                    for item in items
+                ],
+                ordered=False,
+            )
+
+
+class MongoFuelChargeMixin(MongoSetManyMixin):
+    """Общие запросы хранилищ заправок и сливов (коллекции одной структуры)"""
+
+    async def query_records(
+            self,
+            object_id: Optional[ObjectId | List[ObjectId]] = None,
+            organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+            interval: Optional[DateTimeOpenInterval] = None,
+    ) -> List[FuelChargeRecord]:
+        """Заправки/сливы в виде FuelChargeRecord: из базы читаются только нужные поля"""
+        cursor = self.collection.find(
+            charge_filter(object_id=object_id, organization_id=organization_id, interval=interval).build(),
+            FUEL_CHARGE_RECORD_PROJECTION,
+        )
+        return [self._serde.deserialize(document, FuelChargeRecord) async for document in cursor]
+
+    async def iterate(
+            self,
+            object_id: Optional[ObjectId | List[ObjectId]] = None,
+            organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+            interval: Optional[DateTimeOpenInterval] = None,
+            after: Optional[FuelChargeKey] = None,
+    ) -> AsyncIterator[FuelCharge | FuelDischarge]:
+        """Заправки/сливы курсором по возрастанию begin (в памяти - одна пачка курсора)"""
+        filters = charge_filter(object_id=object_id, organization_id=organization_id, interval=interval).build()
+        if after is not None:
+            filters = {'$and': [filters, {'begin': {'$gte': after[0]}}]}
+        cursor = self.collection.find(
+            filters,
+            sort=[('begin', pymongo.ASCENDING)],
+            batch_size=FUEL_CHARGE_CURSOR_BATCH_SIZE,
+        )
+        items = (self._serde.deserialize(document, self.entity_class) async for document in cursor)
+        try:
+            async for item in order_after(items, after):
+                yield item
+        finally:
+            await cursor.close()
+
+    async def set_returning_previous(self, item: FuelCharge | FuelDischarge) -> Optional[FuelCharge | FuelDischarge]:
+        """Запись и чтение предыдущей версии одним атомарным find_one_and_replace"""
+        previous = await self.collection.find_one_and_replace(
+            FilterBuilder(instance_id=item.id).build(),
+            self._serde.serialize(item),
+            upsert=True,
+            return_document=pymongo.ReturnDocument.BEFORE,
+        )
+        if previous is not None:
+            return self._serde.deserialize(previous, self.entity_class)
+
+    async def delete_returning_previous(
+            self,
+            item_id: FuelChargeId | FuelDischargeId,
+            organization_id: Optional[OrganizationId] = None,
+    ) -> Optional[FuelCharge | FuelDischarge]:
+        """Удаление и чтение удалённой версии одним атомарным find_one_and_delete"""
+        previous = await self.collection.find_one_and_delete(
+            FilterBuilder(instance_id=item_id, organization_id=organization_id).build(),
+        )
+        if previous is not None:
+            return self._serde.deserialize(previous, self.entity_class)
+
+    async def create_indexes(self) -> None:
+        await self.collection.create_index(FUEL_CHARGE_INDEX)
+
+
+class ObjectFuelSettingsStorage(MongoSetManyMixin, IObjectFuelSettingsStorage, BaseCRUDRepository):
     """Хранилище настроек заправок для объектов"""
     entity_class = ObjectFuelSettings
     collection_name = 'object_fuel_settings'
@@ -29,7 +147,7 @@ class ObjectFuelSettingsStorage(IObjectFuelSettingsStorage, BaseCRUDRepository):
         )
 
 
-class ObjectFuelIntervalSettingsStorage(IObjectFuelIntervalSettingsStorage, BaseCRUDRepository):
+class ObjectFuelIntervalSettingsStorage(MongoSetManyMixin, IObjectFuelIntervalSettingsStorage, BaseCRUDRepository):
     """Хранилище настроек заправок для объектов на интервал времени"""
     entity_class = ObjectFuelIntervalSettings
     collection_name = 'object_fuel_interval_settings'
@@ -66,7 +184,7 @@ class ObjectFuelAnalyticEntityStorage(IObjectFuelAnalyticEntityStorage, BaseCRUD
         )
 
 
-class FuelChargeStorage(IFuelChargeStorage, BaseCRUDRepository):
+class FuelChargeStorage(MongoFuelChargeMixin, IFuelChargeStorage, BaseCRUDRepository):
     """Хранилище заправок"""
     entity_class = FuelCharge
     collection_name = 'charge'
@@ -78,18 +196,12 @@ class FuelChargeStorage(IFuelChargeStorage, BaseCRUDRepository):
             organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
             interval: Optional[DateTimeOpenInterval] = None,
     ) -> List[ObjectFuelAnalyticEntity]:
-        return await self.find(
-            FilterBuilder(
-                instance_id=id,
-                organization_id=organization_id,
-            ).by_equal(
-                object_id=object_id,
-            ).by_interval(
-                is_interval=False,
-                begin=interval,
-                end=interval,
-            )
-        )
+        return await self.find(charge_filter(
+            id=id,
+            object_id=object_id,
+            organization_id=organization_id,
+            interval=interval,
+        ))
 
     async def get_last(
             self,
@@ -108,7 +220,7 @@ class FuelChargeStorage(IFuelChargeStorage, BaseCRUDRepository):
             return self._serde.deserialize(last_charge, self.entity_class)
 
 
-class FuelDischargeStorage(IFuelDischargeStorage, BaseCRUDRepository):
+class FuelDischargeStorage(MongoFuelChargeMixin, IFuelDischargeStorage, BaseCRUDRepository):
     """Хранилище сливов топлива"""
     entity_class = FuelDischarge
     collection_name = 'discharge'
@@ -120,18 +232,12 @@ class FuelDischargeStorage(IFuelDischargeStorage, BaseCRUDRepository):
             organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
             interval: Optional[DateTimeOpenInterval] = None,
     ) -> List[ObjectFuelAnalyticEntity]:
-        return await self.find(
-            FilterBuilder(
-                instance_id=id,
-                organization_id=organization_id
-            ).by_equal(
-                object_id=object_id,
-            ).by_interval(
-                is_interval=False,
-                begin=interval,
-                end=interval,
-            )
-        )
+        return await self.find(charge_filter(
+            id=id,
+            object_id=object_id,
+            organization_id=organization_id,
+            interval=interval,
+        ))
 
     async def get_last(
             self,
@@ -148,3 +254,110 @@ class FuelDischargeStorage(IFuelDischargeStorage, BaseCRUDRepository):
         last_charge = await self.collection.find_one(filters, sort=[('begin', pymongo.DESCENDING)])
         if last_charge:
             return self._serde.deserialize(last_charge, self.entity_class)
+
+
+FUEL_VOLUME_ROLLUP_INDEX = [
+    ('organization_id', pymongo.ASCENDING),
+    ('object_id', pymongo.ASCENDING),
+    ('analytic_entity_id', pymongo.ASCENDING),
+    ('day', pymongo.ASCENDING),
+]
+"""Ключ суточного итога"""
+
+
+class FuelVolumeRollupStorage(IFuelVolumeRollupStorage, BaseCRUDRepository):
+    """Хранилище суточных итогов заправок/сливов"""
+    entity_class = FuelVolumeRollup
+    collection_name = 'fuel_volume_rollup'
+
+    @staticmethod
+    def rollup_filter(
+            object_id: Optional[ObjectId | List[ObjectId]] = None,
+            organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+            interval: Optional[DateTimeOpenInterval] = None,
+            analytic_entity_id: Optional[AnalyticEntityId] = None,
+    ) -> dict:
+        filters = FilterBuilder(organization_id=organization_id).by_equal(
+            object_id=object_id,
+            analytic_entity_id=analytic_entity_id,
+        ).build()
+        days = {}
+        if interval is not None and interval.begin is not None:
+            days['$gte'] = FuelVolumeRollup.get_day(interval.begin)
+        if interval is not None and interval.end is not None:
+            days['$lte'] = interval.end
+        return {'$and': [filters, {'day': days}]} if days else filters
+
+    @staticmethod
+    def key_filter(item: FuelVolumeRollup) -> dict:
+        """Фильтр одного суточного итога"""
+        filters = FilterBuilder(organization_id=item.organization_id).by_equal(
+            object_id=item.object_id,
+            analytic_entity_id=item.analytic_entity_id,
+        ).build()
+        return {'$and': [filters, {'day': item.day}]}
+
+    async def increment(self, items: List[FuelVolumeRollup]) -> None:
+        if not items:
+            return
+        await self.collection.bulk_write(
+            [
+                pymongo.UpdateOne(
+                    self.key_filter(item),
+                    {'$inc': {
+                        'charge_volume': item.charge_volume,
+                        'charge_count': item.charge_count,
+                        'discharge_volume': item.discharge_volume,
+                        'discharge_count': item.discharge_count,
+                    }},
+                    upsert=True,
+                )
+                for item in items
+            ],
+            ordered=False,
+        )
+
+    async def set_many(self, items: List[FuelVolumeRollup]) -> None:
+        if not items:
+            return
+        await self.collection.bulk_write(
+            [
+                pymongo.UpdateOne(
+                    self.key_filter(item),
+                    {'$set': {
+                        'charge_volume': item.charge_volume,
+                        'charge_count': item.charge_count,
+                        'discharge_volume': item.discharge_volume,
+                        'discharge_count': item.discharge_count,
+                    }},
+                    upsert=True,
+                )
+                for item in items
+            ],
+            ordered=False,
+        )
+
+    async def query(
+            self,
+            object_id: Optional[ObjectId | List[ObjectId]] = None,
+            organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+            interval: Optional[DateTimeOpenInterval] = None,
+            analytic_entity_id: Optional[AnalyticEntityId] = None,
+    ) -> List[FuelVolumeRollup]:
+        cursor = self.collection.find(
+            self.rollup_filter(object_id, organization_id, interval, analytic_entity_id),
+            {'_id': False},
+            sort=FUEL_VOLUME_ROLLUP_INDEX,
+        )
+        return [self._serde.deserialize(document, FuelVolumeRollup) async for document in cursor]
+
+    async def delete(
+            self,
+            object_id: Optional[ObjectId | List[ObjectId]] = None,
+            organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+            interval: Optional[DateTimeOpenInterval] = None,
+    ) -> None:
+        await self.collection.delete_many(self.rollup_filter(object_id, organization_id, interval))
+
+    async def create_indexes(self) -> None:
+        await self.collection.create_index(FUEL_VOLUME_ROLLUP_INDEX, unique=True)
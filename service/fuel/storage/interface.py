@@ -1,28 +1,103 @@
+import copy
 import datetime
 from abc import ABC, abstractmethod
 from collections import defaultdict
-from typing import Optional, List, Dict, Tuple
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional, List, Dict, Tuple, TypeVar
 
 from dpt.component import interface
-from dpt.domain.fuel import FuelCharge, FuelDischarge, ObjectFuelIntervalSettings
+from dpt.domain.fuel import FuelCharge, FuelDischarge, ObjectFuelIntervalSettings, FuelVolumeRollup
 from dpt.domain.fuel.entity import ObjectFuelSettings, ObjectFuelAnalyticEntity, ObjectFuelSettingsId
-from dpt.domain.identity import OrganizationId, DeletionStatus, ObjectId, FuelChargeId, ObjectModelId
+from dpt.domain.identity import OrganizationId, DeletionStatus, ObjectId, FuelChargeId, ObjectModelId, FuelDischargeId
 from dpt.domain.telemetry import AnalyticEntityId
+from dpt.cqrs.bus import UnitOfWork
 from dpt.cqrs.repository import ICRUDRepository
 from dpt.utils import DateTimeOpenInterval
 
+T = TypeVar("T", FuelCharge, FuelDischarge)
+
+FuelChargeKey = Tuple[datetime.datetime, FuelChargeId | FuelDischargeId]
+"""Ключ порядка заправок/сливов (begin, id) - для постраничного чтения"""
+
+
+@dataclass(slots=True)
+class FuelChargeRecord:
+    """Заправка/слив для графиков: только время и объём, без положения и прочих полей"""
+    id: FuelChargeId | FuelDischargeId
+    organization_id: OrganizationId
+    object_id: ObjectId
+    begin: datetime.datetime
+    end: datetime.datetime
+    volume_begin: float
+    volume_end: float
+
+    @classmethod
+    def from_charge(cls, charge: FuelCharge | FuelDischarge) -> "FuelChargeRecord":
+        return cls(
+            id=charge.id,
+            organization_id=charge.organization_id,
+            object_id=charge.object_id,
+            begin=charge.begin,
+            end=charge.end,
+            volume_begin=charge.volume_begin,
+            volume_end=charge.volume_end,
+        )
+
+
+def group_by_object(object_ids: List[ObjectId], items: list) -> Dict[ObjectId, list]:
+    """Разложить заправки/сливы по объектам (для каждого запрошенного объекта - список, возможно пустой)"""
+    grouped = {object_id: [] for object_id in object_ids}
+    for item in items:
+        grouped[item.object_id].append(item)
+    return grouped
+
+
+async def order_after(items: AsyncIterator[T], after: Optional[FuelChargeKey] = None) -> AsyncIterator[T]:
+    """
+    Заправки/сливы в порядке (begin, id), строго после ключа after.
+    items должны идти по возрастанию begin; в памяти держатся только заправки/сливы с одинаковым begin.
+    """
+    group = []
+    async for item in items:
+        if group and item.begin != group[0].begin:
+            for grouped in sorted(group, key=lambda charge: charge.id):
+                yield grouped
+            group = []
+        if after is None or (item.begin, item.id) > after:
+            group.append(item)
+    for grouped in sorted(group, key=lambda charge: charge.id):
+        yield grouped
+
+
+def filter_loaded(data_by_id: Dict, id=None, organization_id=None) -> list:
+    """Отбор из локального кэша по идентификатору и организации (значение или список), копии"""
+    if id is not None:
+        ids = id if isinstance(id, list) else [id]
+        items = [data_by_id[item_id] for item_id in dict.fromkeys(ids) if item_id in data_by_id]
+    else:
+        items = list(data_by_id.values())
+    if organization_id is not None:
+        organization_ids = set(organization_id) if isinstance(organization_id, list) else {organization_id}
+        items = [item for item in items if item.organization_id in organization_ids]
+    # Копии: изменение результата запроса не должно менять кэш, по которому работает State машина
+    return copy.deepcopy(items)
+
 
 @interface
 class IObjectFuelSettingsStorage(ICRUDRepository[ObjectFuelSettings], ABC):
     """Хранилище настроек заправок для объектов"""
 
+    _data_by_id: Dict[ObjectFuelSettingsId, ObjectFuelSettings]
     _data_by_model_id: Dict[Tuple[OrganizationId, ObjectModelId, AnalyticEntityId], ObjectFuelSettings]
     _data_by_object_id: Dict[Tuple[OrganizationId, ObjectId, AnalyticEntityId], ObjectFuelSettings]
 
     def __init__(self):
         super().__init__()
+        self._data_by_id = {}
         self._data_by_model_id = {}
         self._data_by_object_id = {}
+        self._loaded = False
+        self._tracked = False
 
     @abstractmethod
     async def query(
@@ -33,13 +108,46 @@ class IObjectFuelSettingsStorage(ICRUDRepository[ObjectFuelSettings], ABC):
     ) -> List[ObjectFuelSettings]: ...
 
     async def load(self) -> None:
-        """Загрузить все данные в локальный кэш"""
+        """Загрузить все данные в локальный кэш (индексы подменяются целиком, когда загрузка окончена)"""
         items = await self.query()
+        data_by_id, data_by_model_id, data_by_object_id = {}, {}, {}
         for item in items:
+            data_by_id[item.id] = item
             if item.object_id:
-                self._data_by_object_id[(item.organization_id, item.object_id, item.analytic_entity_id)] = item
+                data_by_object_id[(item.organization_id, item.object_id, item.analytic_entity_id)] = item
             else:
-                self._data_by_model_id[(item.organization_id, item.model_id, item.analytic_entity_id)] = item
+                data_by_model_id[(item.organization_id, item.model_id, item.analytic_entity_id)] = item
+        self._data_by_id, self._data_by_model_id, self._data_by_object_id = \
+            data_by_id, data_by_model_id, data_by_object_id
+        self._loaded = True
+
+    @property
+    def is_loaded(self) -> bool:
+        """Локальный кэш загружен"""
+        return self._loaded
+
+    def track(self) -> None:
+        """Процесс перечитывает локальный кэш по событиям изменения настроек - запросы могут читать из него"""
+        self._tracked = True
+
+    @property
+    def is_tracked(self) -> bool:
+        """Локальный кэш загружен и обновляется по событиям (в процессе без подписки кэш может устареть)"""
+        return self._loaded and self._tracked
+
+    def query_loaded(
+        self,
+        id: Optional[ObjectFuelSettingsId | List[ObjectFuelSettingsId]] = None,
+        organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+    ) -> List[ObjectFuelSettings]:
+        """Не удалённые настройки из локального кэша, фильтры - как у query"""
+        return filter_loaded(self._data_by_id, id, organization_id)
+
+    async def set_many(self, items: List[ObjectFuelSettings]) -> None:
+        """Записать несколько настроек (хранилище может записать их одним запросом)"""
+        async with UnitOfWork() as unit_of_work:
+            for item in items:
+                await self.set(item, unit_of_work)
 
     async def get_settings(
         self,
@@ -61,13 +169,17 @@ class IObjectFuelSettingsStorage(ICRUDRepository[ObjectFuelSettings], ABC):
 class IObjectFuelIntervalSettingsStorage(ICRUDRepository[ObjectFuelIntervalSettings], ABC):
     """Хранилище настроек заправок/сливов на интервал времени"""
 
+    _data_by_id: Dict[ObjectFuelSettingsId, ObjectFuelIntervalSettings]
     _data_by_model_id: Dict[Tuple[OrganizationId, ObjectModelId, AnalyticEntityId], List[ObjectFuelIntervalSettings]]
     _data_by_object_id: Dict[Tuple[OrganizationId, ObjectId, AnalyticEntityId], List[ObjectFuelIntervalSettings]]
 
     def __init__(self):
         super().__init__()
+        self._data_by_id = {}
         self._data_by_model_id = defaultdict(list)
         self._data_by_object_id = defaultdict(list)
+        self._loaded = False
+        self._tracked = False
 
     @abstractmethod
     async def query(
@@ -78,13 +190,46 @@ class IObjectFuelIntervalSettingsStorage(ICRUDRepository[ObjectFuelIntervalSetti
     ) -> List[ObjectFuelIntervalSettings]: ...
 
     async def load(self) -> None:
-        """Загрузить все данные в локальный кэш"""
+        """Загрузить все данные в локальный кэш (индексы подменяются целиком, когда загрузка окончена)"""
         items = await self.query()
+        data_by_id, data_by_model_id, data_by_object_id = {}, defaultdict(list), defaultdict(list)
         for item in items:
+            data_by_id[item.id] = item
             if item.object_id:
-                self._data_by_object_id[(item.organization_id, item.object_id, item.analytic_entity_id)].append(item)
+                data_by_object_id[(item.organization_id, item.object_id, item.analytic_entity_id)].append(item)
             else:
-                self._data_by_model_id[(item.organization_id, item.model_id, item.analytic_entity_id)].append(item)
+                data_by_model_id[(item.organization_id, item.model_id, item.analytic_entity_id)].append(item)
+        self._data_by_id, self._data_by_model_id, self._data_by_object_id = \
+            data_by_id, data_by_model_id, data_by_object_id
+        self._loaded = True
+
+    @property
+    def is_loaded(self) -> bool:
+        """Локальный кэш загружен"""
+        return self._loaded
+
+    def track(self) -> None:
+        """Процесс перечитывает локальный кэш по событиям изменения настроек - запросы могут читать из него"""
+        self._tracked = True
+
+    @property
+    def is_tracked(self) -> bool:
+        """Локальный кэш загружен и обновляется по событиям (в процессе без подписки кэш может устареть)"""
+        return self._loaded and self._tracked
+
+    def query_loaded(
+        self,
+        id: Optional[ObjectFuelSettingsId | List[ObjectFuelSettingsId]] = None,
+        organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+    ) -> List[ObjectFuelIntervalSettings]:
+        """Не удалённые настройки из локального кэша, фильтры - как у query"""
+        return filter_loaded(self._data_by_id, id, organization_id)
+
+    async def set_many(self, items: List[ObjectFuelIntervalSettings]) -> None:
+        """Записать несколько настроек (хранилище может записать их одним запросом)"""
+        async with UnitOfWork() as unit_of_work:
+            for item in items:
+                await self.set(item, unit_of_work)
 
     async def get_settings(
         self,
@@ -137,6 +282,78 @@ class IFuelChargeStorage(ICRUDRepository[FuelCharge], ABC):
         interval: Optional[DateTimeOpenInterval] = None,
     ) -> List[FuelCharge]: ...
 
+    async def query_records(
+        self,
+        object_id: Optional[ObjectId | List[ObjectId]] = None,
+        organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+        interval: Optional[DateTimeOpenInterval] = None,
+    ) -> List[FuelChargeRecord]:
+        """Заправки в виде FuelChargeRecord (хранилище может читать только нужные поля)"""
+        return [
+            FuelChargeRecord.from_charge(charge)
+            for charge in await self.query(object_id=object_id, organization_id=organization_id, interval=interval)
+        ]
+
+    async def iterate(
+        self,
+        object_id: Optional[ObjectId | List[ObjectId]] = None,
+        organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+        interval: Optional[DateTimeOpenInterval] = None,
+        after: Optional[FuelChargeKey] = None,
+    ) -> AsyncIterator[FuelCharge]:
+        """
+        Заправки в порядке (begin, id) по одной, строго после ключа after.
+        Хранилище может читать их курсором, не загружая все в память.
+        """
+        items = await self.query(object_id=object_id, organization_id=organization_id, interval=interval)
+        items.sort(key=lambda charge: (charge.begin, charge.id))
+        for item in items:
+            if after is None or (item.begin, item.id) > after:
+                yield item
+
+    async def query_by_object(
+        self,
+        object_ids: List[ObjectId],
+        organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+        interval: Optional[DateTimeOpenInterval] = None,
+    ) -> Dict[ObjectId, List[FuelCharge]]:
+        """Заправки нескольких объектов одним запросом, по объектам"""
+        return group_by_object(
+            object_ids,
+            await self.query(object_id=object_ids, organization_id=organization_id, interval=interval),
+        )
+
+    async def query_records_by_object(
+        self,
+        object_ids: List[ObjectId],
+        organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+        interval: Optional[DateTimeOpenInterval] = None,
+    ) -> Dict[ObjectId, List[FuelChargeRecord]]:
+        """Заправки нескольких объектов одним запросом в виде FuelChargeRecord, по объектам"""
+        return group_by_object(
+            object_ids,
+            await self.query_records(object_id=object_ids, organization_id=organization_id, interval=interval),
+        )
+
+    async def set_many(self, items: List[FuelCharge]) -> None:
+        """Записать (перезаписать) несколько заправок (хранилище может записать их одним запросом)"""
+        async with UnitOfWork() as unit_of_work:
+            for item in items:
+                await self.set(item, unit_of_work)
+
+    async def set_returning_previous(self, item: FuelCharge) -> Optional[FuelCharge]:
+        """
+        Записать заправку, вернуть сохранённую до записи версию (None - не было).
+        Хранилище может сделать это атомарно - тогда параллельные записи видят разные предыдущие версии
+        """
+        found = await self.query(id=item.id)
+        async with UnitOfWork() as unit_of_work:
+            await self.set(item, unit_of_work)
+        return found[0] if found else None
+
+    async def create_indexes(self) -> None:
+        """Создать индексы хранилища (если нужны)"""
+
     async def get_last(
         self,
         object_id: ObjectId,
@@ -158,9 +375,165 @@ class IFuelDischargeStorage(ICRUDRepository[FuelDischarge], ABC):
         interval: Optional[DateTimeOpenInterval] = None,
     ) -> List[FuelDischarge]: ...
 
+    async def query_records(
+        self,
+        object_id: Optional[ObjectId | List[ObjectId]] = None,
+        organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+        interval: Optional[DateTimeOpenInterval] = None,
+    ) -> List[FuelChargeRecord]:
+        """Сливы в виде FuelChargeRecord (хранилище может читать только нужные поля)"""
+        return [
+            FuelChargeRecord.from_charge(charge)
+            for charge in await self.query(object_id=object_id, organization_id=organization_id, interval=interval)
+        ]
+
+    async def iterate(
+        self,
+        object_id: Optional[ObjectId | List[ObjectId]] = None,
+        organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+        interval: Optional[DateTimeOpenInterval] = None,
+        after: Optional[FuelChargeKey] = None,
+    ) -> AsyncIterator[FuelDischarge]:
+        """
+        Сливы в порядке (begin, id) по одной, строго после ключа after.
+        Хранилище может читать их курсором, не загружая все в память.
+        """
+        items = await self.query(object_id=object_id, organization_id=organization_id, interval=interval)
+        items.sort(key=lambda charge: (charge.begin, charge.id))
+        for item in items:
+            if after is None or (item.begin, item.id) > after:
+                yield item
+
+    async def query_by_object(
+        self,
+        object_ids: List[ObjectId],
+        organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+        interval: Optional[DateTimeOpenInterval] = None,
+    ) -> Dict[ObjectId, List[FuelDischarge]]:
+        """Сливы нескольких объектов одним запросом, по объектам"""
+        return group_by_object(
+            object_ids,
+            await self.query(object_id=object_ids, organization_id=organization_id, interval=interval),
+        )
+
+    async def query_records_by_object(
+        self,
+        object_ids: List[ObjectId],
+        organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+        interval: Optional[DateTimeOpenInterval] = None,
+    ) -> Dict[ObjectId, List[FuelChargeRecord]]:
+        """Сливы нескольких объектов одним запросом в виде FuelChargeRecord, по объектам"""
+        return group_by_object(
+            object_ids,
+            await self.query_records(object_id=object_ids, organization_id=organization_id, interval=interval),
+        )
+
+    async def set_many(self, items: List[FuelDischarge]) -> None:
+        """Записать (перезаписать) несколько сливов (хранилище может записать их одним запросом)"""
+        async with UnitOfWork() as unit_of_work:
+            for item in items:
+                await self.set(item, unit_of_work)
+
+    async def set_returning_previous(self, item: FuelDischarge) -> Optional[FuelDischarge]:
+        """
+        Записать слив, вернуть сохранённую до записи версию (None - не было).
+        Хранилище может сделать это атомарно - тогда параллельные записи видят разные предыдущие версии
+        """
+        found = await self.query(id=item.id)
+        async with UnitOfWork() as unit_of_work:
+            await self.set(item, unit_of_work)
+        return found[0] if found else None
+
+    async def delete_returning_previous(
+        self,
+        item_id: FuelDischargeId,
+        organization_id: Optional[OrganizationId] = None,
+    ) -> Optional[FuelDischarge]:
+        """
+        Удалить слив, вернуть удалённую версию (None - не было).
+        Хранилище может сделать это атомарно - тогда из параллельных удалений версию получит только одно
+        """
+        found = await self.query(id=item_id, organization_id=organization_id)
+        if found:
+            async with UnitOfWork() as unit_of_work:
+                await self.delete(item_id, unit_of_work)
+        return found[0] if found else None
+
+    async def create_indexes(self) -> None:
+        """Создать индексы хранилища (если нужны)"""
+
     async def get_last(
         self,
         object_id: ObjectId,
         analytic_entity_id: AnalyticEntityId,
         organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
     ) -> Optional[FuelDischarge]: ...
+
+
+def make_volume_rollup(charge: FuelCharge | FuelDischarge, sign: int = 1) -> FuelVolumeRollup:
+    """Вклад заправки/слива в суточный итог (sign=-1 - вычесть)"""
+    rollup = FuelVolumeRollup(
+        organization_id=charge.organization_id,
+        object_id=charge.object_id,
+        analytic_entity_id=charge.analytic_entity_id,
+        day=FuelVolumeRollup.get_day(charge.begin),
+    )
+    if isinstance(charge, FuelDischarge):
+        rollup.discharge_volume, rollup.discharge_count = sign * charge.volume, sign
+    else:
+        rollup.charge_volume, rollup.charge_count = sign * charge.volume, sign
+    return rollup
+
+
+@interface
+class IFuelVolumeRollupStorage(ICRUDRepository[FuelVolumeRollup], ABC):
+    """Хранилище суточных итогов заправок/сливов (по организации, объекту, баку и суткам)"""
+
+    @abstractmethod
+    async def increment(self, items: List[FuelVolumeRollup]) -> None:
+        """Прибавить значения к суточным итогам (итога ещё нет - создаётся)"""
+
+    @abstractmethod
+    async def set_many(self, items: List[FuelVolumeRollup]) -> None:
+        """Записать значения суточных итогов (заменить; итога ещё нет - создаётся)"""
+
+    @abstractmethod
+    async def query(
+        self,
+        object_id: Optional[ObjectId | List[ObjectId]] = None,
+        organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+        interval: Optional[DateTimeOpenInterval] = None,
+        analytic_entity_id: Optional[AnalyticEntityId] = None,
+    ) -> List[FuelVolumeRollup]:
+        """Суточные итоги, начало суток которых попадает в интервал"""
+
+    @abstractmethod
+    async def delete(
+        self,
+        object_id: Optional[ObjectId | List[ObjectId]] = None,
+        organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+        interval: Optional[DateTimeOpenInterval] = None,
+    ) -> None:
+        """Удалить суточные итоги"""
+
+    async def update(
+        self,
+        previous: Optional[FuelCharge | FuelDischarge],
+        current: Optional[FuelCharge | FuelDischarge],
+    ) -> None:
+        """
+        Учесть изменение заправки/слива: previous - сохранённая ранее версия, current - новая (None - удалена).
+        В итогах только окончившиеся заправки/сливы; повторное окончание не учитывается дважды.
+        """
+        items = []
+        if previous is not None and previous.is_complete:
+            items.append(make_volume_rollup(previous, -1))
+        if current is not None and current.is_complete:
+            items.append(make_volume_rollup(current))
+        if len(items) == 2 and previous.begin == current.begin and previous.volume == current.volume:
+            return
+        if items:
+            await self.increment(items)
+
+    async def create_indexes(self) -> None:
+        """Создать индексы хранилища (если нужны)"""
@@ -0,0 +1,74 @@
+import dataclasses
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from dpt.component.utils import Singleton
+from dpt.domain.fuel import FuelCharge, FuelDischarge
+from dpt.domain.identity import ObjectId, OrganizationId
+from dpt.domain.telemetry import AnalyticEntityId
+from dpt.fuel.metrics import FuelMetrics
+
+__all__ = (
+    "FuelLastIndex",
+    "FuelChargeLastIndex",
+    "FuelDischargeLastIndex",
+)
+
+
+class FuelLastIndex:
+    """
+    Последняя заправка/слив по баку (объект + бак), записанная в этом процессе.
+    Обновляется только обработчиками команд после записи в хранилище (не чтениями);
+    запросы последней заправки/слива сначала смотрят сюда и идут в хранилище, только если бака здесь нет.
+    Хранятся и отдаются копии: State машина меняет свою текущую заправку/слив до записи в хранилище.
+    Попадания - счётчики FuelMetrics {name}_hit / {name}_miss.
+    """
+    name = "last_index"
+
+    def __init__(self):
+        self._items: Dict[Tuple[ObjectId, AnalyticEntityId], FuelCharge | FuelDischarge] = {}
+        self._keys: Dict[Hashable, Tuple[ObjectId, AnalyticEntityId]] = {}
+        """Идентификатор заправки/слива -> бак"""
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(
+            self,
+            object_id: ObjectId,
+            analytic_entity_id: AnalyticEntityId,
+            organization_id: Optional[OrganizationId | List[OrganizationId]] = None,
+    ) -> Optional[FuelCharge | FuelDischarge]:
+        """Последняя заправка/слив бака (None - бака нет, нужно читать хранилище)"""
+        item = self._items.get((object_id, analytic_entity_id))
+        if item is not None and organization_id is not None:
+            organization_ids = organization_id if isinstance(organization_id, list) else [organization_id]
+            if item.organization_id not in organization_ids:
+                item = None
+        FuelMetrics().incr(f"{self.name}_hit" if item is not None else f"{self.name}_miss")
+        return dataclasses.replace(item) if item is not None else None
+
+    def set(self, item: FuelCharge | FuelDischarge) -> None:
+        """Записана заправка/слив: запомнить копию, если она не раньше известной"""
+        key = (item.object_id, item.analytic_entity_id)
+        last = self._items.get(key)
+        if last is None or last.id == item.id or last.begin <= item.begin:
+            if last is not None:
+                self._keys.pop(last.id, None)
+            self._items[key] = dataclasses.replace(item)
+            self._keys[item.id] = key
+
+    def remove(self, item_id: Hashable) -> None:
+        """Заправка/слив удалена: если она была последней, бак забывается (предыдущая - в хранилище)"""
+        key = self._keys.pop(item_id, None)
+        if key is not None:
+            del self._items[key]
+
+
+class FuelChargeLastIndex(FuelLastIndex, metaclass=Singleton):
+    """Последние заправки по бакам"""
+    name = "last_charge_index"
+
+
+class FuelDischargeLastIndex(FuelLastIndex, metaclass=Singleton):
+    """Последние сливы по бакам"""
+    name = "last_discharge_index"
@@ -0,0 +1,161 @@
+"""
+Дифференциальный тест пакетного определения заправок/сливов:
+ChargeBatchEngine/DischargeBatchEngine должны давать тот же результат, что и ChargeFSM/DischargeFSM,
+запущенные на том же ряду с чистого состояния.
+"""
+import datetime
+import random
+import uuid
+from dataclasses import replace
+from typing import List, Optional, Tuple
+
+import pytest
+
+from dpt.domain.fuel import FuelChargeSettings, FuelDischargeSettings, FuelDischargeConfirmation, FuelCharge, \
+    FuelDischarge
+from dpt.domain.identity import OrganizationId, ObjectId
+from dpt.domain.telemetry import AnalyticEntity
+from dpt.geojson import Point
+from dpt.fuel.logic.batch import FuelSeries, PreparedFuelSeries, ChargeBatchEngine, DischargeBatchEngine
+from dpt.fuel.logic.fsm import ChargeFSM, DischargeFSM, FuelIntentAction
+from dpt.fuel.logic.state import FuelStateData, FuelDataEvent, ChargeState, DischargeState
+
+ORGANIZATION_ID = OrganizationId(uuid.UUID("5c3f0a52-7f3e-4d8e-9a51-0d6f1b8c2e11"))
+OBJECT_ID = ObjectId(uuid.UUID("a0c4d1e2-3b5f-4c6d-8e7f-9a0b1c2d3e4f"))
+ANALYTIC_ENTITY = AnalyticEntity(id="fuel1", name="Бак", msg_attr="fuel1")
+
+SEEDS = range(200)
+
+
+def make_series(rng: random.Random, size: int, tzinfo: Optional[datetime.tzinfo]) -> List[FuelStateData]:
+    """Случайный ряд бака: заправки, сливы, шум, движение и сообщения из прошлого"""
+    time = datetime.datetime(2024, 1, 1, tzinfo=tzinfo)
+    fuel_volume = 300.0
+    speed = 0.0
+    states = []
+    for k in range(size):
+        time += datetime.timedelta(seconds=rng.choice([0, 1, 1, 2, 5, 10, 40]), microseconds=rng.choice([0, 0, 333]))
+        if rng.random() < 0.05:
+            # Сообщение из прошлого
+            time -= datetime.timedelta(seconds=rng.randint(1, 20))
+        mode = rng.random()
+        if mode < 0.05:
+            fuel_volume += rng.uniform(0, 40)
+        elif mode < 0.1:
+            fuel_volume -= rng.uniform(0, 40)
+        elif mode >= 0.5:
+            fuel_volume += rng.choice([-1, 0, 0, 1]) * rng.random()
+        if rng.random() < 0.1:
+            speed = rng.choice([0.0, 0.0, 10.0, 30.0])
+        states.append(FuelStateData(
+            time=time, speed=speed, fuel_volume=round(fuel_volume, 2), location=Point((k, k))))
+    return states
+
+
+def make_settings(
+        rng: random.Random,
+        confirmation: FuelDischargeConfirmation,
+) -> Tuple[FuelChargeSettings, FuelDischargeSettings]:
+    """Случайные настройки заправок и сливов"""
+    charge_settings = FuelChargeSettings(
+        min_volume=rng.choice([10.0, 50.0, 150.0]),
+        min_duration_in=datetime.timedelta(seconds=rng.choice([0, 5, 30])),
+        min_duration_out=datetime.timedelta(seconds=rng.choice([0, 5, 20])),
+        min_duration_sudden=datetime.timedelta(seconds=rng.choice([0, 10, 30])),
+        ignore_on_speed=rng.random() < 0.5,
+        ignore_duration_begin_move=datetime.timedelta(seconds=rng.choice([0, 0, 15])),
+    )
+    discharge_settings = FuelDischargeSettings(
+        min_volume=rng.choice([5.0, 30.0, 100.0]),
+        max_fuel_speed=rng.choice([0.1, 0.3, 2.0]),
+        min_stoppage_duration=datetime.timedelta(seconds=rng.choice([0, 10, 30])),
+        ignore_on_speed=rng.random() < 0.5,
+        ignore_duration_begin_move=datetime.timedelta(seconds=rng.choice([0, 0, 15])),
+        confirmation=confirmation,
+    )
+    return charge_settings, discharge_settings
+
+
+def make_event(state_data: FuelStateData) -> FuelDataEvent:
+    return FuelDataEvent(
+        organization_id=ORGANIZATION_ID,
+        object_id=OBJECT_ID,
+        model_id=None,
+        fuel_entity=ANALYTIC_ENTITY,
+        state_data=replace(state_data),
+    )
+
+
+def run_fsm(
+        states: List[FuelStateData],
+        charge_settings: FuelChargeSettings,
+        discharge_settings: FuelDischargeSettings,
+) -> Tuple[List[FuelCharge], List[FuelDischarge]]:
+    """Прогнать ряд через State машины и собрать итог их эффектов (отменённые сливы удаляются)"""
+    charge_fsm = ChargeFSM(
+        ORGANIZATION_ID, OBJECT_ID, ANALYTIC_ENTITY, charge_settings,
+        ChargeState.from_event(make_event(states[0])), deterministic_id=True,
+    )
+    discharge_fsm = DischargeFSM(
+        ORGANIZATION_ID, OBJECT_ID, ANALYTIC_ENTITY, discharge_settings,
+        DischargeState.from_event(make_event(states[0])), deterministic_id=True,
+    )
+    charges, discharges = {}, {}
+    for state_data in states:
+        for intent in charge_fsm.transition(make_event(state_data)) or []:
+            charges[intent.object.id] = replace(intent.object)
+        for intent in discharge_fsm.transition(make_event(state_data)) or []:
+            if intent.action == FuelIntentAction.CANCEL:
+                discharges.pop(intent.object.id, None)
+            else:
+                discharges[intent.object.id] = replace(intent.object)
+    return (
+        sorted(charges.values(), key=lambda item: item.begin),
+        sorted(discharges.values(), key=lambda item: item.begin),
+    )
+
+
+def run_batch(
+        states: List[FuelStateData],
+        charge_settings: FuelChargeSettings,
+        discharge_settings: FuelDischargeSettings,
+) -> Tuple[List[FuelCharge], List[FuelDischarge]]:
+    """Прогнать ряд через пакетные движки (общий подготовленный ряд)"""
+    prepared = PreparedFuelSeries.prepare(FuelSeries.from_states(states))
+    return (
+        ChargeBatchEngine(ORGANIZATION_ID, OBJECT_ID, ANALYTIC_ENTITY.id, charge_settings).detect(prepared),
+        DischargeBatchEngine(ORGANIZATION_ID, OBJECT_ID, ANALYTIC_ENTITY.id, discharge_settings).detect(prepared),
+    )
+
+
+@pytest.mark.parametrize("tzinfo", [None, datetime.timezone.utc, datetime.timezone(datetime.timedelta(hours=3))])
+@pytest.mark.parametrize("confirmation", list(FuelDischargeConfirmation))
+@pytest.mark.parametrize("seed", SEEDS)
+def test_batch_matches_fsm(seed: int, confirmation: FuelDischargeConfirmation, tzinfo: Optional[datetime.tzinfo]):
+    rng = random.Random(seed)
+    states = make_series(rng, rng.randint(1, 400), tzinfo)
+    charge_settings, discharge_settings = make_settings(rng, confirmation)
+
+    expected_charges, expected_discharges = run_fsm(states, charge_settings, discharge_settings)
+    charges, discharges = run_batch(states, charge_settings, discharge_settings)
+
+    assert charges == expected_charges
+    assert discharges == expected_discharges
+    for item in charges + discharges:
+        assert item.begin.tzinfo == tzinfo
+
+
+def test_batch_skips_samples_from_past():
+    """Сообщения из прошлого отбрасываются так же, как в State машинах"""
+    begin = datetime.datetime(2024, 1, 1)
+    states = [
+        FuelStateData(time=begin, speed=0.0, fuel_volume=100.0),
+        FuelStateData(time=begin + datetime.timedelta(seconds=10), speed=0.0, fuel_volume=100.0),
+        FuelStateData(time=begin + datetime.timedelta(seconds=5), speed=0.0, fuel_volume=500.0),
+        FuelStateData(time=begin + datetime.timedelta(seconds=20), speed=0.0, fuel_volume=100.0),
+    ]
+    prepared = PreparedFuelSeries.prepare(FuelSeries.from_states(states))
+    assert prepared.index.tolist() == [0, 1, 3]
+    charge_settings, discharge_settings = make_settings(random.Random(0), FuelDischargeConfirmation.MEDIAN)
+    assert run_batch(states, charge_settings, discharge_settings) == run_fsm(
+        states, charge_settings, discharge_settings)
@@ -0,0 +1,179 @@
+"""
+Массовое сохранение настроек: пересечения интервалов внутри пачки и с сохранёнными, перезапись той же пачкой,
+чужая организация, время создания - как при сохранении по одной, одно событие на пачку.
+"""
+import asyncio
+import datetime
+import uuid
+from typing import List
+
+import pytest
+
+from dpt.component import _u
+from dpt.cqrs import IEventBus
+from dpt.cqrs.exception import ValidationError
+from dpt.domain.fuel import FuelChargeSettings, FuelDischargeSettings, ObjectFuelIntervalSettings, \
+    SetObjectFuelIntervalSettingsBulkCommand, ObjectFuelIntervalSettingsBulkModifiedEvent
+from dpt.domain.fuel.entity import ObjectFuelAnalyticEntity
+from dpt.domain.telemetry import AnalyticEntity
+from dpt.fuel.analytic_entity import FuelAnalyticEntitiesStorage
+from dpt.fuel.service.command.settings import SetObjectFuelIntervalSettingsBulkCommandHandler
+from dpt.fuel.storage.interface import IObjectFuelIntervalSettingsStorage, IObjectFuelAnalyticEntityStorage
+from dpt.utils import DateTimeInterval
+
+ORGANIZATION_ID = uuid.UUID("5c3f0a52-7f3e-4d8e-9a51-0d6f1b8c2e11")
+OTHER_ORGANIZATION_ID = uuid.UUID("0b1d6e2a-9c4f-4a37-8e55-3f2a7c9d1e60")
+OBJECT_ID = uuid.UUID("a0c4d1e2-3b5f-4c6d-8e7f-9a0b1c2d3e4f")
+MODEL_ID = uuid.UUID("7e9b2c41-6d3a-4f58-b1c0-2a8e5d7f9c36")
+BEGIN = datetime.datetime(2024, 1, 1)
+CREATED_AT = datetime.datetime(2023, 6, 1, tzinfo=datetime.timezone.utc)
+
+
+def matches(item, filters) -> bool:
+    """Отбор как в FilterBuilder: равенство (список - любое из), is_null"""
+    for kind, conditions in filters:
+        for name, value in conditions.items():
+            actual = getattr(item, "id" if name == "instance_id" else name)
+            if kind == "null":
+                if value and actual is not None:
+                    return False
+            elif value is not None and (actual not in value if isinstance(value, list) else actual != value):
+                return False
+    return True
+
+
+class MemorySettingsStorage:
+
+    def __init__(self, items):
+        self.items = {item.id: item for item in items}
+        self.writes = 0
+
+    async def find(self, filter_builder) -> List[ObjectFuelIntervalSettings]:
+        return [item for item in self.items.values() if matches(item, filter_builder.filters)]
+
+    async def set_many(self, items) -> None:
+        self.writes += 1
+        self.items.update({item.id: item for item in items})
+
+
+class MemoryObjectStorage:
+
+    async def query(self, id=None, organization_id=None):
+        return [
+            ObjectFuelAnalyticEntity(organization_id=ORGANIZATION_ID, id=OBJECT_ID, analytic_entity_ids=["fuel1"]),
+        ]
+
+
+class MemoryEventBus:
+
+    def __init__(self):
+        self.events = []
+
+    async def publish(self, event):
+        self.events.append(event)
+
+
+def make_settings(begin: float, end: float, object_id=OBJECT_ID, organization_id=ORGANIZATION_ID, settings_id=None):
+    return ObjectFuelIntervalSettings(
+        id=settings_id or uuid.uuid4(),
+        organization_id=organization_id,
+        model_id=MODEL_ID,
+        analytic_entity_id="fuel1",
+        charge=FuelChargeSettings(),
+        discharge=FuelDischargeSettings(),
+        object_id=object_id,
+        interval=DateTimeInterval(
+            begin=BEGIN + datetime.timedelta(days=begin),
+            end=BEGIN + datetime.timedelta(days=end),
+        ),
+    )
+
+
+@pytest.fixture
+def stored():
+    """Сохранённые настройки объекта на [10, 20] и модели на [0, 5]"""
+    items = [
+        make_settings(10, 20),
+        make_settings(0, 5, object_id=None),
+    ]
+    items[0].created_at = CREATED_AT
+    storage, bus = MemorySettingsStorage(items), MemoryEventBus()
+    FuelAnalyticEntitiesStorage.create([AnalyticEntity(id="fuel1", name="Бак", msg_attr="fuel1")])
+    _u.update({
+        IObjectFuelIntervalSettingsStorage: storage,
+        IObjectFuelAnalyticEntityStorage: MemoryObjectStorage(),
+        IEventBus: bus,
+    })
+    yield items, storage, bus
+    for key in (IObjectFuelIntervalSettingsStorage, IObjectFuelAnalyticEntityStorage, IEventBus):
+        _u.pop(key, None)
+
+
+def save(instances):
+    command = SetObjectFuelIntervalSettingsBulkCommand(organization_id=ORGANIZATION_ID, objects=instances)
+    return asyncio.run(SetObjectFuelIntervalSettingsBulkCommandHandler().handle(command))
+
+
+@pytest.mark.parametrize("begin, end, conflict", [
+    (0, 10, False),
+    (20, 30, False),
+    (0, 10.5, True),
+    (19, 30, True),
+    (12, 15, True),
+    (5, 25, True),
+])
+def test_bulk_overlap_with_stored(stored, begin: float, end: float, conflict: bool):
+    _, storage, bus = stored
+    instances = [make_settings(begin, end)]
+    if conflict:
+        with pytest.raises(ValidationError, match="№1"):
+            save(instances)
+        assert storage.writes == 0
+        assert not bus.events
+    else:
+        save(instances)
+        assert storage.writes == 1
+        assert len(bus.events) == 1
+
+
+def test_bulk_overlap_within_batch(stored):
+    _, storage, _ = stored
+    with pytest.raises(ValidationError, match="№3"):
+        save([make_settings(0, 2), make_settings(2, 4), make_settings(3, 6)])
+    # Модель: пересечение с сохранёнными настройками модели
+    with pytest.raises(ValidationError, match="№1"):
+        save([make_settings(4, 8, object_id=None)])
+    assert storage.writes == 0
+
+
+def test_bulk_rewrites_stored_in_same_batch(stored):
+    """Сохранённые настройки, перезаписанные этой же пачкой, пересечением не считаются"""
+    items, storage, bus = stored
+    moved = make_settings(25, 30, settings_id=items[0].id)
+    added = make_settings(12, 18)
+    assert save([moved, added]) == [moved, added]
+    assert storage.items[items[0].id].interval.begin == BEGIN + datetime.timedelta(days=25)
+    event, = bus.events
+    assert isinstance(event, ObjectFuelIntervalSettingsBulkModifiedEvent)
+    assert event.objects == [moved, added]
+
+
+def test_bulk_created_at(stored):
+    items, storage, _ = stored
+    before = datetime.datetime.now(datetime.timezone.utc)
+    moved = make_settings(25, 30, settings_id=items[0].id)
+    added = make_settings(0, 1)
+    save([moved, added])
+    assert storage.items[moved.id].created_at == CREATED_AT
+    assert storage.items[added.id].created_at >= before
+
+
+def test_bulk_foreign_organization(stored):
+    _, storage, _ = stored
+    foreign = make_settings(40, 50, organization_id=OTHER_ORGANIZATION_ID)
+    storage.items[foreign.id] = foreign
+    with pytest.raises(ValidationError, match="другой организации"):
+        save([make_settings(40, 50, settings_id=foreign.id)])
+    with pytest.raises(ValidationError, match="другой организации"):
+        save([make_settings(60, 70, organization_id=OTHER_ORGANIZATION_ID)])
+    assert storage.writes == 0
@@ -0,0 +1,188 @@
+"""
+Кэш заправок/сливов для графиков: запросы внутри загруженных интервалов не читают хранилище,
+изменения, пришедшие во время чтения из хранилища, не теряются и не перетираются прочитанным.
+"""
+import asyncio
+import datetime
+import uuid
+from typing import List, Optional
+
+from dpt.domain.fuel import FuelCharge
+from dpt.fuel.storage.cache import FuelChartCache
+from dpt.fuel.storage.interface import FuelChargeRecord
+from dpt.utils import DateTimeOpenInterval
+
+ORGANIZATION_ID = uuid.UUID("5c3f0a52-7f3e-4d8e-9a51-0d6f1b8c2e11")
+OTHER_ORGANIZATION_ID = uuid.UUID("0b1d6e2a-9c4f-4a37-8e55-3f2a7c9d1e60")
+OBJECT_ID = uuid.UUID("a0c4d1e2-3b5f-4c6d-8e7f-9a0b1c2d3e4f")
+BEGIN = datetime.datetime(2024, 1, 1)
+
+
+def hours(value: float) -> datetime.datetime:
+    return BEGIN + datetime.timedelta(hours=value)
+
+
+def interval(begin: float, end: float) -> DateTimeOpenInterval:
+    return DateTimeOpenInterval(begin=hours(begin), end=hours(end))
+
+
+def make_charge(begin: float, end: float, organization_id=ORGANIZATION_ID, charge_id=None) -> FuelCharge:
+    return FuelCharge(
+        id=charge_id or uuid.uuid4(),
+        organization_id=organization_id,
+        object_id=OBJECT_ID,
+        analytic_entity_id="fuel1",
+        location=None,
+        begin=hours(begin),
+        end=hours(end),
+        is_complete=True,
+        volume=10.0,
+        volume_begin=100.0,
+        volume_end=110.0,
+    )
+
+
+class FakeStorage:
+    """Хранилище в памяти; чтение можно задержать до release, чтобы события пришли во время чтения"""
+
+    def __init__(self, charges: List[FuelCharge]):
+        self.records = {charge.id: FuelChargeRecord.from_charge(charge) for charge in charges}
+        self.queries = 0
+        self.started = asyncio.Event()
+        self.release: Optional[asyncio.Event] = None
+
+    async def query_records(self, object_id, organization_id, interval):
+        self.queries += 1
+        # Снимок - на момент чтения, как у базы
+        records = [
+            record for record in self.records.values()
+            if record.object_id == object_id and record.begin <= interval.end and record.end >= interval.begin
+            and (organization_id is None or record.organization_id == organization_id)
+        ]
+        self.started.set()
+        if self.release is not None:
+            await self.release.wait()
+        return sorted(records, key=lambda record: record.begin)
+
+
+def ids(records: List[FuelChargeRecord]) -> List[uuid.UUID]:
+    return [record.id for record in records]
+
+
+def test_chart_cache_covered_interval_served_from_cache():
+    charges = [make_charge(k, k + 0.5) for k in range(0, 48, 3)]
+    storage = FakeStorage(charges)
+    cache = FuelChartCache()
+
+    async def run():
+        expected = ids(await storage.query_records(OBJECT_ID, None, interval(10, 30)))
+        storage.queries = 0
+        assert ids(await cache.query(storage, OBJECT_ID, ORGANIZATION_ID, interval(10, 30))) == expected
+        assert ids(await cache.query(storage, OBJECT_ID, ORGANIZATION_ID, interval(12, 20))) == \
+            [charge.id for charge in charges if charge.begin <= hours(20) and charge.end >= hours(12)]
+        assert storage.queries == 1
+        # Интервал за пределами загруженного - дочитывается, после чего объединение покрыто
+        await cache.query(storage, OBJECT_ID, ORGANIZATION_ID, interval(25, 40))
+        await cache.query(storage, OBJECT_ID, ORGANIZATION_ID, interval(10, 40))
+        assert storage.queries == 2
+
+    asyncio.run(run())
+
+
+def test_chart_cache_intersecting_from_before_interval():
+    """Длинная заправка, начавшаяся до интервала, пересекает его"""
+    long_charge = make_charge(0, 20)
+    storage = FakeStorage([long_charge, make_charge(1, 2)])
+    cache = FuelChartCache()
+
+    async def run():
+        await cache.query(storage, OBJECT_ID, ORGANIZATION_ID, interval(0, 30))
+        assert ids(await cache.query(storage, OBJECT_ID, ORGANIZATION_ID, interval(10, 12))) == [long_charge.id]
+        assert storage.queries == 1
+
+    asyncio.run(run())
+
+
+def test_chart_cache_filters_organization():
+    own, foreign = make_charge(1, 2), make_charge(3, 4, organization_id=OTHER_ORGANIZATION_ID)
+    storage = FakeStorage([own, foreign])
+    cache = FuelChartCache()
+
+    async def run():
+        assert ids(await cache.query(storage, OBJECT_ID, ORGANIZATION_ID, interval(0, 10))) == [own.id]
+        assert ids(await cache.query(storage, OBJECT_ID, OTHER_ORGANIZATION_ID, interval(0, 10))) == [foreign.id]
+        assert storage.queries == 1
+
+    asyncio.run(run())
+
+
+def test_chart_cache_events_applied_to_loaded_object():
+    charge = make_charge(1, 2)
+    storage = FakeStorage([charge])
+    cache = FuelChartCache()
+
+    async def run():
+        await cache.query(storage, OBJECT_ID, ORGANIZATION_ID, interval(0, 10))
+        moved = make_charge(3, 5, charge_id=charge.id)
+        added = make_charge(4, 6)
+        cache.upsert(moved)
+        cache.upsert(added)
+        records = await cache.query(storage, OBJECT_ID, ORGANIZATION_ID, interval(0, 10))
+        assert ids(records) == [charge.id, added.id]
+        assert records[0].begin == hours(3)
+        cache.remove(charge.id)
+        assert ids(await cache.query(storage, OBJECT_ID, ORGANIZATION_ID, interval(0, 10))) == [added.id]
+        assert storage.queries == 1
+
+    asyncio.run(run())
+
+
+def test_chart_cache_events_during_load_not_lost():
+    """Событие пришло, пока читается снимок хранилища без него: кэш не теряет событие и перечитает интервал"""
+    stale = make_charge(1, 2)
+    cancelled = make_charge(6, 7)
+    storage = FakeStorage([stale, cancelled])
+    storage.release = asyncio.Event()
+    cache = FuelChartCache()
+
+    async def run():
+        load = asyncio.create_task(cache.query(storage, OBJECT_ID, ORGANIZATION_ID, interval(0, 10)))
+        await storage.started.wait()
+
+        updated = make_charge(1, 3, charge_id=stale.id)
+        added = make_charge(4, 5)
+        for event in (updated, added):
+            cache.upsert(event)
+            storage.records[event.id] = FuelChargeRecord.from_charge(event)
+        cache.remove(cancelled.id)
+        del storage.records[cancelled.id]
+
+        storage.release.set()
+        records = await load
+        # Прочитанная до события версия не перетирает изменение, отменённая не возвращается
+        assert ids(records) == [stale.id, added.id]
+        assert records[0].end == hours(3)
+
+        # Интервал не считается загруженным: следующий запрос перечитывает хранилище
+        storage.release = None
+        assert ids(await cache.query(storage, OBJECT_ID, ORGANIZATION_ID, interval(0, 10))) == [stale.id, added.id]
+        assert storage.queries == 2
+        await cache.query(storage, OBJECT_ID, ORGANIZATION_ID, interval(0, 10))
+        assert storage.queries == 2
+        assert not cache._loading
+
+    asyncio.run(run())
+
+
+def test_chart_cache_evicts_least_recent_object():
+    storage = FakeStorage([make_charge(1, 2)])
+    cache = FuelChartCache(capacity=1)
+    other_object_id = uuid.uuid4()
+
+    async def run():
+        await cache.query(storage, OBJECT_ID, ORGANIZATION_ID, interval(0, 10))
+        await cache.query(storage, other_object_id, ORGANIZATION_ID, interval(0, 10))
+        await cache.query(storage, OBJECT_ID, ORGANIZATION_ID, interval(0, 10))
+        assert storage.queries == 3
+
+    asyncio.run(run())
@@ -0,0 +1,52 @@
+"""Колоночный формат телеметрии: время в UTC при любом сочетании времени с поясом и без"""
+import datetime
+import uuid
+
+import pytest
+
+from dpt.fuel.logic.columnar import ColumnarTelemetry, convert_telemetry_to_columnar
+from dpt.fuel.logic.timeutils import to_utc
+from dpt.serde.encoder.json import JsonEncoder
+
+OBJECT_ID = uuid.UUID("a0c4d1e2-3b5f-4c6d-8e7f-9a0b1c2d3e4f")
+ORGANIZATION_ID = uuid.UUID("5c3f0a52-7f3e-4d8e-9a51-0d6f1b8c2e11")
+MSK = datetime.timezone(datetime.timedelta(hours=3))
+
+
+def convert(tmp_path, times):
+    messages = [
+        {"object_id": OBJECT_ID, "enterprise_id": ORGANIZATION_ID, "time": time, "fuel1": float(k), "speed": 0.0}
+        for k, time in enumerate(times)
+    ]
+    encoder = JsonEncoder()
+    file_name = tmp_path / "telemetry.ndjson"
+    with open(file_name, "w") as telemetry_file:
+        for message in messages:
+            telemetry_file.write(encoder.dumps(message) + "\n")
+    convert_telemetry_to_columnar([str(file_name)], str(tmp_path / "columnar"), ["fuel1"])
+    return ColumnarTelemetry(str(tmp_path / "columnar"))
+
+
+@pytest.mark.parametrize("first_aware", [False, True])
+def test_columnar_mixed_timezones_normalised_to_utc(tmp_path, first_aware: bool):
+    begin = datetime.datetime(2024, 1, 1, 12)
+    times = [
+        begin.replace(tzinfo=MSK),
+        begin + datetime.timedelta(hours=-2),
+        (begin + datetime.timedelta(hours=1)).replace(tzinfo=datetime.timezone.utc),
+        begin + datetime.timedelta(minutes=30),
+    ]
+    if not first_aware:
+        times = times[1:] + times[:1]
+    telemetry = convert(tmp_path, times)
+    assert telemetry.tzinfo == datetime.timezone.utc
+    states = list(telemetry.iter_states(OBJECT_ID, "fuel1"))
+    assert [state.time for state in states] == sorted(to_utc(time) for time in times)
+
+
+def test_columnar_naive_times_stay_naive(tmp_path):
+    begin = datetime.datetime(2024, 1, 1, 12)
+    times = [begin + datetime.timedelta(seconds=k) for k in (5, 1, 3)]
+    telemetry = convert(tmp_path, times)
+    assert telemetry.tzinfo is None
+    assert [state.time for state in telemetry.iter_states(OBJECT_ID, "fuel1")] == sorted(times)
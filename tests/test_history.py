@@ -0,0 +1,80 @@
+"""Кольцевой буфер истории бака: вытеснение старых значений и поиск по времени после переноса через конец массива"""
+import datetime
+import random
+
+import pytest
+
+from dpt.fuel.logic.history import FuelHistory
+
+BEGIN = datetime.datetime(2024, 1, 1)
+
+
+def seconds(value: float) -> datetime.datetime:
+    return BEGIN + datetime.timedelta(seconds=value)
+
+
+def test_history_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        FuelHistory(0)
+
+
+def test_history_evicts_oldest():
+    history = FuelHistory(3)
+    for k in range(5):
+        assert history.append(seconds(k), float(k), 0.0)
+    assert len(history) == 3
+    assert [state.fuel_volume for state in history.between(seconds(0), seconds(10))] == [2.0, 3.0, 4.0]
+    assert history[0].time == seconds(2)
+    assert history[-1].time == seconds(4)
+    with pytest.raises(IndexError):
+        history[3]
+
+
+def test_history_rejects_earlier_value():
+    history = FuelHistory(3)
+    assert history.append(seconds(5), 1.0, 0.0)
+    assert not history.append(seconds(4), 2.0, 0.0)
+    assert history.append(seconds(5), 3.0, 0.0)
+    assert len(history) == 2
+
+
+@pytest.mark.parametrize("appended", range(7, 20))
+def test_history_between_after_wraparound(appended: int):
+    """Начало буфера смещается по всей ёмкости: результат совпадает с перебором последних значений"""
+    capacity = 7
+    history = FuelHistory(capacity)
+    samples = [(seconds(2 * k), float(k)) for k in range(appended)]
+    for time, fuel_volume in samples:
+        history.append(time, fuel_volume, 1.0)
+    kept = samples[-capacity:]
+    bounds = [seconds(value) for value in range(-1, 2 * appended + 2)]
+    for begin in bounds:
+        for end in bounds:
+            expected = [fuel_volume for time, fuel_volume in kept if begin <= time <= end]
+            assert [state.fuel_volume for state in history.between(begin, end)] == expected
+
+
+def test_history_get_at_after_wraparound():
+    rng = random.Random(2)
+    history = FuelHistory(16)
+    samples = []
+    time = BEGIN
+    for k in range(100):
+        time += datetime.timedelta(seconds=rng.choice([0, 1, 3]))
+        history.append(time, float(k), 0.0)
+        samples.append((time, float(k)))
+    kept = samples[-16:]
+    assert history.get_at(kept[0][0] - datetime.timedelta(microseconds=1)) is None
+    for time, _ in kept:
+        expected = [fuel_volume for sample_time, fuel_volume in kept if sample_time <= time][-1]
+        assert history.get_at(time).fuel_volume == expected
+
+
+def test_history_keeps_timezone():
+    history = FuelHistory(2)
+    begin = BEGIN.replace(tzinfo=datetime.timezone.utc)
+    history.append(begin, 1.0, 0.0)
+    assert history[0].time == begin
+    history.clear()
+    assert len(history) == 0
+    assert history.between(begin, begin) == []
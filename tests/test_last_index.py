@@ -0,0 +1,102 @@
+"""Индекс последних заправок/сливов: копии, более ранняя не вытесняет известную, заполняется только записью"""
+import asyncio
+import datetime
+import uuid
+
+from dpt.domain.fuel import FuelCharge, LastFuelChargeQuery
+from dpt.fuel.service.query.charge import LastFuelChargeQueryHandler
+from dpt.fuel.storage.last import FuelLastIndex, FuelChargeLastIndex
+
+ORGANIZATION_ID = uuid.UUID("5c3f0a52-7f3e-4d8e-9a51-0d6f1b8c2e11")
+OBJECT_ID = uuid.UUID("a0c4d1e2-3b5f-4c6d-8e7f-9a0b1c2d3e4f")
+BEGIN = datetime.datetime(2024, 1, 1)
+
+
+def make_charge(hours: float, volume: float = 10.0, charge_id=None) -> FuelCharge:
+    begin = BEGIN + datetime.timedelta(hours=hours)
+    return FuelCharge(
+        id=charge_id or uuid.uuid4(),
+        organization_id=ORGANIZATION_ID,
+        object_id=OBJECT_ID,
+        analytic_entity_id="fuel1",
+        location=None,
+        begin=begin,
+        end=begin + datetime.timedelta(minutes=10),
+        is_complete=False,
+        volume=volume,
+        volume_begin=100.0,
+        volume_end=100.0 + volume,
+    )
+
+
+def get(index: FuelLastIndex, organization_id=None):
+    return index.get(object_id=OBJECT_ID, analytic_entity_id="fuel1", organization_id=organization_id)
+
+
+def test_last_index_keeps_copies():
+    index = FuelLastIndex()
+    charge = make_charge(1)
+    index.set(charge)
+    # State машина меняет свою заправку до записи - индекс не должен это видеть
+    charge.volume = 99.0
+    found = get(index)
+    assert found.volume == 10.0
+    found.volume = 77.0
+    assert get(index).volume == 10.0
+
+
+def test_last_index_earlier_does_not_replace_later():
+    index = FuelLastIndex()
+    later, earlier = make_charge(5), make_charge(1)
+    index.set(later)
+    index.set(earlier)
+    assert get(index).id == later.id
+    # Изменение той же заправки принимается, даже если её начало сдвинулось раньше
+    index.set(make_charge(0, 20.0, charge_id=later.id))
+    assert get(index).volume == 20.0
+    assert len(index) == 1
+
+
+def test_last_index_remove_and_organization():
+    index = FuelLastIndex()
+    charge = make_charge(1)
+    index.set(charge)
+    assert get(index, uuid.uuid4()) is None
+    assert get(index, [uuid.uuid4(), ORGANIZATION_ID]).id == charge.id
+    index.remove(uuid.uuid4())
+    assert get(index) is not None
+    index.remove(charge.id)
+    assert get(index) is None
+    assert len(index) == 0
+
+
+class CountingStorage:
+
+    def __init__(self, last):
+        self.last = last
+        self.reads = 0
+
+    async def get_last(self, object_id, analytic_entity_id, organization_id=None):
+        self.reads += 1
+        return self.last
+
+
+def test_last_query_does_not_warm_index_from_reads():
+    stored = make_charge(1)
+    # Индекс - общий на процесс: у бака этого теста своя техника
+    stored.object_id = uuid.uuid4()
+    storage = CountingStorage(stored)
+    query = LastFuelChargeQuery(object_id=stored.object_id, analytic_entity_id="fuel1")
+
+    async def run():
+        assert (await LastFuelChargeQueryHandler().handle(query, storage)).id == stored.id
+        assert (await LastFuelChargeQueryHandler().handle(query, storage)).id == stored.id
+        assert storage.reads == 2
+        # Запись в этом процессе заполняет индекс - следующий запрос хранилище не читает
+        written = make_charge(2)
+        written.object_id = stored.object_id
+        FuelChargeLastIndex().set(written)
+        assert (await LastFuelChargeQueryHandler().handle(query, storage)).id == written.id
+        assert storage.reads == 2
+
+    asyncio.run(run())
@@ -0,0 +1,56 @@
+"""Снимок текущих состояний баков процесса: индекс по организациям следует за переходом объекта"""
+import asyncio
+import datetime
+import uuid
+
+from dpt.domain.telemetry import AnalyticEntity
+from dpt.fuel.logic.state import FuelDataEvent, FuelStateData
+from dpt.fuel.logic.storage import FuelChargeStateStorage, FuelDischargeStateStorage
+
+ORGANIZATION_ID = uuid.UUID("5c3f0a52-7f3e-4d8e-9a51-0d6f1b8c2e11")
+OTHER_ORGANIZATION_ID = uuid.UUID("0b1d6e2a-9c4f-4a37-8e55-3f2a7c9d1e60")
+BEGIN = datetime.datetime(2024, 1, 1)
+
+
+def make_event(organization_id, object_id, tank: str, seconds: float = 0) -> FuelDataEvent:
+    return FuelDataEvent(
+        organization_id=organization_id,
+        object_id=object_id,
+        model_id=None,
+        fuel_entity=AnalyticEntity(id=tank, name="Бак", msg_attr=tank),
+        state_data=FuelStateData(time=BEGIN + datetime.timedelta(seconds=seconds), speed=0.0, fuel_volume=100.0),
+    )
+
+
+def live_keys(storage, organization_id=None, object_id=None):
+    return sorted(
+        (state.organization_id == ORGANIZATION_ID, state.analytic_entity_id)
+        for state in storage.get_live_states(organization_id, object_id)
+    )
+
+
+def test_live_states_follow_organization_change():
+    for storage in (FuelChargeStateStorage(), FuelDischargeStateStorage()):
+        # Хранилища состояний - общие на процесс: у теста свой объект
+        object_id = uuid.uuid4()
+
+        async def run():
+            await storage.get(make_event(ORGANIZATION_ID, object_id, "fuel1"))
+            await storage.get(make_event(ORGANIZATION_ID, object_id, "fuel2"))
+            assert live_keys(storage, ORGANIZATION_ID, object_id) == [(True, "fuel1"), (True, "fuel2")]
+
+            # Баки уже в памяти: следующее сообщение приходит от другой организации
+            await storage.get(make_event(OTHER_ORGANIZATION_ID, object_id, "fuel1", 10))
+            assert live_keys(storage, ORGANIZATION_ID, object_id) == []
+            assert live_keys(storage, OTHER_ORGANIZATION_ID, object_id) == [(False, "fuel1"), (False, "fuel2")]
+            assert live_keys(storage, object_id=[object_id]) == [(False, "fuel1"), (False, "fuel2")]
+            assert object_id not in {
+                state.object_id for state in storage.get_live_states(ORGANIZATION_ID)
+            }
+
+            # И обратно
+            await storage.get(make_event(ORGANIZATION_ID, object_id, "fuel2", 20))
+            assert live_keys(storage, ORGANIZATION_ID, object_id) == [(True, "fuel1"), (True, "fuel2")]
+            assert live_keys(storage, OTHER_ORGANIZATION_ID, object_id) == []
+
+        asyncio.run(run())
@@ -0,0 +1,113 @@
+"""
+Топливные параметры объектов в памяти: объект без баков отличается от неизвестного,
+событие конфигурации сравнивается с памятью и пишет в хранилище только изменения.
+"""
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from dpt.domain.fuel.entity import ObjectFuelAnalyticEntity
+from dpt.domain.telemetry import AnalyticEntity
+from dpt.fuel.analytic_entity import FuelAnalyticEntitiesStorage, ObjectFuelAnalyticEntitiesStorage
+from dpt.fuel.metrics import FuelMetrics
+from dpt.fuel.service.event.object_config import ObjectConfigurationModifiedEventHandler
+
+ORGANIZATION_ID = uuid.UUID("5c3f0a52-7f3e-4d8e-9a51-0d6f1b8c2e11")
+OBJECT_ID = uuid.UUID("a0c4d1e2-3b5f-4c6d-8e7f-9a0b1c2d3e4f")
+FUEL_ENTITIES = [
+    AnalyticEntity(id="fuel1", name="Бак", msg_attr="fuel1"),
+    AnalyticEntity(id="fuel2", name="Бак 2", msg_attr="fuel2"),
+]
+
+
+class MemoryObjectStorage:
+    """Хранилище топливных параметров объектов в памяти; считает чтения и записи"""
+
+    def __init__(self, items):
+        self.items = {item.id: item for item in items}
+        self.queries = 0
+        self.writes = 0
+
+    async def query(self, id=None, organization_id=None):
+        self.queries += 1
+        return [item for item in self.items.values() if id is None or item.id == id]
+
+    async def set(self, item, unit_of_work=None):
+        self.writes += 1
+        self.items[item.id] = item
+
+    async def delete(self, item_id, unit_of_work=None):
+        self.writes += 1
+        self.items.pop(item_id, None)
+
+
+def make_event(*analytic_entity_ids: str, object_id=OBJECT_ID):
+    """Событие конфигурации: контроллер с аналитическими параметрами (в том числе не топливными)"""
+    return SimpleNamespace(object=SimpleNamespace(
+        id=object_id,
+        enterprise_id=ORGANIZATION_ID,
+        controllers=[SimpleNamespace(analytic_settings=[
+            SimpleNamespace(analytic_entity_id=analytic_entity_id)
+            for analytic_entity_id in (*analytic_entity_ids, "speed")
+        ])],
+    ))
+
+
+@pytest.fixture
+def entities():
+    FuelAnalyticEntitiesStorage.create(FUEL_ENTITIES)
+    storage = MemoryObjectStorage([
+        ObjectFuelAnalyticEntity(organization_id=ORGANIZATION_ID, id=OBJECT_ID, analytic_entity_ids=["fuel1"]),
+    ])
+    object_fuel_entities = ObjectFuelAnalyticEntitiesStorage()
+    asyncio.run(object_fuel_entities.load(storage))
+    storage.queries = 0
+    return object_fuel_entities, storage
+
+
+def msg_attrs(object_fuel_entities, object_id=OBJECT_ID):
+    return [entity.msg_attr for entity in object_fuel_entities.entities(object_id)]
+
+
+def test_object_without_tanks_differs_from_unknown(entities):
+    object_fuel_entities, _ = entities
+    assert msg_attrs(object_fuel_entities) == ["fuel1"]
+    assert msg_attrs(object_fuel_entities, uuid.uuid4()) == ["fuel1", "fuel2"]
+    object_fuel_entities.set(OBJECT_ID, None)
+    assert object_fuel_entities.get(OBJECT_ID) is None
+    assert msg_attrs(object_fuel_entities) == []
+
+
+def test_config_event_compared_with_memory(entities):
+    object_fuel_entities, storage = entities
+    handler = ObjectConfigurationModifiedEventHandler()
+    unchanged = FuelMetrics().get("object_config_unchanged")
+
+    async def run():
+        await handler.handle(make_event("fuel1"), storage)
+        assert storage.writes == 0
+        await handler.handle(make_event("fuel2", "fuel1"), storage)
+        assert storage.writes == 1
+        assert msg_attrs(object_fuel_entities) == ["fuel1", "fuel2"]
+        await handler.handle(make_event("fuel1", "fuel2"), storage)
+        assert storage.writes == 1
+
+        # Баков не стало - запись удаляется, объект известен и телеметрия его баков не проверяется
+        await handler.handle(make_event(), storage)
+        assert storage.writes == 2
+        assert OBJECT_ID not in storage.items
+        assert msg_attrs(object_fuel_entities) == []
+        await handler.handle(make_event(), storage)
+        assert storage.writes == 2
+
+        # Новый объект без баков: в хранилище писать нечего, но объект становится известным
+        new_object_id = uuid.uuid4()
+        await handler.handle(make_event(object_id=new_object_id), storage)
+        assert storage.writes == 2
+        assert msg_attrs(object_fuel_entities, new_object_id) == []
+
+    asyncio.run(run())
+    assert storage.queries == 0
+    assert FuelMetrics().get("object_config_unchanged") - unchanged == 4
@@ -0,0 +1,121 @@
+"""Постраничное чтение заправок: порядок (begin, id) с одинаковым begin, страницы без пропусков и повторов"""
+import asyncio
+import datetime
+import random
+import uuid
+from contextlib import aclosing
+
+import pytest
+
+from dpt.domain.fuel import FuelCharge, FuelChargeQuery
+from dpt.fuel.service.query.charge import FuelChargeQueryHandler
+from dpt.fuel.storage.interface import order_after
+from dpt.utils import DateTimeInterval
+
+ORGANIZATION_ID = uuid.UUID("5c3f0a52-7f3e-4d8e-9a51-0d6f1b8c2e11")
+OBJECT_ID = uuid.UUID("a0c4d1e2-3b5f-4c6d-8e7f-9a0b1c2d3e4f")
+BEGIN = datetime.datetime(2024, 1, 1)
+INTERVAL = DateTimeInterval(begin=BEGIN, end=BEGIN + datetime.timedelta(days=1))
+
+
+def make_charges(seed: int, size: int):
+    """Заправки по возрастанию begin, у многих одинаковый begin, id - в случайном порядке"""
+    rng = random.Random(seed)
+    charges = []
+    begin = BEGIN
+    for _ in range(size):
+        begin += datetime.timedelta(minutes=rng.choice([0, 0, 1, 5]))
+        charges.append(FuelCharge(
+            id=uuid.UUID(int=rng.getrandbits(128)),
+            organization_id=ORGANIZATION_ID,
+            object_id=OBJECT_ID,
+            analytic_entity_id="fuel1",
+            location=None,
+            begin=begin,
+            end=begin + datetime.timedelta(minutes=1),
+            is_complete=True,
+            volume=10.0,
+            volume_begin=100.0,
+            volume_end=110.0,
+        ))
+    return charges
+
+
+class FakeStorage:
+    """Курсор хранилища: по возрастанию begin (без порядка по id), как у индекса по begin"""
+
+    def __init__(self, charges):
+        self.charges = charges
+        self.read = 0
+        self.closed = 0
+
+    async def _cursor(self, after):
+        try:
+            for charge in self.charges:
+                if after is None or charge.begin >= after[0]:
+                    self.read += 1
+                    yield charge
+        finally:
+            self.closed += 1
+
+    async def iterate(self, object_id, organization_id, interval, after=None):
+        async with aclosing(order_after(self._cursor(after), after)) as charges:
+            async for charge in charges:
+                yield charge
+
+
+def key(charge: FuelCharge):
+    return charge.begin, charge.id
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_order_after_sorts_ties_by_id(seed: int):
+    charges = make_charges(seed, 200)
+    expected = sorted(charges, key=key)
+
+    async def items():
+        for charge in charges:
+            yield charge
+
+    assert asyncio.run(collect(order_after(items()))) == expected
+    after = key(expected[77])
+    assert asyncio.run(collect(order_after(items(), after))) == expected[78:]
+
+
+@pytest.mark.parametrize("limit", [1, 3, 7, 50, 1000])
+def test_charge_query_pages_cover_all_once(limit: int):
+    charges = make_charges(limit, 300)
+    storage = FakeStorage(charges)
+    handler = FuelChargeQueryHandler()
+
+    async def run():
+        pages = []
+        after = None
+        while True:
+            query = FuelChargeQuery(object_id=OBJECT_ID, interval=INTERVAL, after=after, limit=limit)
+            page = await handler.handle(query, storage)
+            if not page:
+                return pages
+            assert len(page) <= limit
+            pages.append(page)
+            after = key(page[-1])
+
+    pages = asyncio.run(run())
+    assert [charge for page in pages for charge in page] == sorted(charges, key=key)
+    # Курсор закрывается после каждой страницы
+    assert storage.closed == len(pages) + 1
+
+
+def test_charge_query_page_stops_reading():
+    charges = make_charges(0, 1000)
+    storage = FakeStorage(charges)
+    query = FuelChargeQuery(object_id=OBJECT_ID, interval=INTERVAL, limit=10)
+    assert len(asyncio.run(FuelChargeQueryHandler().handle(query, storage))) == 10
+    assert storage.read < 50
+    assert storage.closed == 1
+    assert asyncio.run(FuelChargeQueryHandler().handle(
+        FuelChargeQuery(object_id=OBJECT_ID, interval=INTERVAL, limit=0), storage)) == []
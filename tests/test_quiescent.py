@@ -0,0 +1,111 @@
+"""
+Быстрый путь advance_quiescent: для стоящей техники без изменения уровня топлива
+состояние после быстрого пути совпадает с состоянием после перехода State машины.
+"""
+import datetime
+import random
+import uuid
+from dataclasses import replace
+from typing import List
+
+import pytest
+
+from dpt.domain.fuel import FuelChargeSettings, FuelDischargeSettings, FuelDischargeConfirmation
+from dpt.domain.telemetry import AnalyticEntity
+from dpt.geojson import Point
+from dpt.fuel.logic.fsm import ChargeFSM, DischargeFSM
+from dpt.fuel.logic.state import FuelStateData, FuelDataEvent, ChargeState, DischargeState
+
+ORGANIZATION_ID = uuid.UUID("5c3f0a52-7f3e-4d8e-9a51-0d6f1b8c2e11")
+OBJECT_ID = uuid.UUID("a0c4d1e2-3b5f-4c6d-8e7f-9a0b1c2d3e4f")
+ANALYTIC_ENTITY = AnalyticEntity(id="fuel1", name="Бак", msg_attr="fuel1")
+
+
+def make_series(rng: random.Random, size: int) -> List[FuelStateData]:
+    """Ряд с длинными стоянками без изменения уровня (положение на стоянке дрожит), заправками и сливами"""
+    time = datetime.datetime(2024, 1, 1)
+    fuel_volume = 300.0
+    speed = 0.0
+    states = []
+    for k in range(size):
+        time += datetime.timedelta(seconds=rng.choice([0, 1, 5, 10, 40]))
+        mode = rng.random()
+        if mode < 0.05:
+            fuel_volume += rng.uniform(0, 200)
+        elif mode < 0.1:
+            fuel_volume -= rng.uniform(0, 200)
+        elif mode < 0.15:
+            fuel_volume += rng.choice([-1, 1]) * rng.random()
+        if rng.random() < 0.05:
+            speed = rng.choice([0.0, 0.0, 0.0, 20.0])
+        states.append(FuelStateData(
+            time=time, speed=speed, fuel_volume=round(fuel_volume, 2), location=Point((k % 7, k % 5))))
+    return states
+
+
+def make_event(state_data: FuelStateData) -> FuelDataEvent:
+    return FuelDataEvent(
+        organization_id=ORGANIZATION_ID,
+        object_id=OBJECT_ID,
+        model_id=None,
+        fuel_entity=ANALYTIC_ENTITY,
+        state_data=replace(state_data),
+    )
+
+
+def run_both(fsm_class, state_class, settings, states: List[FuelStateData]) -> int:
+    """Прогнать ряд полной State машиной и с быстрым путём, сверяя состояния после каждого сообщения"""
+    full_state = state_class.from_event(make_event(states[0]))
+    fast_state = state_class.from_event(make_event(states[0]))
+    full_fsm = fsm_class(ORGANIZATION_ID, OBJECT_ID, ANALYTIC_ENTITY, settings, full_state, deterministic_id=True)
+    fast_fsm = fsm_class(ORGANIZATION_ID, OBJECT_ID, ANALYTIC_ENTITY, settings, fast_state, deterministic_id=True)
+    skipped = 0
+    for state_data in states:
+        full_intents = full_fsm.transition(make_event(state_data))
+        if fast_state.advance_quiescent(
+                state_data.time, state_data.speed, state_data.fuel_volume, state_data.location):
+            skipped += 1
+            assert not full_intents
+        else:
+            assert fast_fsm.transition(make_event(state_data)) == full_intents
+        assert fast_state == full_state
+    return skipped
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_quiescent_charge_matches_fsm(seed: int):
+    rng = random.Random(seed)
+    settings = FuelChargeSettings(
+        min_volume=rng.choice([10.0, 50.0]),
+        min_duration_in=datetime.timedelta(seconds=rng.choice([0, 5, 30])),
+        ignore_on_speed=rng.random() < 0.5,
+        ignore_duration_begin_move=datetime.timedelta(seconds=rng.choice([0, 15])),
+    )
+    assert run_both(ChargeFSM, ChargeState, settings, make_series(rng, 300)) > 0
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_quiescent_discharge_matches_fsm(seed: int):
+    rng = random.Random(seed)
+    settings = FuelDischargeSettings(
+        min_volume=rng.choice([5.0, 30.0]),
+        max_fuel_speed=rng.choice([0.1, 2.0]),
+        min_stoppage_duration=datetime.timedelta(seconds=rng.choice([0, 10, 30])),
+        ignore_duration_begin_move=datetime.timedelta(seconds=rng.choice([0, 15])),
+        confirmation=rng.choice(list(FuelDischargeConfirmation)),
+    )
+    assert run_both(DischargeFSM, DischargeState, settings, make_series(rng, 300)) > 0
+
+
+def test_quiescent_not_applied_outside_stable_state():
+    begin = datetime.datetime(2024, 1, 1)
+    state = ChargeState.from_event(make_event(FuelStateData(time=begin, speed=0.0, fuel_volume=100.0)))
+    state.state = state.state.__class__.MAYBE_CHARGING
+    assert not state.advance_quiescent(begin + datetime.timedelta(seconds=1), 0.0, 100.0)
+
+    state = DischargeState.from_event(make_event(FuelStateData(time=begin, speed=0.0, fuel_volume=100.0)))
+    assert not state.advance_quiescent(begin + datetime.timedelta(seconds=1), 0.0, 99.0)
+    assert not state.advance_quiescent(begin + datetime.timedelta(seconds=1), 5.0, 100.0)
+    assert not state.advance_quiescent(begin - datetime.timedelta(seconds=1), 0.0, 100.0)
+    assert state.advance_quiescent(begin + datetime.timedelta(seconds=1), 0.0, 100.0, Point((1, 2)))
+    assert state.current_data.location == Point((1, 2))
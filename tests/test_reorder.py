@@ -0,0 +1,100 @@
+"""Буфер переупорядочивания: водяной знак, переполнение, опоздавшие события и сброс по тишине"""
+import datetime
+import random
+import uuid
+
+from dpt.domain.telemetry import AnalyticEntity
+from dpt.fuel.logic.reorder import FuelReorderBuffer
+from dpt.fuel.logic.state import FuelDataEvent, FuelStateData
+from dpt.fuel.metrics import FuelMetrics
+
+ORGANIZATION_ID = uuid.UUID("5c3f0a52-7f3e-4d8e-9a51-0d6f1b8c2e11")
+OBJECT_ID = uuid.UUID("a0c4d1e2-3b5f-4c6d-8e7f-9a0b1c2d3e4f")
+ANALYTIC_ENTITY = AnalyticEntity(id="fuel1", name="Бак", msg_attr="fuel1")
+BEGIN = datetime.datetime(2024, 1, 1)
+
+
+def make_event(seconds: float, object_id=OBJECT_ID) -> FuelDataEvent:
+    return FuelDataEvent(
+        organization_id=ORGANIZATION_ID,
+        object_id=object_id,
+        model_id=None,
+        fuel_entity=ANALYTIC_ENTITY,
+        state_data=FuelStateData(time=BEGIN + datetime.timedelta(seconds=seconds), speed=0.0, fuel_volume=seconds),
+    )
+
+
+def seconds(events):
+    return [(event.state_data.time - BEGIN).total_seconds() for event in events]
+
+
+def test_reorder_without_lateness_passes_through():
+    buffer = FuelReorderBuffer()
+    assert seconds(buffer.push(make_event(1))) == [1]
+    assert seconds(buffer.push(make_event(2))) == [2]
+    assert not buffer.pending(OBJECT_ID, ANALYTIC_ENTITY.id)
+
+
+def test_reorder_releases_by_watermark_in_time_order():
+    buffer = FuelReorderBuffer(lateness=datetime.timedelta(seconds=10))
+    assert buffer.push(make_event(5)) == []
+    assert buffer.push(make_event(3)) == []
+    assert buffer.push(make_event(12)) == []
+    assert buffer.pending(OBJECT_ID, ANALYTIC_ENTITY.id)
+    # Водяной знак 14 - отдаются 3, 5, 12
+    assert seconds(buffer.push(make_event(24))) == [3, 5, 12]
+    assert seconds(buffer.push(make_event(40))) == [24]
+
+
+def test_reorder_drops_events_older_than_released():
+    buffer = FuelReorderBuffer(lateness=datetime.timedelta(seconds=5))
+    buffer.push(make_event(10))
+    assert seconds(buffer.push(make_event(20))) == [10]
+    too_late = FuelMetrics().get("reorder_too_late")
+    assert buffer.push(make_event(9)) == []
+    assert FuelMetrics().get("reorder_too_late") == too_late + 1
+    assert seconds(buffer.push(make_event(30))) == [20]
+
+
+def test_reorder_flushes_on_capacity():
+    buffer = FuelReorderBuffer(lateness=datetime.timedelta(hours=1), capacity=3)
+    for value in (4, 2, 3):
+        assert buffer.push(make_event(value)) == []
+    assert seconds(buffer.push(make_event(1))) == [1]
+    assert seconds(buffer.push(make_event(5))) == [2]
+
+
+def test_reorder_output_is_sorted_for_bounded_disorder():
+    """Перестановки в пределах допустимого опоздания восстанавливаются полностью"""
+    rng = random.Random(7)
+    lateness = 5
+    times = [k + rng.uniform(0, lateness) for k in range(500)]
+    buffer = FuelReorderBuffer(lateness=datetime.timedelta(seconds=lateness), capacity=1000)
+    released = []
+    for value in times:
+        released.extend(buffer.push(make_event(value)))
+    released.extend(buffer.flush(OBJECT_ID, ANALYTIC_ENTITY.id))
+    assert seconds(released) == sorted(seconds(released))
+    assert len(released) == len(times)
+
+
+def test_reorder_keys_are_independent():
+    other_object_id = uuid.uuid4()
+    buffer = FuelReorderBuffer(lateness=datetime.timedelta(seconds=10))
+    buffer.push(make_event(1))
+    buffer.push(make_event(100, object_id=other_object_id))
+    assert buffer.pending(OBJECT_ID, ANALYTIC_ENTITY.id)
+    assert seconds(buffer.flush(other_object_id, ANALYTIC_ENTITY.id)) == [100]
+    assert buffer.pending(OBJECT_ID, ANALYTIC_ENTITY.id)
+
+
+def test_reorder_flush_and_advance():
+    buffer = FuelReorderBuffer(lateness=datetime.timedelta(seconds=10))
+    buffer.push(make_event(3))
+    buffer.push(make_event(1))
+    assert seconds(buffer.flush(OBJECT_ID, ANALYTIC_ENTITY.id)) == [1, 3]
+    assert not buffer.pending(OBJECT_ID, ANALYTIC_ENTITY.id)
+    assert buffer.push(make_event(2)) == []
+    # Событие быстрого пути сдвигает отданное время
+    buffer.advance(OBJECT_ID, ANALYTIC_ENTITY.id, BEGIN + datetime.timedelta(seconds=50))
+    assert buffer.push(make_event(45)) == []
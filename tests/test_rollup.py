@@ -0,0 +1,226 @@
+"""
+Суточные итоги заправок/сливов: обработчики команд записывают заправку/слив один раз (атомарно с чтением
+предыдущей версии) и прибавляют/вычитают разницу версий; незаконченные итогов не касаются.
+"""
+import asyncio
+import dataclasses
+import datetime
+import random
+import uuid
+from collections import defaultdict
+from typing import List
+
+import pytest
+
+from dpt.component import _u
+from dpt.cqrs import IEventBus
+from dpt.domain.fuel import FuelCharge, FuelDischarge, FuelVolumeRollup, SetFuelChargeCommand, \
+    EndFuelChargeCommand, SetFuelDischargeCommand, DeleteFuelDischargeCommand
+from dpt.fuel.service.command.charge import EndFuelChargeCommandHandler, SetFuelChargeCommandHandler
+from dpt.fuel.service.command.discharge import SetFuelDischargeCommandHandler, DeleteFuelDischargeCommandHandler
+from dpt.fuel.storage.interface import IFuelChargeStorage, IFuelDischargeStorage, IFuelVolumeRollupStorage
+
+ORGANIZATION_ID = uuid.UUID("5c3f0a52-7f3e-4d8e-9a51-0d6f1b8c2e11")
+OBJECT_ID = uuid.UUID("a0c4d1e2-3b5f-4c6d-8e7f-9a0b1c2d3e4f")
+DAY = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+MSK = datetime.timezone(datetime.timedelta(hours=3))
+
+
+class MemoryChargeStorage:
+    """Заправки/сливы в памяти; считает записи"""
+
+    def __init__(self):
+        self.items = {}
+        self.writes = 0
+
+    async def set_returning_previous(self, item):
+        self.writes += 1
+        previous = self.items.get(item.id)
+        self.items[item.id] = dataclasses.replace(item)
+        return previous
+
+    async def delete_returning_previous(self, item_id, organization_id=None):
+        item = self.items.get(item_id)
+        if item is None or (organization_id is not None and item.organization_id != organization_id):
+            return None
+        self.writes += 1
+        return self.items.pop(item_id)
+
+
+class MemoryRollupStorage(IFuelVolumeRollupStorage):
+    """Суточные итоги в памяти"""
+
+    def __init__(self):
+        super().__init__()
+        self.rollups = {}
+        self.increments = 0
+
+    async def increment(self, items: List[FuelVolumeRollup]) -> None:
+        self.increments += 1
+        for item in items:
+            key = (item.organization_id, item.object_id, item.analytic_entity_id, item.day)
+            self.rollups.setdefault(key, FuelVolumeRollup(*key)).add(item)
+
+    async def set_many(self, items):
+        raise NotImplementedError
+
+    async def query(self, object_id=None, organization_id=None, interval=None, analytic_entity_id=None):
+        return list(self.rollups.values())
+
+    async def delete(self, object_id=None, organization_id=None, interval=None):
+        self.rollups.clear()
+
+    def totals(self):
+        return {
+            key[3]: (rollup.charge_volume, rollup.charge_count, rollup.discharge_volume, rollup.discharge_count)
+            for key, rollup in self.rollups.items()
+            if any((rollup.charge_count, rollup.discharge_count))
+        }
+
+
+class MemoryEventBus:
+
+    def __init__(self):
+        self.events = []
+
+    async def publish(self, event):
+        self.events.append(event)
+
+
+@pytest.fixture
+def storages():
+    charges, discharges, rollups, bus = MemoryChargeStorage(), MemoryChargeStorage(), MemoryRollupStorage(), \
+        MemoryEventBus()
+    _u.update({
+        IFuelChargeStorage: charges,
+        IFuelDischargeStorage: discharges,
+        IFuelVolumeRollupStorage: rollups,
+        IEventBus: bus,
+    })
+    yield charges, discharges, rollups, bus
+    for key in (IFuelChargeStorage, IFuelDischargeStorage, IFuelVolumeRollupStorage, IEventBus):
+        _u.pop(key, None)
+
+
+def make(entity_class, begin: datetime.datetime, volume: float, is_complete: bool, item_id=None):
+    return entity_class(
+        id=item_id or uuid.uuid4(),
+        organization_id=ORGANIZATION_ID,
+        object_id=OBJECT_ID,
+        analytic_entity_id="fuel1",
+        location=None,
+        begin=begin,
+        end=begin + datetime.timedelta(minutes=10),
+        is_complete=is_complete,
+        volume=volume,
+        volume_begin=100.0,
+        volume_end=100.0 + volume,
+    )
+
+
+def test_rollup_day_is_utc_day():
+    assert FuelVolumeRollup.get_day(datetime.datetime(2024, 1, 2, 1, 30, tzinfo=MSK)) == DAY
+    assert FuelVolumeRollup.get_day(datetime.datetime(2024, 1, 1, 23, 59)) == DAY.replace(tzinfo=None)
+
+
+def test_rollup_charge_lifecycle(storages):
+    charges, _, rollups, bus = storages
+    charge_id = uuid.uuid4()
+    begin = DAY + datetime.timedelta(hours=5)
+
+    async def run():
+        # Незаконченная заправка - одна запись на сообщение, итоги не читаются и не пишутся
+        for volume in (10.0, 20.0, 30.0):
+            await SetFuelChargeCommandHandler().handle(SetFuelChargeCommand(
+                organization_id=ORGANIZATION_ID, object=make(FuelCharge, begin, volume, False, charge_id)))
+        assert charges.writes == 3
+        assert rollups.increments == 0
+
+        end = EndFuelChargeCommand(
+            organization_id=ORGANIZATION_ID, object=make(FuelCharge, begin, 40.0, True, charge_id))
+        await EndFuelChargeCommandHandler().handle(end)
+        assert rollups.totals() == {DAY: (40.0, 1, 0.0, 0)}
+        # Повторное окончание не учитывается второй раз
+        await EndFuelChargeCommandHandler().handle(end)
+        assert rollups.totals() == {DAY: (40.0, 1, 0.0, 0)}
+
+        # Изменение окончившейся заправки - разница, перенос на другие сутки - вычитание и прибавление
+        await SetFuelChargeCommandHandler().handle(SetFuelChargeCommand(
+            organization_id=ORGANIZATION_ID, object=make(FuelCharge, begin, 45.0, True, charge_id)))
+        assert rollups.totals() == {DAY: (45.0, 1, 0.0, 0)}
+        next_day = DAY + datetime.timedelta(days=1)
+        await SetFuelChargeCommandHandler().handle(SetFuelChargeCommand(
+            organization_id=ORGANIZATION_ID, object=make(FuelCharge, next_day, 45.0, True, charge_id)))
+        assert rollups.totals() == {next_day: (45.0, 1, 0.0, 0)}
+
+    asyncio.run(run())
+    assert charges.writes == 7
+    assert len(bus.events) == 7
+    assert all(event.object.id == charge_id for event in bus.events)
+
+
+def test_rollup_discharge_delete(storages):
+    _, discharges, rollups, bus = storages
+    discharge = make(FuelDischarge, DAY + datetime.timedelta(hours=1), 25.0, True)
+    other = make(FuelDischarge, DAY + datetime.timedelta(hours=2), 5.0, True)
+
+    async def run():
+        for item in (discharge, other):
+            await SetFuelDischargeCommandHandler().handle(
+                SetFuelDischargeCommand(organization_id=ORGANIZATION_ID, object=item))
+        assert rollups.totals() == {DAY: (0.0, 0, 30.0, 2)}
+
+        command = DeleteFuelDischargeCommand(object_id=discharge.id, organization_id=ORGANIZATION_ID)
+        await DeleteFuelDischargeCommandHandler().handle(command)
+        assert rollups.totals() == {DAY: (0.0, 0, 5.0, 1)}
+        # Повторное удаление (или удаление другой организацией) итоги не меняет
+        await DeleteFuelDischargeCommandHandler().handle(command)
+        await DeleteFuelDischargeCommandHandler().handle(
+            DeleteFuelDischargeCommand(object_id=other.id, organization_id=uuid.uuid4()))
+        assert rollups.totals() == {DAY: (0.0, 0, 5.0, 1)}
+
+    asyncio.run(run())
+    # Событие отмены - только об удалённом сливе
+    assert [event.object_id for event in bus.events[2:]] == [discharge.id]
+
+
+def test_rollup_incomplete_delete_not_counted(storages):
+    _, discharges, rollups, _ = storages
+    discharge = make(FuelDischarge, DAY, 25.0, False)
+
+    async def run():
+        await SetFuelDischargeCommandHandler().handle(
+            SetFuelDischargeCommand(organization_id=ORGANIZATION_ID, object=discharge))
+        await DeleteFuelDischargeCommandHandler().handle(
+            DeleteFuelDischargeCommand(object_id=discharge.id, organization_id=ORGANIZATION_ID))
+
+    asyncio.run(run())
+    assert rollups.increments == 0
+    assert not discharges.items
+
+
+def test_rollup_totals_match_sum_of_complete(storages):
+    """Случайная последовательность изменений и удалений: итоги - сумма окончившихся сливов по суткам"""
+    rng = random.Random(5)
+    _, discharges, rollups, _ = storages
+    ids = [uuid.uuid4() for _ in range(10)]
+
+    async def run():
+        for _ in range(300):
+            item_id = rng.choice(ids)
+            if rng.random() < 0.2:
+                await DeleteFuelDischargeCommandHandler().handle(
+                    DeleteFuelDischargeCommand(object_id=item_id, organization_id=ORGANIZATION_ID))
+            else:
+                begin = DAY + datetime.timedelta(hours=rng.randint(0, 72))
+                item = make(FuelDischarge, begin, float(rng.randint(1, 50)), rng.random() < 0.5, item_id)
+                await SetFuelDischargeCommandHandler().handle(
+                    SetFuelDischargeCommand(organization_id=ORGANIZATION_ID, object=item))
+
+    asyncio.run(run())
+    expected = defaultdict(lambda: [0.0, 0])
+    for item in discharges.items.values():
+        if item.is_complete:
+            expected[FuelVolumeRollup.get_day(item.begin)][0] += item.volume
+            expected[FuelVolumeRollup.get_day(item.begin)][1] += 1
+    assert rollups.totals() == {day: (0.0, 0, volume, count) for day, (volume, count) in expected.items()}
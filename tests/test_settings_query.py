@@ -0,0 +1,76 @@
+"""Запрос настроек: из локального кэша - только в процессе, обновляющем кэш по событиям, и копиями"""
+import asyncio
+import uuid
+
+from dpt.domain.fuel import FuelChargeSettings, FuelDischargeSettings, ObjectFuelSettings
+from dpt.domain.fuel.query.settings import ObjectFuelSettingsQuery
+from dpt.domain.identity import DeletionStatus
+from dpt.fuel.service.query.settings import ObjectFuelSettingsQueryHandler
+from dpt.fuel.storage.interface import IObjectFuelSettingsStorage
+
+ORGANIZATION_ID = uuid.UUID("5c3f0a52-7f3e-4d8e-9a51-0d6f1b8c2e11")
+OBJECT_ID = uuid.UUID("a0c4d1e2-3b5f-4c6d-8e7f-9a0b1c2d3e4f")
+
+
+class MemorySettingsStorage(IObjectFuelSettingsStorage):
+
+    def __init__(self, items):
+        super().__init__()
+        self.items = items
+        self.queries = 0
+
+    async def query(self, id=None, organization_id=None, deletion=DeletionStatus.PRESENT):
+        self.queries += 1
+        return list(self.items)
+
+
+def make_settings() -> ObjectFuelSettings:
+    return ObjectFuelSettings(
+        id=uuid.uuid4(),
+        organization_id=ORGANIZATION_ID,
+        model_id=uuid.uuid4(),
+        analytic_entity_id="fuel1",
+        charge=FuelChargeSettings(),
+        discharge=FuelDischargeSettings(),
+        object_id=OBJECT_ID,
+    )
+
+
+def test_settings_query_reads_storage_unless_tracked():
+    storage = MemorySettingsStorage([make_settings()])
+    query = ObjectFuelSettingsQuery(organization_id=ORGANIZATION_ID)
+
+    async def run():
+        # Загружен однажды (как в пакетном пересчёте), событий процесс не получает - кэш может устареть
+        await storage.load()
+        assert storage.queries == 1
+        assert len(await ObjectFuelSettingsQueryHandler().handle(query, storage)) == 1
+        assert storage.queries == 2
+
+        storage.track()
+        assert len(await ObjectFuelSettingsQueryHandler().handle(query, storage)) == 1
+        assert storage.queries == 2
+        # Удалённые - всегда из хранилища
+        await ObjectFuelSettingsQueryHandler().handle(
+            ObjectFuelSettingsQuery(organization_id=ORGANIZATION_ID, deletion=DeletionStatus.ALL), storage)
+        assert storage.queries == 3
+
+    asyncio.run(run())
+
+
+def test_settings_query_returns_copies():
+    settings = make_settings()
+    storage = MemorySettingsStorage([settings])
+    storage.track()
+
+    async def run():
+        await storage.load()
+        found = (await ObjectFuelSettingsQueryHandler().handle(ObjectFuelSettingsQuery(id=settings.id), storage))[0]
+        assert found == settings
+        found.charge.min_volume = 1.0
+        found.smoothing.window = 100
+        cached = await storage.get_settings(ORGANIZATION_ID, "fuel1", object_id=OBJECT_ID)
+        assert cached.charge.min_volume == FuelChargeSettings().min_volume
+        assert cached.smoothing.window == settings.smoothing.window
+
+    asyncio.run(run())
@@ -0,0 +1,71 @@
+"""Сброс нагрузки: включение по порогу отставания, выключение ниже половины порога, прореживание стабильных баков"""
+import datetime
+import uuid
+
+from dpt.domain.telemetry import AnalyticEntity
+from dpt.fuel.logic.shedding import FuelLoadShedding
+from dpt.fuel.logic.state import ChargeState, DischargeState, DischargeStateEnum, FuelDataEvent, FuelStateData
+from dpt.fuel.logic.telemetry import make_full_telemetry_event
+
+OBJECT_ID = uuid.UUID("a0c4d1e2-3b5f-4c6d-8e7f-9a0b1c2d3e4f")
+BEGIN = datetime.datetime(2024, 1, 1)
+
+
+def make_telemetry_event(lag: float, aware: bool = False):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    if not aware:
+        now = now.replace(tzinfo=None)
+    receive_time = now - datetime.timedelta(seconds=lag)
+    return make_full_telemetry_event({
+        "object_id": OBJECT_ID,
+        "enterprise_id": uuid.uuid4(),
+        "time": receive_time,
+        "receive_time": receive_time,
+        "fuel1": 100.0,
+    })
+
+
+def make_state(state_class, seconds: float):
+    return state_class.from_event(FuelDataEvent(
+        organization_id=uuid.uuid4(),
+        object_id=OBJECT_ID,
+        model_id=None,
+        fuel_entity=AnalyticEntity(id="fuel1", name="Бак", msg_attr="fuel1"),
+        state_data=FuelStateData(time=BEGIN + datetime.timedelta(seconds=seconds), speed=0.0, fuel_volume=100.0),
+    ))
+
+
+def test_shedding_disabled_without_lag():
+    shedding = FuelLoadShedding()
+    assert not shedding.update(make_telemetry_event(3600))
+    assert not shedding.should_drop(make_state(ChargeState, 0), BEGIN)
+
+
+def test_shedding_hysteresis():
+    shedding = FuelLoadShedding(lag=datetime.timedelta(seconds=60))
+    assert not shedding.update(make_telemetry_event(30))
+    assert not shedding.update(make_telemetry_event(59))
+    assert shedding.update(make_telemetry_event(90))
+    # Между половиной порога и порогом режим остаётся включенным
+    assert shedding.update(make_telemetry_event(45))
+    assert shedding.update(make_telemetry_event(31))
+    assert not shedding.update(make_telemetry_event(20))
+    # И выключенным - до превышения порога
+    assert not shedding.update(make_telemetry_event(45))
+    assert shedding.update(make_telemetry_event(61, aware=True))
+
+
+def test_shedding_drops_only_stable_states_within_interval():
+    shedding = FuelLoadShedding(lag=datetime.timedelta(seconds=60), interval=datetime.timedelta(seconds=10))
+    state = make_state(ChargeState, 0)
+    assert not shedding.should_drop(state, BEGIN + datetime.timedelta(seconds=5))
+
+    shedding.update(make_telemetry_event(120))
+    assert shedding.should_drop(state, BEGIN + datetime.timedelta(seconds=5))
+    assert not shedding.should_drop(state, BEGIN + datetime.timedelta(seconds=10))
+    assert not shedding.should_drop(None, BEGIN + datetime.timedelta(seconds=5))
+
+    discharge_state = make_state(DischargeState, 0)
+    assert shedding.should_drop(discharge_state, BEGIN + datetime.timedelta(seconds=5))
+    discharge_state.state = DischargeStateEnum.MAYBE_DISCHARGING
+    assert not shedding.should_drop(discharge_state, BEGIN + datetime.timedelta(seconds=5))
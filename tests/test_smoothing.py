@@ -0,0 +1,93 @@
+"""Сглаживание датчика уровня топлива: медиана и MAD скользящего окна против перебора, фильтры, проверка настроек"""
+import random
+import statistics
+from types import SimpleNamespace
+
+import pytest
+
+from dpt.cqrs.exception import ValidationError
+from dpt.domain.fuel import FuelSmoothingSettings, FuelSmoothingMethod, FUEL_SMOOTHING_MAX_WINDOW
+from dpt.fuel.logic.smoothing import MAD_SCALE, EmaFilter, HampelFilter, MedianFilter, make_fuel_filter
+from dpt.fuel.logic.smoothing import _SlidingWindow
+from dpt.fuel.service.command.settings import ValidateSettingsMixin, get_smoothing_error
+
+
+def exact_mad(values) -> float:
+    median = statistics.median(values)
+    return statistics.median(abs(value - median) for value in values)
+
+
+@pytest.mark.parametrize("window", [1, 2, 3, 4, 5, 8, 61])
+@pytest.mark.parametrize("seed", range(5))
+def test_sliding_window_median_and_mad(window: int, seed: int):
+    rng = random.Random(seed)
+    sliding = _SlidingWindow(window)
+    values = []
+    for _ in range(300):
+        # Повторяющиеся значения - типичны для датчика уровня
+        value = float(rng.choice([rng.randint(0, 5), rng.gauss(100, 10)]))
+        sliding.push(value)
+        values = (values + [value])[-window:]
+        median = sliding.median()
+        assert median == statistics.median(values)
+        assert sliding.mad(median) == pytest.approx(exact_mad(values))
+
+
+def test_sliding_window_clamped():
+    sliding = _SlidingWindow(FUEL_SMOOTHING_MAX_WINDOW + 100)
+    for value in range(200):
+        sliding.push(float(value))
+    assert sliding.median() == 200 - (FUEL_SMOOTHING_MAX_WINDOW + 1) / 2
+
+
+def test_median_filter():
+    median_filter = MedianFilter(3)
+    assert [median_filter.update(value) for value in [1.0, 100.0, 2.0, 3.0, 4.0]] == [1.0, 50.5, 2.0, 3.0, 3.0]
+
+
+def test_ema_filter():
+    ema_filter = EmaFilter(0.5)
+    assert [ema_filter.update(value) for value in [10.0, 20.0, 20.0]] == [10.0, 15.0, 17.5]
+
+
+def test_hampel_filter_replaces_outliers_only():
+    rng = random.Random(1)
+    window, threshold = 7, 3.0
+    hampel_filter = HampelFilter(window, threshold)
+    values = []
+    for k in range(500):
+        value = 300 + rng.gauss(0, 1)
+        if k % 50 == 25:
+            value += 80
+        values = (values + [value])[-window:]
+        median = statistics.median(values)
+        expected = median if abs(value - median) > threshold * MAD_SCALE * exact_mad(values) else value
+        assert hampel_filter.update(value) == pytest.approx(expected)
+        if k % 50 == 25 and k > window:
+            assert abs(expected - 300) < 5
+
+
+def test_make_fuel_filter():
+    assert make_fuel_filter(None) is None
+    assert make_fuel_filter(FuelSmoothingSettings()) is None
+    assert isinstance(make_fuel_filter(FuelSmoothingSettings(method=FuelSmoothingMethod.HAMPEL)), HampelFilter)
+
+
+@pytest.mark.parametrize("smoothing, valid", [
+    (FuelSmoothingSettings(), True),
+    (FuelSmoothingSettings(window=1, alpha=1.0, threshold=0.0), True),
+    (FuelSmoothingSettings(window=FUEL_SMOOTHING_MAX_WINDOW), True),
+    (FuelSmoothingSettings(window=0), False),
+    (FuelSmoothingSettings(window=FUEL_SMOOTHING_MAX_WINDOW + 1), False),
+    (FuelSmoothingSettings(alpha=0.0), False),
+    (FuelSmoothingSettings(alpha=1.5), False),
+    (FuelSmoothingSettings(threshold=-1.0), False),
+])
+def test_smoothing_settings_validation(smoothing: FuelSmoothingSettings, valid: bool):
+    assert (get_smoothing_error(smoothing) is None) == valid
+    instance = SimpleNamespace(smoothing=smoothing)
+    if valid:
+        ValidateSettingsMixin().validate_smoothing(instance)
+    else:
+        with pytest.raises(ValidationError):
+            ValidateSettingsMixin().validate_smoothing(instance)
@@ -0,0 +1,58 @@
+"""Потоковая статистика подтверждения слива: среднее/дисперсия Уэлфорда и медиана P² против точных значений"""
+import random
+import statistics
+
+import pytest
+
+from dpt.fuel.logic.stats import RunningStats, P2Quantile
+
+
+def test_running_stats_matches_exact():
+    rng = random.Random(3)
+    values = [rng.gauss(500, 40) for _ in range(1000)]
+    stats = RunningStats()
+    assert stats.get_mean() is None
+    for value in values:
+        stats.add(value)
+    assert stats.count == len(values)
+    assert stats.get_mean() == pytest.approx(statistics.fmean(values))
+    assert stats.variance == pytest.approx(statistics.variance(values))
+
+
+def test_p2_empty():
+    assert P2Quantile().get_value() is None
+
+
+@pytest.mark.parametrize("values", [[7.0], [3.0, 1.0], [5.0, 1.0, 3.0], [4.0, 1.0, 3.0, 2.0], [5.0, 2.0, 4.0, 1.0, 3.0]])
+def test_p2_exact_for_few_values(values):
+    median = P2Quantile()
+    for value in values:
+        median.add(value)
+    assert median.get_value() == statistics.median(values)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_p2_close_to_exact_median(seed: int):
+    """Уровень топлива после слива: шум датчика с выбросами"""
+    rng = random.Random(seed)
+    values = []
+    for _ in range(rng.randint(50, 2000)):
+        value = rng.gauss(300, 2)
+        if rng.random() < 0.1:
+            value += rng.choice([-1, 1]) * rng.uniform(50, 200)
+        values.append(value)
+    median = P2Quantile()
+    for value in values:
+        median.add(value)
+    exact = statistics.median(values)
+    spread = statistics.quantiles(values, n=4)
+    # Оценка отличается от точной медианы меньше чем на четверть межквартильного размаха и устойчива к выбросам
+    assert abs(median.get_value() - exact) <= (spread[2] - spread[0]) / 4
+    assert abs(median.get_value() - 300) < 5
+
+
+def test_p2_monotonic_input():
+    median = P2Quantile()
+    for value in range(1, 1002):
+        median.add(float(value))
+    assert median.get_value() == pytest.approx(501, rel=0.01)
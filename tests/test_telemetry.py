@@ -0,0 +1,63 @@
+"""Потоковое чтение JSON-массива телеметрии: любые границы кусков, ошибка в данных - сразу, без дочитывания файла"""
+import io
+import json
+import random
+
+import pytest
+
+from dpt.fuel.logic.telemetry import iter_json_array
+
+
+class CountingFile(io.StringIO):
+    """Файл, считающий чтения"""
+    reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+def make_messages(size: int):
+    rng = random.Random(1)
+    return [
+        {
+            "object_id": str(k % 7),
+            "fuel1": rng.choice([1, 2.5, -3e-5, None, True]),
+            "text": rng.choice(["a}b", "x\"}, {", "ü", ""]),
+            "location": [1.5, 2],
+            "nested": rng.choice([None, {"a": {"b": [1, {}]}}]),
+        }
+        for k in range(size)
+    ]
+
+
+def read_array(text: str, chunk_size: int):
+    telemetry_file = CountingFile(text)
+    return list(iter_json_array(telemetry_file, telemetry_file.read(chunk_size), chunk_size)), telemetry_file
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 16, 100, 1000, 1 << 20])
+@pytest.mark.parametrize("indent", [None, 1])
+def test_json_array_any_chunk_boundaries(chunk_size: int, indent):
+    messages = make_messages(200)
+    result, _ = read_array(json.dumps(messages, indent=indent), chunk_size)
+    assert result == messages
+
+
+def test_json_array_empty():
+    assert read_array(" [ ] ", 2)[0] == []
+
+
+@pytest.mark.parametrize("chunk_size", [64, 1000])
+def test_json_array_malformed_element_raises_without_reading_rest(chunk_size: int):
+    messages = make_messages(400)
+    text = json.dumps(messages[:20])[:-1] + ', {"broken": tx, "a": 1}, ' + json.dumps(messages[20:])[1:]
+    telemetry_file = CountingFile(text)
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(telemetry_file, telemetry_file.read(chunk_size), chunk_size))
+    assert telemetry_file.reads * chunk_size < len(text) / 4
+
+
+def test_json_array_truncated_file_raises():
+    with pytest.raises(json.JSONDecodeError):
+        read_array(json.dumps(make_messages(10))[:-20], 16)
@@ -0,0 +1,85 @@
+"""Иерархическое колесо таймеров: срабатывание в свой тик, каскад со старших уровней, отмена и перестановка"""
+import random
+
+from dpt.fuel.logic.timer import TimerWheel
+
+
+def advance_by_ticks(wheel: TimerWheel, begin: int, end: int):
+    """Продвигать колесо по одному тику, собирая (тик, ключ) сработавших таймеров"""
+    fired = []
+    for tick in range(begin + 1, end + 1):
+        fired.extend((tick, key) for key, _ in wheel.advance(tick))
+    return fired
+
+
+def test_timer_fires_on_its_tick():
+    wheel = TimerWheel(tick=1.0, slots=8, levels=3)
+    wheel.schedule("a", 3, "payload")
+    assert "a" in wheel
+    assert wheel.advance(2) == []
+    assert wheel.advance(3) == [("a", "payload")]
+    assert "a" not in wheel
+    assert len(wheel) == 0
+
+
+def test_timer_min_delay_is_one_tick():
+    wheel = TimerWheel(tick=1.0)
+    wheel.schedule("a", 0)
+    assert wheel.advance(1) == [("a", None)]
+
+
+def test_timer_cascades_from_upper_levels():
+    """Таймеры за пределами нижнего уровня срабатывают ровно в свой тик после каскада"""
+    slots, levels = 4, 4
+    wheel = TimerWheel(tick=1.0, slots=slots, levels=levels)
+    delays = list(range(1, slots ** levels + 10))
+    for delay in delays:
+        wheel.schedule(delay, delay)
+    fired = advance_by_ticks(wheel, 0, max(delays))
+    assert fired == [(delay, delay) for delay in delays]
+    assert len(wheel) == 0
+
+
+def test_timer_cascade_with_offset_start():
+    """Каскад не зависит от того, с какого тика начато колесо"""
+    rng = random.Random(1)
+    wheel = TimerWheel(tick=0.5, slots=8, levels=3, now=37.0)
+    start = 74
+    deadlines = {}
+    for key in range(300):
+        delay = rng.randint(1, 600)
+        wheel.schedule(key, delay * wheel.tick)
+        deadlines[key] = start + delay
+    fired = {}
+    for tick in range(start + 1, max(deadlines.values()) + 1):
+        for key, _ in wheel.advance(tick * wheel.tick):
+            fired[key] = tick
+    assert fired == deadlines
+
+
+def test_timer_cancel():
+    wheel = TimerWheel(tick=1.0, slots=4, levels=3)
+    wheel.schedule("near", 2, 1)
+    wheel.schedule("far", 40, 2)
+    assert wheel.cancel("near") == 1
+    assert wheel.cancel("far") == 2
+    assert wheel.cancel("far") is None
+    assert len(wheel) == 0
+    assert advance_by_ticks(wheel, 0, 64) == []
+
+
+def test_timer_reschedule_replaces_previous():
+    wheel = TimerWheel(tick=1.0, slots=4, levels=3)
+    wheel.schedule("a", 30, "old")
+    wheel.schedule("a", 5, "new")
+    assert len(wheel) == 1
+    assert advance_by_ticks(wheel, 0, 64) == [(5, "a")]
+
+
+def test_timer_advance_jumps_several_ticks():
+    """Продвижение сразу на много тиков отдаёт все наступившие таймеры"""
+    wheel = TimerWheel(tick=1.0, slots=4, levels=3)
+    for delay in (1, 5, 17, 40):
+        wheel.schedule(delay, delay)
+    assert sorted(key for key, _ in wheel.advance(20)) == [1, 5, 17]
+    assert [key for key, _ in wheel.advance(40)] == [40]